@@ -1,7 +1,9 @@
 
-from fastapi import HTTPException, Query, Depends
-from typing import List
+from fastapi import HTTPException, Header, Query, Depends, Request, Response
+from typing import Dict, List, Optional
 from app.services.cache_service import get_cache
+from app.services.export_service import EXPORT_FORMATS, FRAME_MEDIA_TYPES, encode_frame
+from app.services.warmup_service import get_warm_up
 
 
 def requires_cache(fields: List[str]):
@@ -13,13 +15,56 @@ def requires_cache(fields: List[str]):
         if not id:
             raise HTTPException(status_code=400, detail="No id provided")
 
+        field_values = {}
         for field in fields:
-            if cache.get(id=id, field=field) is None:
+            value = cache.get(id=id, field=field)
+            if value is None:
+                if cache.expired(id=id, field=field):
+                    raise HTTPException(
+                        status_code=410,
+                        detail=f"Cached {field} for id {id} has expired, please ask again",
+                    )
                 raise HTTPException(status_code=400, detail=f"No {field} found")
+            field_values[field] = value
 
-        field_values = {field: cache.get(id=id, field=field) for field in fields}
         field_values["id"] = id
 
         return field_values
 
     return dependency
+
+
+def asker(
+    x_user_id: Optional[str] = Header(None, description="User asking, for question history"),
+    x_session_id: Optional[str] = Header(None, description="Session asking, for question history"),
+) -> Dict[str, Optional[str]]:
+    """Dependency returning who asks, from the X-User-Id and X-Session-Id headers."""
+    return {"user_id": x_user_id, "session_id": x_session_id}
+
+
+async def requires_vanna():
+    """Dependency waiting for the Vanna instance; 503 while it cannot be built."""
+    try:
+        await get_warm_up().ensure_vanna()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Service not ready: {e}")
+
+
+def accepted_frame_format(request: Request) -> Optional[str]:
+    """Dependency returning "arrow"/"parquet" when the client accepts a binary frame."""
+    accept = request.headers.get("accept", "")
+    for media_range in accept.split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in FRAME_MEDIA_TYPES:
+            return FRAME_MEDIA_TYPES[media_type]
+    return None
+
+
+def frame_response(df, fmt: str, metadata: Dict[str, str]) -> Response:
+    """Build a binary Arrow/Parquet response; scalar fields travel as schema metadata."""
+    media_type, _ = EXPORT_FORMATS[fmt]
+    return Response(
+        content=encode_frame(df, fmt, metadata=metadata),
+        media_type=media_type,
+        headers={"X-Cache-Id": metadata.get("id", "")},
+    )
@@ -0,0 +1,68 @@
+import json
+from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
+from app.services.cache_service import get_cache
+from app.services.pg_pool import PoolTimeout
+from app.services.sql_guard_service import SQLGuardError
+from app.services.ask_service import ask_events
+from app.api.dependencies import asker, requires_vanna
+
+router = APIRouter(
+    prefix="/api", tags=["ask"], dependencies=[Depends(requires_vanna)]
+)
+
+
+def _sse(event: str, data) -> str:
+    return "event: %s\ndata: %s\n\n" % (event, json.dumps(data, default=str))
+
+
+async def _stream_events(id: str, question: str, **options):
+    """Format the ask pipeline as server-sent events, ending with done or error."""
+    yield _sse("id", {"id": id, "question": question})
+    try:
+        async for event, data in ask_events(id, question, **options):
+            yield _sse(event, data)
+    except SQLGuardError as e:
+        yield _sse(
+            "error",
+            {"stage": "sql", "status": 400, "detail": str(e), "estimate": e.estimate},
+        )
+        return
+    except PoolTimeout as e:
+        yield _sse("error", {"stage": "sql", "status": 503, "detail": str(e)})
+        return
+    except Exception as e:
+        yield _sse("error", {"status": 500, "detail": str(e)})
+        return
+    yield _sse("done", {"id": id})
+
+
+@router.get("/ask")
+async def ask(
+    question: str = Query(..., description="Question to answer"),
+    use_cache: bool = Query(True, description="Reuse SQL of similar questions"),
+    chart: bool = Query(True, description="Render a chart of the result"),
+    followups: bool = Query(True, description="Suggest follow-up questions"),
+    asked_by: dict = Depends(asker),
+):
+    """
+    Answer a question in one request: SQL tokens, the generated SQL, the data,
+    the chart and follow-up questions are streamed as server-sent events as
+    soon as each one is ready.
+    """
+    try:
+        id = get_cache().generate_id()
+        return StreamingResponse(
+            _stream_events(
+                id,
+                question,
+                use_cache=use_cache,
+                chart=chart,
+                followups=followups,
+                **asked_by,
+            ),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,39 +1,132 @@
 
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import StreamingResponse
-from app.models.responses import DataFrameResponse
-from app.services.vanna_service import vanna
-from app.api.dependencies import requires_cache
-import io
+from app.config import settings
+from app.models.responses import TrainingDataPageResponse
+from app.services.vanna_service import get_vanna
+from app.services.cache_service import get_cache
+from app.api.dependencies import (
+    requires_cache,
+    requires_vanna,
+    accepted_frame_format,
+    frame_response,
+)
+from app.services.executor_service import run_in_stage
+from app.services.sql_guard_service import SQLGuardError, check_select
+from app.services.training_service import TRAINING_TYPES, page_training_data
+from app.services.export_service import (
+    EXPORT_FORMATS,
+    guard_export,
+    iter_copy_csv,
+    iter_encoded,
+    iter_frame_chunks,
+    iter_query_export,
+    to_markdown,
+)
 
-router = APIRouter(prefix="/api", tags=["data"])
+router = APIRouter(
+    prefix="/api", tags=["data"], dependencies=[Depends(requires_vanna)]
+)
 
 
 @router.get("/download_csv")
-async def download_csv(cache_data: dict = Depends(requires_cache(["df"]))):
-    """Download query results as CSV file."""
+async def download_csv(
+    cache_data: dict = Depends(requires_cache(["df", "sql"])),
+    format: str = Query("csv", description="csv, csv.gz, parquet or arrow"),
+    source: Optional[str] = Query(
+        None, description="cache or db; defaults to db when the cached df is incomplete"
+    ),
+):
+    """Download query results as CSV, gzip CSV, Parquet or Arrow, streamed in chunks."""
+    vanna = get_vanna()
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {format}")
+    if source not in (None, "cache", "db"):
+        raise HTTPException(status_code=400, detail=f"Unsupported source {source}")
+    try:
+        check_select(cache_data["sql"])
+    except SQLGuardError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         df = cache_data["df"]
+        sql = cache_data["sql"]
         id = cache_data["id"]
 
-        csv_data = df.to_csv()
+        # Streamed results only cache a preview of row_count rows, and the
+        # SQL guard may have limited the cached rows.
+        cache = get_cache()
+        row_count = cache.get(id=id, field="row_count")
+        partial = bool(cache.get(id=id, field="truncated")) or (
+            row_count is not None and row_count > len(df)
+        )
+        if source is None:
+            source = "db" if partial else "cache"
+
+        if source == "db":
+            # Refused up front, while an error can still be a 400.
+            await run_in_stage("sql", guard_export, vanna.pg_pool, sql)
+
+        if source == "db" and format in ("csv", "csv.gz"):
+            chunks = iter_copy_csv(vanna.pg_pool, sql, compress=format == "csv.gz")
+        elif source == "db":
+            chunks = iter_query_export(vanna, sql, format)
+        else:
+            frames = iter_frame_chunks(df, settings.export_chunk_rows)
+            chunks = iter_encoded(frames, format)
 
+        media_type, extension = EXPORT_FORMATS[format]
         return StreamingResponse(
-            io.StringIO(csv_data),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={id}.csv"},
+            chunks,
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f"attachment; filename={id}.{extension}",
+                "X-Truncated": "true" if source == "cache" and partial else "false",
+            },
+        )
+    except SQLGuardError as e:
+        raise HTTPException(
+            status_code=400, detail={"message": str(e), "estimate": e.estimate}
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/get_training_data", response_model=DataFrameResponse)
-async def get_training_data():
-    """Get current training data."""
+@router.get("/get_training_data", response_model=TrainingDataPageResponse)
+async def get_training_data(
+    type: Optional[str] = Query(None, description="sql, ddl or documentation"),
+    search: Optional[str] = Query(None, description="Text the item must contain"),
+    limit: int = Query(25, gt=0, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    frame_format: Optional[str] = Depends(accepted_frame_format),
+):
+    """Get one page of training data, optionally filtered by type and text."""
+    if type is not None and type not in TRAINING_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported type {type}")
+
     try:
-        df = vanna.get_training_data()
-        return DataFrameResponse(
-            id="training_data", df=df.head(25).to_json(orient="records")
+        df, next_cursor = await run_in_stage(
+            "train", page_training_data, get_vanna(), type, search, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if frame_format:
+            metadata = {"id": "training_data"}
+            if next_cursor:
+                metadata["next_cursor"] = next_cursor
+            return await run_in_stage(
+                "render", frame_response, df, frame_format, metadata
+            )
+
+        df_markdown = await run_in_stage("render", to_markdown, df)
+        return TrainingDataPageResponse(
+            id="training_data",
+            df=df.to_json(orient="records"),
+            df_markdown=df_markdown,
+            next_cursor=next_cursor,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
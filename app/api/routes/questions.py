@@ -1,19 +1,24 @@
 
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Dict, Any, Optional
 from app.models.responses import QuestionListResponse, QuestionHistoryResponse
-from app.services.vanna_service import vanna
 from app.services.cache_service import get_cache
-from app.api.dependencies import requires_cache
+from app.api.dependencies import requires_cache, requires_vanna
+from app.services.ask_service import followups_for, sample_questions
+from app.services.precompute_service import PrecomputeCancelled
 
 router = APIRouter(prefix="/api", tags=["questions"])
 
 
-@router.get("/generate_questions", response_model=QuestionListResponse)
+@router.get(
+    "/generate_questions",
+    response_model=QuestionListResponse,
+    dependencies=[Depends(requires_vanna)],
+)
 async def generate_questions():
     """Generate sample questions based on the database schema."""
     try:
-        questions = vanna.generate_questions()
+        questions = await sample_questions()
         return QuestionListResponse(
             questions=questions, header="Here are some questions you can ask:"
         )
@@ -21,38 +26,62 @@ async def generate_questions():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/generate_followup_questions", response_model=QuestionListResponse)
+@router.get(
+    "/generate_followup_questions",
+    response_model=QuestionListResponse,
+    dependencies=[Depends(requires_vanna)],
+)
 async def generate_followup_questions(
     cache_data: dict = Depends(requires_cache(["df", "question", "sql"]))
 ):
     """Generate follow-up questions based on previous query results."""
     try:
-        cache = get_cache()
-        df = cache_data["df"]
-        question = cache_data["question"]
-        sql = cache_data["sql"]
         id = cache_data["id"]
-
-        followup_questions = vanna.generate_followup_questions(
-            question=question, sql=sql, df=df
+        followup_questions = await followups_for(
+            id, cache_data["question"], cache_data["sql"], cache_data["df"]
         )
-        cache.set(id=id, field="followup_questions", value=followup_questions)
 
         return QuestionListResponse(
             id=id,
             questions=followup_questions,
             header="Here are some followup questions you can ask:",
         )
+    except PrecomputeCancelled:
+        raise HTTPException(
+            status_code=410,
+            detail=f"Cached df for id {id} has expired, please ask again",
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Only reads the cache, so unlike the routes above it is served while Vanna
+# still warms up.
 @router.get("/get_question_history", response_model=QuestionHistoryResponse)
-async def get_question_history():
-    """Get history of all asked questions."""
+async def get_question_history(
+    limit: int = Query(50, ge=1, le=500, description="Questions per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    user_id: Optional[str] = Query(None, description="Only questions of this user"),
+    session_id: Optional[str] = Query(None, description="Only questions of this session"),
+    search: Optional[str] = Query(None, description="Only questions with all these words"),
+):
+    """Get asked questions, newest first, one page at a time."""
     try:
-        cache = get_cache()
-        questions = cache.get_all(field_list=["question"])
-        return QuestionHistoryResponse(questions=questions)
+        position = int(cursor) if cursor is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+    try:
+        questions, next_cursor = get_cache().question_history(
+            limit=limit,
+            cursor=position,
+            user_id=user_id,
+            session_id=session_id,
+            search=search,
+        )
+        return QuestionHistoryResponse(
+            questions=questions,
+            next_cursor=str(next_cursor) if next_cursor is not None else None,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,70 +1,233 @@
 
-import os
-import uuid
+import json
+import pandas as pd
+from typing import Optional
+from decimal import Decimal
 from app.config import settings
 from urllib.parse import urljoin
-from app.services.vanna_service import vanna
+from app.services.vanna_service import get_vanna
 from app.services.cache_service import get_cache
-from app.api.dependencies import requires_cache
+from app.services.result_cache_service import get_result_cache
+from app.services.pg_pool import PoolTimeout
+from app.services.precompute_service import PrecomputeCancelled
+from app.services.sql_guard_service import SQLGuardError
+from app.services.executor_service import run_in_stage
+from app.services.export_service import to_markdown
+from app.services.chart_service import CHART_FORMATS
+from app.services.ask_service import (
+    lookup_similar_sql,
+    sql_for,
+    remember_sql,
+    semantic_generation,
+    execute_sql,
+    render_chart,
+    chart_for,
+    precompute,
+    store_frame,
+)
+from app.api.dependencies import (
+    asker,
+    requires_cache,
+    requires_vanna,
+    accepted_frame_format,
+    frame_response,
+)
 from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
+from app.models.requests import InvalidateResultsRequest
 from app.models.responses import (
     SQLResponse,
     DataFrameResponse,
     PlotlyFigureResponse,
     QuestionCacheResponse,
+    InvalidationResponse,
+)
+
+router = APIRouter(
+    prefix="/api", tags=["sql"], dependencies=[Depends(requires_vanna)]
 )
 
-router = APIRouter(prefix="/api", tags=["sql"])
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+async def _stream_ndjson(id: str, columns: list, estimate: dict, batches):
+    """Encode server-side cursor batches as NDJSON and cache a bounded preview."""
+    cache = get_cache()
+    preview = []
+    row_count = 0
+    truncated = False
+
+    yield json.dumps({"type": "columns", "id": id, "columns": columns}) + "\n"
+
+    try:
+        while True:
+            rows = await run_in_stage("sql", next, batches, None)
+            if rows is None:
+                break
+
+            if row_count + len(rows) > settings.sql_max_rows:
+                rows = rows[: settings.sql_max_rows - row_count]
+                truncated = True
+
+            if len(preview) < settings.sql_preview_rows:
+                preview.extend(rows[: settings.sql_preview_rows - len(preview)])
+
+            row_count += len(rows)
+            yield "".join(
+                json.dumps(dict(zip(columns, row)), default=_json_default) + "\n"
+                for row in rows
+            )
+
+            if truncated:
+                break
+    except Exception as e:
+        yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+        return
+    finally:
+        await run_in_stage("sql", batches.close)
+
+    # A LIMIT added by the SQL guard cuts the result short as well.
+    truncated = truncated or bool(estimate.get("limited"))
+    store_frame(id, pd.DataFrame(preview, columns=columns))
+    cache.set(id=id, field="row_count", value=row_count)
+    cache.set(id=id, field="truncated", value=truncated)
+
+    yield json.dumps(
+        {
+            "type": "end",
+            "id": id,
+            "row_count": row_count,
+            "truncated": truncated,
+            "estimate": estimate or None,
+        }
+    ) + "\n"
 
 
 @router.get("/generate_sql", response_model=SQLResponse)
 async def generate_sql(
-    question: str = Query(..., description="Question to generate SQL for")
+    question: str = Query(..., description="Question to generate SQL for"),
+    use_cache: bool = Query(True, description="Reuse SQL of similar questions"),
+    asked_by: dict = Depends(asker),
 ):
     """Generate SQL query from natural language question."""
     try:
         cache = get_cache()
         id = cache.generate_id()
-        sql = vanna.generate_sql(question=question, allow_llm_to_see_data=True)
 
-        cache.set(id=id, field="question", value=question)
+        generation = semantic_generation()
+        match = await lookup_similar_sql(question) if use_cache else None
+
+        if match is not None and match.sql is not None:
+            sql = match.sql
+        else:
+            sql = await sql_for(question)
+            await remember_sql(question, sql, match, generation)
+
+        cache.add_question(id=id, question=question, **asked_by)
         cache.set(id=id, field="sql", value=sql)
 
-        return SQLResponse(id=id, text=sql)
+        return SQLResponse(
+            id=id,
+            text=sql,
+            cache_hit=match is not None and match.sql is not None,
+            similarity=match.similarity if match is not None else None,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/run_sql", response_model=DataFrameResponse)
-async def run_sql(cache_data: dict = Depends(requires_cache(["sql"]))):
-    """Execute SQL query and return results."""
+async def run_sql(
+    cache_data: dict = Depends(requires_cache(["sql"])),
+    stream: bool = Query(False, description="Stream all rows as NDJSON"),
+    frame_format: Optional[str] = Depends(accepted_frame_format),
+):
+    """
+    Execute SQL query and return results. Clients sending an Arrow/Parquet
+    Accept header get the full frame as binary instead of a JSON preview.
+    """
+    vanna = get_vanna()
     try:
         cache = get_cache()
         sql = cache_data["sql"]
         id = cache_data["id"]
 
-        df = vanna.run_sql(sql=sql)
-        cache.set(id=id, field="df", value=df)
-        df_markdown = df.to_markdown(index=False)
+        if stream:
+            batches = vanna.stream_sql(
+                sql, fetch_size=settings.sql_fetch_size, max_rows=settings.sql_max_rows
+            )
+            columns, estimate = await run_in_stage("sql", next, batches)
+            return StreamingResponse(
+                _stream_ndjson(id, columns, estimate, batches),
+                media_type="application/x-ndjson",
+            )
+
+        df, cache_hit = await execute_sql(sql)
+        estimate = df.attrs.get("estimate") or None
+        store_frame(id, df)
+        if estimate and estimate.get("limited"):
+            cache.set(id=id, field="truncated", value=True)
+
+        question = cache.get(id=id, field="question")
+        if question is not None:
+            precompute(id, question, sql, df)
+
+        if frame_format:
+            metadata = {"id": id}
+            if estimate:
+                metadata["estimate"] = json.dumps(estimate)
+            return await run_in_stage(
+                "render", frame_response, df, frame_format, metadata
+            )
+
+        df_markdown = await run_in_stage("render", to_markdown, df)
 
         return DataFrameResponse(
             id=id,
             df=df.head(10).to_json(orient="records"),
             df_markdown=df_markdown,
+            cache_hit=cache_hit,
+            estimate=estimate,
         )
 
+    except SQLGuardError as e:
+        raise HTTPException(
+            status_code=400, detail={"message": str(e), "estimate": e.estimate}
+        )
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/invalidate_results", response_model=InvalidationResponse)
+async def invalidate_results(request: InvalidateResultsRequest):
+    """Drop cached SQL results reading the given tables (all results if none given)."""
+    try:
+        invalidated = get_result_cache().invalidate(tables=request.tables)
+        return InvalidationResponse(invalidated=invalidated)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/generate_plotly_figure", response_model=PlotlyFigureResponse)
 async def generate_plotly_figure(
-    cache_data: dict = Depends(requires_cache(["df", "question", "sql"]))
+    cache_data: dict = Depends(requires_cache(["df", "question", "sql"])),
+    format: Optional[str] = Query(None, description="png, jpg, webp, svg or pdf"),
+    width: Optional[int] = Query(None, gt=0, le=4000),
+    height: Optional[int] = Query(None, gt=0, le=4000),
 ) -> PlotlyFigureResponse:
     """
-    Generate Plotly visualization from query results, save as static HTML,
-    and return the URL to the static asset.
+    Generate Plotly visualization from query results, render it to the static
+    folder and return the URL to the static asset.
     """
+    if format is not None and format not in CHART_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {format}")
+
     try:
         cache = get_cache()
         df = cache_data["df"]
@@ -72,35 +235,27 @@ async def generate_plotly_figure(
         sql = cache_data["sql"]
         question = cache_data["question"]
 
-        code = vanna.generate_plotly_code(
-            question=question,
-            sql=sql,
-            df_metadata="Running df.dtypes gives:\n %s" % df.dtypes,
-        )
-
-        fig = vanna.get_plotly_figure(plotly_code=code, df=df, dark_mode=False)
-        fig_json = fig.to_json()
-
-        os.makedirs(settings.static_folder, exist_ok=True)
-
-        unique_chart_id = str(uuid.uuid4())
-        chart_filename = "vanna_chart_%s.jpg" % unique_chart_id
-        chart_file_path = os.path.join(settings.static_folder, chart_filename)
+        if format is None and width is None and height is None:
+            chart = await chart_for(id, question, sql, df)
+            return PlotlyFigureResponse(
+                id=id, chart_url=chart["chart_url"], cache_hit=chart["cache_hit"]
+            )
 
-        fig.write_image(
-            chart_file_path,
-            format="jpg",
-            width=1200,
-            height=800,
-            scale=2,
+        fig_json, chart_file_path, cache_hit = await render_chart(
+            question, sql, df, fmt=format, width=width, height=height
         )
 
         chart_url = urljoin(settings.app_url, chart_file_path.replace("\\", "/"))
         cache.set(id=id, field="fig_json", value=fig_json)
         cache.set(id=id, field="chart_url", value=chart_url)
 
-        return PlotlyFigureResponse(id=id, chart_url=chart_url)
+        return PlotlyFigureResponse(id=id, chart_url=chart_url, cache_hit=cache_hit)
 
+    except PrecomputeCancelled:
+        raise HTTPException(
+            status_code=410,
+            detail=f"Cached df for id {id} has expired, please ask again",
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -109,10 +264,23 @@ async def generate_plotly_figure(
 async def load_question(
     cache_data: dict = Depends(
         requires_cache(["question", "sql", "df", "fig_json", "followup_questions"])
-    )
+    ),
+    frame_format: Optional[str] = Depends(accepted_frame_format),
 ):
     """Load complete question data from cache."""
     try:
+        if frame_format:
+            metadata = {
+                "id": cache_data["id"],
+                "question": cache_data["question"],
+                "sql": cache_data["sql"],
+                "fig": cache_data["fig_json"],
+                "followup_questions": json.dumps(cache_data["followup_questions"]),
+            }
+            return await run_in_stage(
+                "render", frame_response, cache_data["df"], frame_format, metadata
+            )
+
         return QuestionCacheResponse(
             id=cache_data["id"],
             question=cache_data["question"],
@@ -0,0 +1,56 @@
+from typing import Callable, Dict
+from fastapi import APIRouter, HTTPException
+from app.models.responses import StatsResponse
+from app.services.cache_service import get_cache
+from app.services.vanna_service import get_vanna
+from app.api.dependencies import requires_vanna
+from app.services.executor_service import get_stage_stats
+from app.services.result_cache_service import get_result_cache
+from app.services.chart_service import get_chart_renderer
+from app.services.embedding_cache_service import get_embedding_cache
+from app.services.precompute_service import get_scheduler
+from app.services.singleflight_service import get_single_flight
+
+router = APIRouter(prefix="/api", tags=["stats"])
+
+# Counters served by /api/stats/{component}.
+STATS: Dict[str, Callable[[], dict]] = {
+    # Size, hit and eviction counters of the question cache.
+    "cache": lambda: get_cache().stats(),
+    # Utilization counters of the PostgreSQL connection pool.
+    "pool": lambda: get_vanna().pg_pool.stats(),
+    # Worker pool counters of each execution stage.
+    "stage": get_stage_stats,
+    # Hit ratio and size of the shared SQL result cache.
+    "result_cache": lambda: get_result_cache().stats(),
+    # Render, reuse and cleanup counters of the chart renderer.
+    "chart": lambda: get_chart_renderer().stats(),
+    # Size, hit and eviction counters of the embedding cache.
+    "embedding_cache": lambda: get_embedding_cache().stats(),
+    # How many identical in-flight LLM calls were coalesced.
+    "singleflight": lambda: get_single_flight().stats(),
+    # Queued, running and reused speculative follow-up and chart tasks.
+    "precompute": lambda: get_scheduler().stats(),
+}
+
+# Components that only exist once the Vanna instance is built.
+NEEDS_VANNA = {"pool"}
+
+
+@router.get("/stats/{component}", response_model=StatsResponse)
+async def component_stats(component: str):
+    """
+    Get the counters of one component: cache, pool, stage, result_cache,
+    chart, embedding_cache, singleflight or precompute.
+    """
+    if component not in STATS:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown stats component {component}"
+        )
+    if component in NEEDS_VANNA:
+        await requires_vanna()
+
+    try:
+        return StatsResponse(stats=STATS[component]())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
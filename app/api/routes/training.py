@@ -1,33 +1,108 @@
 
-from fastapi import APIRouter, HTTPException
-from app.services.vanna_service import vanna
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Depends
+from app.services.vanna_service import get_vanna
+from app.api.dependencies import requires_vanna
+from app.services.semantic_cache_service import get_semantic_cache
+from app.services.executor_service import run_in_stage
+from app.services.ask_service import refresh_sample_questions
+from app.services.training_service import (
+    TRAINING_FORMATS,
+    bulk_train,
+    detect_format,
+    parse_training_records,
+)
 from app.models.requests import TrainingDataRequest, RemoveTrainingDataRequest
-from app.models.responses import TrainingDataResponse, SuccessResponse
+from app.services.schema_sync_service import sync_schema
+from app.models.responses import (
+    TrainingDataResponse,
+    SuccessResponse,
+    BulkTrainingResponse,
+    SchemaSyncResponse,
+)
 
-router = APIRouter(prefix="/api", tags=["training"])
+router = APIRouter(
+    prefix="/api", tags=["training"], dependencies=[Depends(requires_vanna)]
+)
 
 
 @router.post("/train", response_model=TrainingDataResponse)
 async def add_training_data(request: TrainingDataRequest):
     """Add new training data to improve model performance."""
     try:
-        id = vanna.train(
+        id = await run_in_stage(
+            "train",
+            get_vanna().train,
             question=request.question,
             sql=request.sql,
             ddl=request.ddl,
             documentation=request.documentation,
         )
+        get_semantic_cache().invalidate()
+        refresh_sample_questions()
         return TrainingDataResponse(id=id)
     except Exception as e:
         print("TRAINING ERROR", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/train_bulk", response_model=BulkTrainingResponse)
+async def add_training_data_bulk(
+    request: Request,
+    format: Optional[str] = Query(None, description="csv, jsonl or json"),
+    batch_size: Optional[int] = Query(None, gt=0, le=5000),
+):
+    """
+    Load many question/sql pairs, DDL and documentation from a raw CSV,
+    JSON Lines or JSON body, embedding and inserting them in batches.
+    """
+    if format is not None and format not in TRAINING_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {format}")
+
+    try:
+        fmt = format or detect_format(request.headers.get("content-type"))
+        records = parse_training_records(await request.body(), fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        report = await run_in_stage(
+            "train", bulk_train, get_vanna(), records, batch_size
+        )
+        if sum(report["added"].values()):
+            get_semantic_cache().invalidate()
+            refresh_sample_questions()
+        return BulkTrainingResponse(**report)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/sync_schema", response_model=SchemaSyncResponse)
+async def sync_schema_ddl(
+    schemas: Optional[str] = Query(None, description="Comma separated schemas"),
+    dry_run: bool = Query(False, description="Only report what would change"),
+):
+    """Retrain DDL for the tables whose definition changed since the last sync."""
+    try:
+        schema_list = [s.strip() for s in schemas.split(",")] if schemas else None
+        report = await run_in_stage(
+            "train", sync_schema, get_vanna(), schema_list, dry_run
+        )
+        if not dry_run and (report["added"] or report["updated"] or report["removed"]):
+            get_semantic_cache().invalidate()
+            refresh_sample_questions()
+        return SchemaSyncResponse(**report)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/remove_training_data", response_model=SuccessResponse)
 async def remove_training_data(request: RemoveTrainingDataRequest):
     """Remove training data by ID."""
     try:
-        if vanna.remove_training_data(id=request.id):
+        if await run_in_stage("train", get_vanna().remove_training_data, id=request.id):
+            get_semantic_cache().invalidate()
+            refresh_sample_questions()
             return SuccessResponse(success=True)
         else:
             raise HTTPException(status_code=400, detail="Couldn't remove training data")
@@ -17,9 +17,91 @@ class Settings(BaseSettings):
     origin_url: str = "http://localhost:8000"
 
     model_name: str
+    ollama_preload: bool = True
+    warmup_retry_seconds: float = 10
     chroma_folder: Optional[str] = "database"
     static_folder: str = "static"
+    static_max_bytes: int = 512 * 1024 * 1024
+    static_retention_seconds: float = 7 * 24 * 3600
+    static_gc_interval: float = 60
+
+    chart_format: str = "jpg"
+    chart_width: int = 1200
+    chart_height: int = 800
+    chart_scale: float = 2
+    chart_render_timeout: float = 90
+
     postgres_conn: Optional[str] = os.getenv("POSTGRES_CONN")
+    pg_pool_min_size: int = 1
+    pg_pool_max_size: int = 10
+    pg_pool_timeout: float = 30.0
+    pg_statement_timeout_ms: int = 60000
+    pg_health_check_after: float = 30.0
+    sql_fetch_size: int = 2000
+    sql_max_rows: int = 1_000_000
+    sql_preview_rows: int = 1000
+    sql_guard_enabled: bool = True
+    sql_guard_max_cost: float = 5_000_000
+    sql_guard_max_rows: int = 100_000
+    sql_guard_action: str = "limit"
+    sql_guard_auto_limit: int = 10_000
+    export_chunk_rows: int = 10000
+    export_chunk_bytes: int = 256 * 1024
+    export_chunk_timeout: float = 120
+
+    llm_workers: int = 4
+    sql_workers: int = 10
+    render_workers: int = 2
+    train_workers: int = 2
+    chart_workers: int = 2
+    stage_queue_size: int = 100
+
+    train_batch_size: int = 256
+    schema_sync_schemas: str = "public"
+
+    workers: int = 1
+
+    cache_backend: str = "memory"
+    cache_sqlite_path: Optional[str] = None
+    cache_redis_url: str = "redis://localhost:6379/0"
+    cache_redis_prefix: str = "vanna:cache"
+    cache_max_entries: int = 1000
+    cache_max_bytes: int = 256 * 1024 * 1024
+    cache_ttl_seconds: float = 3600
+    cache_spill_enabled: bool = True
+    cache_spill_folder: Optional[str] = None
+    cache_spill_min_bytes: int = 8 * 1024 * 1024
+    cache_spill_max_bytes: int = 4 * 1024 * 1024 * 1024
+
+    frame_compact_enabled: bool = True
+
+    result_cache_enabled: bool = True
+    result_cache_ttl_seconds: float = 300
+    result_cache_max_entries: int = 500
+    result_cache_max_bytes: int = 256 * 1024 * 1024
+    result_cache_check_table_stats: bool = True
+
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_max_entries: int = 5000
+
+    prompt_budget_enabled: bool = True
+    prompt_token_budget: int = 1500
+    prompt_max_examples: int = 5
+    prompt_min_columns: int = 8
+
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 200_000
+    embedding_cache_max_bytes: int = 512 * 1024 * 1024
+    embedding_cache_memory_entries: int = 1024
+
+    precompute_enabled: bool = True
+    precompute_concurrency: int = 2
+    precompute_max_tasks: int = 32
+
+    otel_exporter_otlp_endpoint: Optional[str] = None
+    otel_service_name: str = "vanna-api"
+    log_payloads: bool = False
 
     class Config:
         env_file = ".env"
@@ -1,24 +1,49 @@
 
-from typing import Dict
+from typing import Any, Dict
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
-from app.api.routes import questions, sql, data, training
+from app.api.routes import questions, sql, data, training, stats, ask
+from app.services import vanna_service
+from app.services.executor_service import shutdown_stages
+from app.services.warmup_service import get_warm_up
+from app.services.cache_service import get_cache
+from app.services.telemetry_service import get_metrics_registry, setup_telemetry
 
 load_dotenv()
 
 origins = ["http://localhost", settings.origin_url]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Vanna, the models and the chart workers warm up while we already serve.
+    get_warm_up().start()
+    yield
+    await get_warm_up().stop()
+    shutdown_stages()
+    get_cache().close()
+    # Only when warm-up built Vanna; never build it just to close it.
+    vanna = vanna_service.vanna
+    if vanna is not None and vanna.pg_pool is not None:
+        vanna.pg_pool.close()
+
+
 app = FastAPI(
     title=settings.app_title,
     version=settings.app_version,
     debug=settings.debug,
+    lifespan=lifespan,
 )
 
+setup_telemetry(app)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -31,6 +56,8 @@ app.include_router(sql.router)
 app.include_router(data.router)
 app.include_router(training.router)
 app.include_router(questions.router)
+app.include_router(stats.router)
+app.include_router(ask.router)
 app.mount("/static", StaticFiles(directory=settings.static_folder), name="static")
 
 
@@ -43,8 +70,30 @@ async def root() -> Dict[str, str]:
 
 
 @app.get("/health")
+@app.get("/health/live")
 async def health_check() -> Dict[str, str]:
+    """Liveness: the process serves requests, whatever its dependencies do."""
     return {
         "status": "healthy",
         "version": settings.app_version,
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/health/ready")
+async def readiness_check() -> Dict[str, Any]:
+    """Readiness: Vanna is built and PostgreSQL, Chroma and Ollama respond."""
+    report = await get_warm_up().readiness()
+    status_code = 200 if report["status"] == "ready" else 503
+    return JSONResponse(content=report, status_code=status_code)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    Stage latency histograms and process gauges in the Prometheus text format.
+
+    Only covers the worker answering the scrape; use OTLP export with WORKERS > 1.
+    """
+    return PlainTextResponse(
+        get_metrics_registry().render(), media_type="text/plain; version=0.0.4"
+    )
@@ -1,6 +1,6 @@
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 
 class TrainingDataRequest(BaseModel):
@@ -12,3 +12,7 @@ class TrainingDataRequest(BaseModel):
 
 class RemoveTrainingDataRequest(BaseModel):
     id: str
+
+
+class InvalidateResultsRequest(BaseModel):
+    tables: Optional[List[str]] = None
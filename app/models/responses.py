@@ -19,6 +19,8 @@ class SQLResponse(BaseModel):
     type: str = "sql"
     id: str
     text: str
+    cache_hit: bool = False
+    similarity: Optional[float] = None
 
 
 class DataFrameResponse(BaseModel):
@@ -26,22 +28,53 @@ class DataFrameResponse(BaseModel):
     id: str
     df: str  # JSON string
     df_markdown: str
+    cache_hit: bool = False
+    estimate: Optional[Dict[str, Any]] = None
+
+
+class TrainingDataPageResponse(DataFrameResponse):
+    next_cursor: Optional[str] = None
 
 
 class PlotlyFigureResponse(BaseModel):
     type: str = "plotly_figure"
     id: str
     chart_url: str
+    cache_hit: bool = False
 
 
 class TrainingDataResponse(BaseModel):
     id: str
 
 
+class BulkTrainingResponse(BaseModel):
+    type: str = "bulk_training"
+    received: int
+    added: Dict[str, int]
+    duplicates: int
+    skipped: int
+    seconds: float
+    items_per_second: float
+
+
+class SchemaSyncResponse(BaseModel):
+    type: str = "schema_sync"
+    added: List[str]
+    updated: List[str]
+    removed: List[str]
+    unchanged: int
+    dry_run: bool
+    seconds: float
+
+
 class SuccessResponse(BaseModel):
     success: bool
 
 
+class InvalidationResponse(BaseModel):
+    invalidated: int
+
+
 class QuestionCacheResponse(BaseModel):
     type: str = "question_cache"
     id: str
@@ -55,3 +88,9 @@ class QuestionCacheResponse(BaseModel):
 class QuestionHistoryResponse(BaseModel):
     type: str = "question_history"
     questions: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
+class StatsResponse(BaseModel):
+    type: str = "stats"
+    stats: Dict[str, Any]
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Optional, Tuple
+
+import pandas as pd
+from urllib.parse import urljoin
+
+from app.config import settings
+from cache import compact_frame
+from app.services.vanna_service import get_vanna
+from app.services.cache_service import get_cache
+from app.services.semantic_cache_service import SemanticMatch, get_semantic_cache
+from app.services.result_cache_service import get_result_cache
+from app.services.chart_service import get_chart_renderer
+from app.services.executor_service import iterate_in_stage, run_in_stage
+from app.services.export_service import to_markdown
+from app.services.precompute_service import PrecomputeCancelled, get_scheduler
+from app.services.singleflight_service import frame_digest, get_single_flight
+
+logger = logging.getLogger(__name__)
+
+
+async def lookup_similar_sql(question: str) -> Optional[SemanticMatch]:
+    """Look the question up in the semantic cache, if enabled."""
+    if not settings.semantic_cache_enabled:
+        return None
+    return await run_in_stage(
+        "llm", get_semantic_cache().lookup, question, get_vanna().generate_embedding
+    )
+
+
+def semantic_generation() -> Optional[int]:
+    """Semantic cache generation to read before generating SQL, for remember_sql."""
+    if not settings.semantic_cache_enabled:
+        return None
+    return get_semantic_cache().generation
+
+
+async def remember_sql(
+    question: str,
+    sql: str,
+    match: Optional[SemanticMatch],
+    generation: Optional[int] = None,
+):
+    """Store freshly generated, valid SQL in the semantic cache."""
+    if settings.semantic_cache_enabled and get_vanna().is_sql_valid(sql):
+        await run_in_stage(
+            "llm",
+            get_semantic_cache().store,
+            question,
+            sql,
+            match.embedding if match is not None else None,
+            generation,
+        )
+
+
+async def sql_for(question: str) -> str:
+    """Generate SQL on the llm stage; identical questions in flight share one call."""
+    return await get_single_flight().do(
+        "generate_sql",
+        question,
+        run_in_stage,
+        "llm",
+        get_vanna().generate_sql,
+        question=question,
+        allow_llm_to_see_data=True,
+    )
+
+
+async def execute_sql(sql: str) -> Tuple[pd.DataFrame, bool]:
+    """Run SQL on the sql stage, through the shared result cache when enabled."""
+    vanna = get_vanna()
+    if not settings.result_cache_enabled:
+        return await run_in_stage("sql", vanna.run_sql, sql=sql), False
+
+    counters = None
+    if settings.result_cache_check_table_stats:
+        counters = vanna.table_change_counters
+    return await run_in_stage(
+        "sql", get_result_cache().get_or_run, sql, vanna.run_sql, counters
+    )
+
+
+async def render_chart(
+    question: str,
+    sql: str,
+    df: pd.DataFrame,
+    fmt: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+) -> Tuple[str, str, bool]:
+    """Generate Plotly code for a result and render it; returns (fig_json, path, hit)."""
+    vanna = get_vanna()
+    df_metadata = "Running df.dtypes gives:\n %s" % df.dtypes
+    code = await get_single_flight().do(
+        "generate_plotly_code",
+        (question, sql, df_metadata),
+        run_in_stage,
+        "llm",
+        vanna.generate_plotly_code,
+        question=question,
+        sql=sql,
+        df_metadata=df_metadata,
+    )
+
+    fig = await run_in_stage(
+        "render", vanna.get_plotly_figure, plotly_code=code, df=df, dark_mode=False
+    )
+    fig_json = await run_in_stage("render", fig.to_json)
+
+    path, cache_hit = await get_chart_renderer().render(
+        fig_json, fmt=fmt, width=width, height=height
+    )
+    return fig_json, path, cache_hit
+
+
+async def build_chart(id: str, question: str, sql: str, df: pd.DataFrame) -> dict:
+    """Render the default chart of a cached result and store it on the cache id."""
+    fig_json, path, cache_hit = await render_chart(question, sql, df)
+    chart_url = urljoin(settings.app_url, path.replace("\\", "/"))
+    cache = get_cache()
+    cache.set(id=id, field="fig_json", value=fig_json)
+    cache.set(id=id, field="chart_url", value=chart_url)
+    return {"fig_json": fig_json, "chart_url": chart_url, "cache_hit": cache_hit}
+
+
+async def build_followups(id: str, question: str, sql: str, df: pd.DataFrame) -> list:
+    """Generate follow-up questions of a cached result and store them on the cache id."""
+    digest = await run_in_stage("render", frame_digest, df)
+    questions = await get_single_flight().do(
+        "generate_followup_questions",
+        (question, sql, digest),
+        run_in_stage,
+        "llm",
+        get_vanna().generate_followup_questions,
+        question=question,
+        sql=sql,
+        df=df,
+    )
+    get_cache().set(id=id, field="followup_questions", value=questions)
+    return questions
+
+
+# Cached per id and computed from its df.
+DERIVED_FIELDS = ("fig_json", "chart_url", "followup_questions")
+
+
+def store_frame(id: str, df: pd.DataFrame):
+    """Cache a new result for id, dropping the chart and follow-ups of the previous one."""
+    cache = get_cache()
+    if settings.frame_compact_enabled:
+        df = compact_frame(df)
+    cache.set(id=id, field="df", value=df)
+    get_scheduler().forget(id)
+    for field in DERIVED_FIELDS:
+        if cache.get(id=id, field=field) is not None:
+            cache.set(id=id, field=field, value=None)
+
+
+def precompute(id: str, question: str, sql: str, df: pd.DataFrame):
+    """Speculatively start the chart and follow-ups clients usually ask for next."""
+    if not settings.precompute_enabled:
+        return
+    scheduler = get_scheduler()
+    scheduler.schedule(id, "followups", build_followups, id, question, sql, df)
+    scheduler.schedule(id, "chart", build_chart, id, question, sql, df)
+
+
+async def _attach_derived(
+    kind: str, build: Callable, id: str, question: str, sql: str, df: pd.DataFrame
+):
+    """Attach to the precompute task of a derived field, reloading a replaced df."""
+    try:
+        return await get_scheduler().attach(id, kind, build, id, question, sql, df)
+    except PrecomputeCancelled:
+        # The df of id was replaced or evicted meanwhile; only the current one
+        # may be stored under id.
+        cache = get_cache()
+        inputs = [cache.get(id=id, field=field) for field in ("question", "sql", "df")]
+        if any(value is None for value in inputs):
+            raise
+        return await get_scheduler().attach(id, kind, build, id, *inputs)
+
+
+async def chart_for(id: str, question: str, sql: str, df: pd.DataFrame) -> dict:
+    """Default chart of a cache id, attaching to a precomputed render if any."""
+    cache = get_cache()
+    chart_url = cache.get(id=id, field="chart_url")
+    if chart_url is not None:
+        # Already rendered, possibly by another worker sharing the cache.
+        fig_json = cache.get(id=id, field="fig_json")
+        return {"fig_json": fig_json, "chart_url": chart_url, "cache_hit": True}
+    return await _attach_derived("chart", build_chart, id, question, sql, df)
+
+
+async def followups_for(id: str, question: str, sql: str, df: pd.DataFrame) -> list:
+    """Follow-up questions of a cache id, attaching to a precomputed call if any."""
+    questions = get_cache().get(id=id, field="followup_questions")
+    if questions is not None:
+        return questions
+    return await _attach_derived("followups", build_followups, id, question, sql, df)
+
+
+# Sample questions do not belong to a cache id; their task keeps the result.
+SAMPLE_QUESTIONS = ("", "sample_questions")
+
+
+async def _sample_questions() -> list:
+    return await run_in_stage("llm", get_vanna().generate_questions)
+
+
+async def sample_questions() -> list:
+    """Sample questions from the training data, computed once per training change."""
+    if not settings.precompute_enabled:
+        return await _sample_questions()
+    return await get_scheduler().attach(*SAMPLE_QUESTIONS, _sample_questions, keep=True)
+
+
+def refresh_sample_questions():
+    """Recompute the sample questions in the background, e.g. after training changes."""
+    if settings.precompute_enabled:
+        get_scheduler().replace(*SAMPLE_QUESTIONS, _sample_questions, keep=True)
+
+
+async def ask_events(
+    id: str,
+    question: str,
+    use_cache: bool = True,
+    chart: bool = True,
+    followups: bool = True,
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Run question -> SQL -> data -> chart/follow-ups for one cache id.
+
+    Yields (event, payload) pairs as soon as each stage finishes, starting
+    with the individual SQL tokens while the LLM is still generating.
+    """
+    vanna = get_vanna()
+    cache = get_cache()
+    cache.add_question(id=id, question=question, user_id=user_id, session_id=session_id)
+
+    generation = semantic_generation()
+    match = await lookup_similar_sql(question) if use_cache else None
+    cache_hit = match is not None and match.sql is not None
+
+    if cache_hit:
+        sql = match.sql
+    else:
+        sql = None
+        tokens = vanna.generate_sql_stream(question=question, allow_llm_to_see_data=True)
+        async for event, value in iterate_in_stage("llm", tokens):
+            if event == "token":
+                yield "token", value
+            else:
+                sql = value
+        await remember_sql(question, sql, match, generation)
+
+    cache.set(id=id, field="sql", value=sql)
+    yield "sql", {
+        "text": sql,
+        "cache_hit": cache_hit,
+        "similarity": match.similarity if match is not None else None,
+    }
+
+    if not vanna.is_sql_valid(sql):
+        return
+
+    df, result_hit = await execute_sql(sql)
+    estimate = df.attrs.get("estimate") or None
+    store_frame(id, df)
+    if estimate and estimate.get("limited"):
+        cache.set(id=id, field="truncated", value=True)
+    df_markdown = await run_in_stage("render", to_markdown, df)
+    yield "data", {
+        "df": df.head(10).to_json(orient="records"),
+        "df_markdown": df_markdown,
+        "row_count": len(df),
+        "cache_hit": result_hit,
+        "estimate": estimate,
+    }
+
+    async def chart_stage():
+        chart = await chart_for(id, question, sql, df)
+        return {"chart_url": chart["chart_url"], "cache_hit": chart["cache_hit"]}
+
+    async def followup_stage():
+        return {"questions": await followups_for(id, question, sql, df)}
+
+    async def guarded(event, stage):
+        try:
+            return event, await stage()
+        except Exception as e:
+            logger.warning("⚠️ Ask stage %s failed for %s: %s", event, id, e)
+            return "error", {"stage": event, "detail": str(e)}
+
+    # Chart and follow-ups only need the data; emit whichever is ready first.
+    tasks = []
+    if chart:
+        tasks.append(asyncio.ensure_future(guarded("chart", chart_stage)))
+    if followups:
+        tasks.append(asyncio.ensure_future(guarded("followups", followup_stage)))
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,7 +1,44 @@
+import os
+import tempfile
+from cache import BoundedMemoryCache, Cache, RedisCache, SQLiteCache
+from app.config import settings
 
-from cache import MemoryCache
 
-cache = MemoryCache()
+def build_cache() -> Cache:
+    """Build the question cache selected by CACHE_BACKEND (memory, sqlite or redis)."""
+    if settings.cache_backend == "memory":
+        spill_folder = None
+        if settings.cache_spill_enabled:
+            spill_folder = settings.cache_spill_folder or tempfile.gettempdir()
+        return BoundedMemoryCache(
+            max_entries=settings.cache_max_entries,
+            max_bytes=settings.cache_max_bytes,
+            ttl=settings.cache_ttl_seconds,
+            spill_folder=spill_folder,
+            spill_min_bytes=settings.cache_spill_min_bytes,
+            max_spill_bytes=settings.cache_spill_max_bytes,
+        )
+    if settings.cache_backend == "sqlite":
+        path = settings.cache_sqlite_path or os.path.join(
+            os.getcwd(), settings.chroma_folder, "question_cache.sqlite"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteCache(
+            path,
+            max_entries=settings.cache_max_entries,
+            max_bytes=settings.cache_max_bytes,
+            ttl=settings.cache_ttl_seconds,
+        )
+    if settings.cache_backend == "redis":
+        return RedisCache(
+            settings.cache_redis_url,
+            ttl=settings.cache_ttl_seconds,
+            prefix=settings.cache_redis_prefix,
+        )
+    raise ValueError(f"Unsupported cache backend {settings.cache_backend}")
+
+
+cache = build_cache()
 
 
 def get_cache():
@@ -0,0 +1,165 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+from app.config import settings
+from app.services import chart_worker
+from app.services.executor_service import run_in_stage
+from app.services.telemetry_service import stage_span
+
+logger = logging.getLogger(__name__)
+
+CHART_FORMATS = ("png", "jpg", "jpeg", "webp", "svg", "pdf")
+CHART_PREFIX = "vanna_chart_"
+
+
+class ChartRenderer:
+    """
+    Content-addressed chart images in the static folder.
+
+    Files are named by a hash of the figure JSON and export options, so an
+    identical figure is served from disk instead of being rendered again.
+    Concurrent requests for the same image share one render, and a retention
+    policy keeps the folder under a size and age cap.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        max_bytes: int,
+        retention_seconds: float,
+        gc_interval: float = 60,
+    ):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.retention_seconds = retention_seconds
+        self.gc_interval = gc_interval
+        self.pending = {}
+        self.last_gc = 0.0
+
+        self.hits = 0
+        self.renders = 0
+        self.collected = 0
+
+    def chart_path(
+        self, fig_json: str, fmt: str, width: int, height: int, scale: float
+    ) -> str:
+        digest = hashlib.sha256(
+            ("%s|%sx%s@%s" % (fig_json, width, height, scale)).encode("utf-8")
+        ).hexdigest()[:32]
+        return os.path.join(self.folder, "%s%s.%s" % (CHART_PREFIX, digest, fmt))
+
+    async def render(
+        self,
+        fig_json: str,
+        fmt: Optional[str] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        scale: Optional[float] = None,
+    ) -> Tuple[str, bool]:
+        """Return (path, cache_hit) of the rendered image."""
+        fmt = fmt or settings.chart_format
+        width = width or settings.chart_width
+        height = height or settings.chart_height
+        scale = scale or settings.chart_scale
+
+        path = self.chart_path(fig_json, fmt, width, height, scale)
+
+        if os.path.exists(path):
+            # Touch so the retention policy treats it as recently used.
+            os.utime(path)
+            self.hits += 1
+            return path, True
+
+        async def render_in_worker():
+            with stage_span("chart", format=fmt, width=width, height=height):
+                return await run_in_stage(
+                    "chart",
+                    chart_worker.render_chart,
+                    fig_json,
+                    path,
+                    fmt,
+                    width,
+                    height,
+                    scale,
+                )
+
+        task = self.pending.get(path)
+        if task is None:
+            os.makedirs(self.folder, exist_ok=True)
+            task = asyncio.ensure_future(render_in_worker())
+            self.pending[path] = task
+            task.add_done_callback(lambda _: self.pending.pop(path, None))
+            self.renders += 1
+        else:
+            self.hits += 1
+
+        await asyncio.shield(task)
+
+        if time.monotonic() - self.last_gc > self.gc_interval:
+            self.last_gc = time.monotonic()
+            await run_in_stage("render", self.collect_garbage)
+
+        return path, False
+
+    def collect_garbage(self) -> int:
+        """Delete charts past retention, then the least recently used over the size cap."""
+        try:
+            entries = [
+                entry
+                for entry in os.scandir(self.folder)
+                if entry.is_file() and entry.name.startswith(CHART_PREFIX)
+            ]
+        except FileNotFoundError:
+            return 0
+
+        now = time.time()
+        files = []
+        for entry in entries:
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+
+        removed = 0
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            expired = now - mtime > self.retention_seconds
+            if not expired and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+                total -= size
+            except FileNotFoundError:
+                pass
+
+        if removed:
+            logger.info("🧹 Removed %d old chart images from %s", removed, self.folder)
+        self.collected += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "renders": self.renders,
+            "pending": len(self.pending),
+            "collected": self.collected,
+            "max_bytes": self.max_bytes,
+            "retention_seconds": self.retention_seconds,
+        }
+
+
+chart_renderer = ChartRenderer(
+    folder=settings.static_folder,
+    max_bytes=settings.static_max_bytes,
+    retention_seconds=settings.static_retention_seconds,
+    gc_interval=settings.static_gc_interval,
+)
+
+
+def get_chart_renderer():
+    """Get chart renderer instance."""
+    return chart_renderer
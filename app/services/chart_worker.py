@@ -0,0 +1,80 @@
+"""
+Functions executed inside the chart render worker processes.
+
+Kept free of app imports so spawned workers start quickly; every worker keeps
+one headless Chrome (through kaleido) alive between renders instead of paying
+the browser start-up for each image.
+"""
+
+import os
+import json
+import atexit
+import asyncio
+import logging
+
+import kaleido
+
+logger = logging.getLogger(__name__)
+
+_state = {}
+
+
+def start_renderer(timeout: float = 90):
+    """Process-pool initializer: start and keep a warm kaleido browser."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    browser = kaleido.Kaleido(n=1, timeout=timeout)
+    loop.run_until_complete(browser.__aenter__())
+    _state.update(loop=loop, browser=browser, timeout=timeout)
+    atexit.register(stop_renderer)
+
+
+def init_worker(timeout: float = 90):
+    """Process-pool initializer; a failed warm-up is retried on first render."""
+    _state["timeout"] = timeout
+    try:
+        start_renderer(timeout)
+    except Exception as e:
+        logger.warning("Chart worker %d could not start renderer: %s", os.getpid(), e)
+
+
+def stop_renderer():
+    browser = _state.pop("browser", None)
+    loop = _state.pop("loop", None)
+    if browser is not None:
+        try:
+            loop.run_until_complete(browser.__aexit__(None, None, None))
+        except Exception:
+            pass
+    if loop is not None:
+        loop.close()
+
+
+def warm_up() -> int:
+    """No-op task used to make the pool spawn its workers ahead of traffic."""
+    return os.getpid()
+
+
+def render_chart(
+    fig_json: str, path: str, fmt: str, width: int, height: int, scale: float
+) -> str:
+    """Render a Plotly figure JSON to path, atomically."""
+    timeout = _state.get("timeout", 90)
+    if "browser" not in _state:
+        start_renderer(timeout)
+
+    opts = {"format": fmt, "width": width, "height": height, "scale": scale}
+    try:
+        data = _state["loop"].run_until_complete(
+            _state["browser"].calc_fig(json.loads(fig_json), opts=opts)
+        )
+    except Exception:
+        # A crashed or wedged browser is restarted on the next render.
+        stop_renderer()
+        raise
+
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
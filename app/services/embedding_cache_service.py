@@ -0,0 +1,230 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from app.config import settings
+from app.services.telemetry_service import EMBEDDING_TEXTS, stage_span
+
+logger = logging.getLogger(__name__)
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Chroma embedding function that remembers every vector it computed.
+
+    Vectors are stored in SQLite keyed by a hash of the model name and text,
+    with a small in-process LRU in front, so repeated questions, re-ingested
+    training data and Chroma's per-collection query embeddings skip the model.
+    """
+
+    def __init__(
+        self,
+        inner: EmbeddingFunction,
+        path: str,
+        model_name: Optional[str] = None,
+        max_entries: int = 200_000,
+        max_bytes: int = 512 * 1024 * 1024,
+        memory_entries: int = 1024,
+    ):
+        self.inner = inner
+        self.model_name = model_name or getattr(
+            inner, "MODEL_NAME", type(inner).__name__
+        )
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self.entries, self.bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(
+            ("%s\0%s" % (self.model_name, text)).encode("utf-8")
+        ).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _load(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            rows = self._conn.execute(
+                "SELECT key, vector FROM embeddings WHERE key IN (%s)"
+                % ",".join("?" * len(chunk)),
+                chunk,
+            ).fetchall()
+            found.update(
+                (key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows
+            )
+        if found:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(time.time(), key) for key in found],
+            )
+            self._conn.commit()
+        return found
+
+    def _store(self, vectors: Dict[str, np.ndarray]):
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+            [(key, vector.tobytes(), now) for key, vector in vectors.items()],
+        )
+        self._conn.commit()
+        self.entries += len(vectors)
+        self.bytes += sum(vector.nbytes for vector in vectors.values())
+        if self.entries > self.max_entries or self.bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        # Recount first: other workers share the file.
+        self.entries, self.bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        if not self.entries:
+            return
+
+        # Trim to 90% of the tighter limit so eviction does not run every call.
+        average = self.bytes / self.entries
+        keep = int(min(self.max_entries, self.max_bytes / average) * 0.9)
+        remove = self.entries - keep
+        if remove <= 0:
+            return
+
+        self._conn.execute(
+            """
+            DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY last_used LIMIT ?
+            )
+            """,
+            (remove,),
+        )
+        self._conn.commit()
+        self.evictions += remove
+        self.entries, self.bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        logger.info("🧹 Evicted %d cached embeddings", remove)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        keys = [self.key(text) for text in input]
+        vectors = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self.memory:
+                    vectors[key] = self.memory[key]
+                    self.memory.move_to_end(key)
+            self.memory_hits += len(vectors)
+
+            wanted = [key for key in dict.fromkeys(keys) if key not in vectors]
+            if wanted:
+                stored = self._load(wanted)
+                self.hits += len(stored)
+                vectors.update(stored)
+
+        missing = {}
+        for key, text in zip(keys, input):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            computed = self.inner(list(missing.values()))
+            fresh = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(missing, computed)
+            }
+            with self._lock:
+                self.misses += len(fresh)
+                self._store(fresh)
+            vectors.update(fresh)
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                self._remember(key, vectors[key])
+
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": self.entries,
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "memory_entries": len(self.memory),
+                "memory_hits": self.memory_hits,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class TracedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Chroma embedding function wrapper recording an embedding span per call."""
+
+    def __init__(self, inner: EmbeddingFunction):
+        self.inner = inner
+
+    def __call__(self, input: Documents) -> Embeddings:
+        EMBEDDING_TEXTS.observe(len(input))
+        with stage_span("embedding", texts=len(input)):
+            return self.inner(input)
+
+
+embedding_cache = None
+
+
+def get_embedding_cache() -> CachedEmbeddingFunction:
+    """Get embedding cache instance wrapping Vanna's default Chroma embedding function."""
+    global embedding_cache
+    if embedding_cache is None:
+        from vanna.chromadb.chromadb_vector import default_ef
+
+        chroma_path = os.path.join(os.getcwd(), settings.chroma_folder)
+        os.makedirs(chroma_path, exist_ok=True)
+        embedding_cache = CachedEmbeddingFunction(
+            inner=default_ef,
+            path=os.path.join(chroma_path, "embedding_cache.sqlite"),
+            max_entries=settings.embedding_cache_max_entries,
+            max_bytes=settings.embedding_cache_max_bytes,
+            memory_entries=settings.embedding_cache_memory_entries,
+        )
+    return embedding_cache
@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import contextvars
+import logging
+import multiprocessing
+from concurrent.futures import (
+    BrokenExecutor,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from app.config import settings
+from app.services import chart_worker
+from app.services.telemetry_service import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class StageExecutor:
+    """Bounded worker pool for one kind of blocking work (LLM, SQL, rendering, ...)."""
+
+    def __init__(
+        self,
+        name: str,
+        workers: int,
+        queue_size: int,
+        pool_factory: Optional[Callable[[], Executor]] = None,
+    ):
+        self.name = name
+        self.workers = workers
+        self.pool_factory = pool_factory or (
+            lambda: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        )
+        self.pool = self.pool_factory()
+        # Running + queued jobs are capped so a burst of requests waits on the
+        # event loop instead of piling up unbounded work behind the pool.
+        self.slots = asyncio.Semaphore(workers + queue_size)
+        self.submitted = 0
+        self.completed = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        async with self.slots:
+            self.submitted += 1
+            loop = asyncio.get_running_loop()
+            call = functools.partial(fn, *args, **kwargs)
+            if isinstance(self.pool, ThreadPoolExecutor):
+                # Run in the caller's context so its trace span is the parent.
+                call = functools.partial(contextvars.copy_context().run, call)
+            try:
+                return await loop.run_in_executor(self.pool, call)
+            except BrokenExecutor:
+                # A crashed worker process poisons the whole pool; start a new one.
+                logger.warning("⚠️ Stage %s pool broken, restarting it", self.name)
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = self.pool_factory()
+                raise
+            finally:
+                self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "in_flight": self.submitted - self.completed,
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+stages: Dict[str, StageExecutor] = {
+    "llm": StageExecutor("llm", settings.llm_workers, settings.stage_queue_size),
+    "sql": StageExecutor("sql", settings.sql_workers, settings.stage_queue_size),
+    "render": StageExecutor("render", settings.render_workers, settings.stage_queue_size),
+    "train": StageExecutor("train", settings.train_workers, settings.stage_queue_size),
+    # Chart export runs in spawned processes, each keeping a browser warm.
+    "chart": StageExecutor(
+        "chart",
+        settings.chart_workers,
+        settings.stage_queue_size,
+        pool_factory=lambda: ProcessPoolExecutor(
+            max_workers=settings.chart_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=chart_worker.init_worker,
+            initargs=(settings.chart_render_timeout,),
+        ),
+    ),
+}
+
+
+async def run_in_stage(stage: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call on the worker pool of the given stage."""
+    return await stages[stage].run(fn, *args, **kwargs)
+
+
+async def iterate_in_stage(stage: str, iterator: Iterator) -> AsyncIterator:
+    """Consume a blocking iterator item by item on the worker pool of the given stage."""
+    done = object()
+    try:
+        while True:
+            item = await run_in_stage(stage, next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            try:
+                await run_in_stage(stage, close)
+            except ValueError:
+                # Still running next() in a worker; it finishes on its own.
+                pass
+
+
+def get_stage_stats() -> dict:
+    return {name: stage.stats() for name, stage in stages.items()}
+
+
+get_metrics_registry().gauge(
+    "vanna_executor_in_flight",
+    "Running and queued jobs per stage executor",
+    lambda: {
+        (("executor", name),): stage.submitted - stage.completed
+        for name, stage in stages.items()
+    },
+)
+
+
+def shutdown_stages():
+    logger.info("🛑 Shutting down stage executors...")
+    for stage in stages.values():
+        stage.shutdown()
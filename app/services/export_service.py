@@ -0,0 +1,327 @@
+import zlib
+import time
+import queue
+import asyncio
+import threading
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.config import settings
+from app.services.executor_service import iterate_in_stage, run_in_stage
+from app.services.sql_guard_service import guard_sql
+from app.services.telemetry_service import stage_span
+
+FRAME_MEDIA_TYPES = {
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+
+class ExportCancelled(Exception):
+    """Raised inside a producer thread once the client went away."""
+
+    pass
+
+
+class _ChunkSink:
+    """Minimal writable file object that hands written bytes back in chunks."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class _QueueWriter:
+    """
+    File object for COPY ... TO STDOUT that forwards ~chunk_bytes blocks to a
+    queue, gzip-compressed on the producing thread when compress is set.
+    """
+
+    def __init__(
+        self,
+        out: queue.Queue,
+        cancelled: threading.Event,
+        chunk_bytes: int,
+        compress: bool = False,
+    ):
+        self.out = out
+        self.cancelled = cancelled
+        self.chunk_bytes = chunk_bytes
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self.buffer = []
+        self.buffered = 0
+
+    def _put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            try:
+                self.out.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.chunk_bytes:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            data = b"".join(self.buffer)
+            self.buffer = []
+            self.buffered = 0
+            if self.compressor is not None:
+                data = self.compressor.compress(data)
+            if data:
+                self._put(data)
+
+    def close(self):
+        self.flush()
+        if self.compressor is not None:
+            self._put(self.compressor.flush())
+
+
+def _next_chunk(chunks: queue.Queue, cancelled: threading.Event, timeout: float):
+    """Blocking get that gives up after timeout or once the export is cancelled."""
+    deadline = time.monotonic() + timeout
+    while not cancelled.is_set():
+        try:
+            return chunks.get(timeout=min(1.0, max(deadline - time.monotonic(), 0.01)))
+        except queue.Empty:
+            if time.monotonic() >= deadline:
+                return TimeoutError(
+                    "No export data from PostgreSQL for %ss" % settings.export_chunk_timeout
+                )
+    return ExportCancelled()
+
+
+_DONE = object()
+
+
+def iter_frame_chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start : start + chunk_rows]
+
+
+def iter_csv(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Chunks held back while a column is still all NULL and cannot be typed.
+SCHEMA_PROBE_CHUNKS = 8
+
+
+def _is_untyped(tables, i: int) -> bool:
+    return all(pa.types.is_null(table.schema.field(i).type) for table in tables)
+
+
+def _arrow_schema(tables, metadata: Optional[Dict[str, str]] = None) -> pa.Schema:
+    """Schema of the first chunks; each column takes its first non-NULL type."""
+    fields = []
+    for i, field in enumerate(tables[0].schema):
+        for table in tables:
+            if not pa.types.is_null(table.schema.field(i).type):
+                field = field.with_type(table.schema.field(i).type)
+                break
+        else:
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields, metadata=metadata or None)
+
+
+def _new_writer(sink: _ChunkSink, schema: pa.Schema, fmt: str):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema)
+    return pa.ipc.new_stream(sink, schema)
+
+
+def iter_arrow(
+    frames: Iterable[pd.DataFrame], fmt: str, metadata: Optional[Dict[str, str]] = None
+) -> Iterator[bytes]:
+    """
+    Encode frames as one Arrow IPC stream or Parquet file, a record batch at a time.
+
+    The schema is fixed once every column has a type, holding back up to
+    SCHEMA_PROBE_CHUNKS chunks for columns that start out all NULL; later
+    chunks are cast to it.
+    """
+    sink = _ChunkSink()
+    writer = None
+    pending = []
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                pending.append(table)
+                if len(pending) < SCHEMA_PROBE_CHUNKS and any(
+                    _is_untyped(pending, i) for i in range(table.num_columns)
+                ):
+                    continue
+                schema = _arrow_schema(pending, metadata)
+                writer = _new_writer(sink, schema, fmt)
+                tables, pending = pending, []
+            else:
+                tables = [table]
+
+            for table in tables:
+                writer.write_table(table.cast(schema))
+            data = sink.drain()
+            if data:
+                yield data
+
+        if pending:
+            schema = _arrow_schema(pending, metadata)
+            writer = _new_writer(sink, schema, fmt)
+            for table in pending:
+                writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
+
+
+def iter_encoded(frames: Iterable[pd.DataFrame], fmt: str) -> Iterator[bytes]:
+    if fmt == "csv":
+        return iter_csv(frames)
+    if fmt == "csv.gz":
+        return iter_gzip(iter_csv(frames))
+    return iter_arrow(frames, fmt)
+
+
+def encode_frame(
+    df: pd.DataFrame, fmt: str, metadata: Optional[Dict[str, str]] = None
+) -> bytes:
+    """Encode a whole frame as Arrow IPC stream or Parquet bytes."""
+    with stage_span("serialize", format=fmt, rows=len(df)):
+        return b"".join(iter_arrow([df], fmt, metadata=metadata))
+
+
+def to_markdown(df: pd.DataFrame) -> str:
+    """Markdown table of a whole frame, as shown to users and the summary LLM."""
+    with stage_span("serialize", format="markdown", rows=len(df)):
+        return df.to_markdown(index=False)
+
+
+def guard_export(pool, sql: str) -> str:
+    """
+    Check a database export before its response starts. Exports are meant to
+    be complete, so only the cost is checked and costly ones are refused
+    rather than cut short by an automatic LIMIT.
+    """
+    with pool.connection() as conn:
+        query, _ = guard_sql(conn, sql, limit_rows=False, auto_limit=False)
+    return query
+
+
+async def iter_copy_csv(pool, sql: str, compress: bool = False) -> AsyncIterator[bytes]:
+    """Stream a query straight out of PostgreSQL with COPY ... TO STDOUT."""
+    chunks = queue.Queue(maxsize=8)
+    cancelled = threading.Event()
+    writer = _QueueWriter(chunks, cancelled, settings.export_chunk_bytes, compress)
+
+    def produce():
+        try:
+            with pool.connection() as conn:
+                # Checked again, the export may start long after guard_export.
+                query, _ = guard_sql(conn, sql, limit_rows=False, auto_limit=False)
+                with conn.cursor() as cur:
+                    cur.copy_expert(
+                        "COPY (%s) TO STDOUT WITH CSV HEADER" % query, writer
+                    )
+            writer.close()
+            writer._put(_DONE)
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            try:
+                writer._put(e)
+            except ExportCancelled:
+                pass
+
+    # Holds a sql slot for the whole export; never cancelled, since that
+    # would free the slot while the thread still runs (it stops on its own
+    # once cancelled is set).
+    asyncio.ensure_future(run_in_stage("sql", produce))
+
+    try:
+        while True:
+            item = await asyncio.to_thread(
+                _next_chunk, chunks, cancelled, settings.export_chunk_timeout
+            )
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+
+def iter_query_frames(vanna, sql: str) -> Iterator[pd.DataFrame]:
+    """Re-run a query through a server-side cursor, one DataFrame per fetch."""
+    batches = vanna.stream_sql(
+        sql, fetch_size=settings.export_chunk_rows, auto_limit=False
+    )
+    try:
+        columns, _ = next(batches)
+        for rows in batches:
+            yield pd.DataFrame(rows, columns=columns)
+    finally:
+        batches.close()
+
+
+def iter_query_export(vanna, sql: str, fmt: str) -> AsyncIterator[bytes]:
+    """
+    Re-run a query and encode it, each fetch and its encoding running on the
+    sql stage so exports count against SQL_WORKERS like every other query.
+    """
+    return iterate_in_stage("sql", iter_encoded(iter_query_frames(vanna, sql), fmt))
@@ -0,0 +1,202 @@
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out in time."""
+
+    pass
+
+
+class PgPool:
+    """
+    Thread-safe psycopg2 connection pool.
+
+    Connections are health-checked on checkout when they have been idle for a
+    while, rolled back on return so an aborted transaction never leaks into
+    the next request, and replaced transparently when they turn out broken.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        statement_timeout_ms: Optional[int] = None,
+        health_check_after: float = 30.0,
+    ):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.statement_timeout_ms = statement_timeout_ms
+        self.health_check_after = health_check_after
+
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        self.created += 1
+        return conn
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+
+        if time.monotonic() - idle_since < self.health_check_after:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning("⚠️ Dropping broken PostgreSQL connection: %s", e)
+            return False
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+
+        with self._cond:
+            waited = False
+            while True:
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+
+                if self._size < self.max_size:
+                    conn, idle_since = None, None
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f"No PostgreSQL connection available after {self.timeout}s"
+                    )
+
+                if not waited:
+                    self.waits += 1
+                    waited = True
+
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._in_use += 1
+            self.checkouts += 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                conn = None
+
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            self._release(None, broken=True)
+            raise
+
+        return conn
+
+    def _release(self, conn, broken: bool = False):
+        # Connections still checked out at close() are not kept either.
+        broken = broken or self._closed
+        if conn is not None and not broken:
+            try:
+                if conn.closed or (
+                    conn.info.transaction_status
+                    == extensions.TRANSACTION_STATUS_UNKNOWN
+                ):
+                    broken = True
+                else:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+
+        if conn is not None and broken:
+            self._discard(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if broken or conn is None:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, statement_timeout_ms: Optional[int] = None):
+        """Check out a connection, applying the per-checkout statement_timeout."""
+        conn = self._acquire()
+        try:
+            timeout_ms = statement_timeout_ms or self.statement_timeout_ms
+            if timeout_ms:
+                with conn.cursor() as cur:
+                    cur.execute("SET statement_timeout = %s", (int(timeout_ms),))
+                conn.commit()
+            yield conn
+        finally:
+            self._release(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "utilization": self._in_use / self.max_size if self.max_size else 0,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "created": self.created,
+                "discarded": self.discarded,
+            }
+
+    def close(self):
+        """Close idle connections now and the checked-out ones once returned."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+                self._size -= 1
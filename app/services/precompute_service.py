@@ -0,0 +1,190 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from app.config import settings
+from app.services.cache_service import get_cache
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]
+
+
+class PrecomputeCancelled(Exception):
+    """Raised by attach() when the task was forgotten, e.g. because its df was evicted."""
+
+    pass
+
+
+class PrecomputeScheduler:
+    """
+    Background tasks keyed by (cache id, kind) that requests can attach to.
+
+    Speculative work is started with schedule() as soon as its inputs exist
+    and runs at most `concurrency` at a time; once `max_tasks` speculative
+    tasks are pending new ones are dropped rather than queued. attach()
+    awaits the task for a key whether it is queued or running, and starts
+    it right away when there is none. Finished tasks are dropped, since
+    their results are stored in the cache, unless started with keep=True
+    for results that live nowhere else. Tasks of a cache id are cancelled
+    and forgotten when that id (or its df) is evicted.
+    """
+
+    def __init__(self, concurrency: int = 2, max_tasks: int = 32):
+        self.concurrency = concurrency
+        self.max_tasks = max_tasks
+        self.tasks: Dict[Key, asyncio.Task] = {}
+        self.speculative: Set[asyncio.Task] = set()
+        self.started: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.counters = Counter()
+
+    def _bind(self):
+        # The semaphore must belong to the loop serving requests.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self.tasks.clear()
+            self.speculative.clear()
+            self.started.clear()
+
+    def _launch(
+        self, key: Key, speculative: bool, keep: bool, fn: Callable, *args
+    ) -> asyncio.Task:
+        async def run():
+            if speculative:
+                async with self._semaphore:
+                    self.started.add(asyncio.current_task())
+                    return await fn(*args)
+            self.started.add(asyncio.current_task())
+            return await fn(*args)
+
+        task = asyncio.ensure_future(run())
+        self.tasks[key] = task
+        if speculative:
+            self.speculative.add(task)
+        task.add_done_callback(lambda t: self._finished(key, keep, t))
+        return task
+
+    def _finished(self, key: Key, keep: bool, task: asyncio.Task):
+        self.started.discard(task)
+        self.speculative.discard(task)
+        failed = task.cancelled() or task.exception() is not None
+        if failed and not task.cancelled():
+            logger.warning(
+                "⚠️ Precompute %s for %s failed: %s", key[1], key[0], task.exception()
+            )
+        # A failure is retried on demand; a result is read from the cache
+        # from now on, so the task does not outlive it (eviction listeners
+        # do not fire on Redis TTL expiry or in other workers).
+        if (failed or not keep) and self.tasks.get(key) is task:
+            del self.tasks[key]
+
+    def schedule(self, id: str, kind: str, fn: Callable, *args) -> bool:
+        """Start fn(*args) in the background unless it exists or the queue is full."""
+        self._bind()
+        key = (id, kind)
+        if key in self.tasks:
+            return True
+        if len(self.speculative) >= self.max_tasks:
+            self.counters["dropped"] += 1
+            return False
+        self.counters["scheduled"] += 1
+        self._launch(key, True, False, fn, *args)
+        return True
+
+    async def attach(self, id: str, kind: str, fn: Callable, *args, keep: bool = False) -> Any:
+        """
+        Result of the task for (id, kind), starting fn(*args) now if there is
+        none. Raises PrecomputeCancelled when the task is forgotten meanwhile.
+        """
+        self._bind()
+        key = (id, kind)
+        task = self.tasks.get(key)
+
+        if task is not None and task in self.speculative and task not in self.started:
+            # Still waiting for a speculative slot: run it now instead.
+            task.cancel()
+            task = None
+
+        if task is None:
+            self.counters["started"] += 1
+            task = self._launch(key, False, keep, fn, *args)
+        elif task.done():
+            self.counters["finished_hits"] += 1
+        else:
+            self.counters["attached"] += 1
+
+        while True:
+            try:
+                # Shielded so a disconnecting client does not cancel shared work.
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+            # Relaunching with this caller's args would bring back inputs the
+            # eviction just dropped; only a task started by replace() is awaited.
+            replacement = self.tasks.get(key)
+            if replacement is None or replacement is task:
+                raise PrecomputeCancelled(
+                    "Precompute %s for %s was cancelled because its input changed"
+                    % (kind, id or "samples")
+                )
+            task = replacement
+
+    def replace(self, id: str, kind: str, fn: Callable, *args, keep: bool = False):
+        """Cancel the task for (id, kind) and start a fresh one in the background."""
+        self._bind()
+        self.forget(id, kind)
+        self.counters["refreshed"] += 1
+        self._launch((id, kind), False, keep, fn, *args)
+
+    def forget(self, id: str, kind: Optional[str] = None):
+        """Cancel and drop the tasks of a cache id (one kind or all of them)."""
+        for key in [k for k in self.tasks if k[0] == id and kind in (None, k[1])]:
+            task = self.tasks.pop(key)
+            if not task.done():
+                task.cancel()
+                self.counters["cancelled"] += 1
+
+    def on_evict(self, id: str, field: Optional[str] = None):
+        """Cache eviction listener; may be called from any thread."""
+        if field not in (None, "df") or self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self.forget, id)
+        except RuntimeError:
+            # Loop already closed during shutdown.
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "tasks": len(self.tasks),
+            "running": len(self.started),
+            "pending_speculative": len(self.speculative),
+            "finished": sum(1 for task in self.tasks.values() if task.done()),
+            "concurrency": self.concurrency,
+            "max_tasks": self.max_tasks,
+            "scheduled": self.counters["scheduled"],
+            "dropped": self.counters["dropped"],
+            "started": self.counters["started"],
+            "attached": self.counters["attached"],
+            "finished_hits": self.counters["finished_hits"],
+            "cancelled": self.counters["cancelled"],
+            "refreshed": self.counters["refreshed"],
+        }
+
+
+scheduler = PrecomputeScheduler(
+    concurrency=settings.precompute_concurrency,
+    max_tasks=settings.precompute_max_tasks,
+)
+get_cache().add_eviction_listener(scheduler.on_evict)
+
+
+def get_scheduler():
+    """Get precompute scheduler instance."""
+    return scheduler
@@ -0,0 +1,233 @@
+import re
+import logging
+from typing import Dict, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+TABLE_PATTERN = re.compile(r"create\s+table\s+([\w.\"]+)\s*\(", re.IGNORECASE)
+COLUMN_COMMENT_PATTERN = re.compile(r"^--\s*Column\s+`([^`]+)`:\s*(.*)$")
+SQL_TABLE_PATTERN = re.compile(r"\b(?:from|join)\s+([\w.\"]+)", re.IGNORECASE)
+
+# Words that never link a question to a table or column (English + Indonesian).
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "give", "how", "i", "in", "is", "it", "list", "me", "many", "much",
+    "of", "on", "or", "per", "please", "show", "tell", "the", "to", "what",
+    "which", "with", "apa", "berapa", "dan", "dari", "di", "ke", "per", "untuk",
+    "yang", "tampilkan", "total", "jumlah",
+}
+
+# Columns kept in every pruned table: keys and time columns are needed for
+# joins and date filters even when the question does not name them.
+ALWAYS_KEEP = re.compile(r"(^id$|_id$|date|time|month|year|period)", re.IGNORECASE)
+
+
+def approx_tokens(text: str) -> int:
+    """Same 4-characters-per-token estimate Vanna uses for its own limits."""
+    return len(text) // 4
+
+
+def terms(text: str) -> Set[str]:
+    """Lowercase word terms of a question, identifier or comment."""
+    words = set()
+    for word in TERM_PATTERN.findall(text.lower().replace("_", " ")):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        words.add(word)
+        if len(word) > 3 and word.endswith("s"):
+            words.add(word[:-1])
+    return words
+
+
+class Column(NamedTuple):
+    name: str
+    line: str
+    terms: Set[str]
+
+
+class TableDDL(NamedTuple):
+    name: str
+    header: List[str]
+    columns: List[Column]
+    comments: Dict[str, str]
+    footer: str
+    raw: str
+
+
+def parse_ddl(ddl: str) -> Optional[TableDDL]:
+    """Split a CREATE TABLE document into comment header, columns and footer."""
+    match = TABLE_PATTERN.search(ddl)
+    close = ddl.rfind(")")
+    if match is None or close < match.end():
+        return None
+
+    header = ddl[: match.start()].splitlines()
+    comments = {}
+    for line in header:
+        comment = COLUMN_COMMENT_PATTERN.match(line.strip())
+        if comment:
+            comments[comment.group(1).lower()] = comment.group(2)
+
+    columns = []
+    for line in ddl[match.end() : close].split(",\n"):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        name = stripped.split()[0].strip('"')
+        comment = comments.get(name.lower(), "")
+        columns.append(Column(name, stripped, terms(name) | terms(comment)))
+
+    name = match.group(1).strip('"')
+    return TableDDL(
+        name=name,
+        header=header,
+        columns=columns,
+        comments=comments,
+        footer=ddl[close:],
+        raw=ddl,
+    )
+
+
+def prune_ddl(table: TableDDL, question_terms: Set[str], min_columns: int) -> str:
+    """Keep only the columns linked to the question (plus keys and dates)."""
+    linked = [c for c in table.columns if c.terms & question_terms]
+    if not linked or len(table.columns) <= min_columns:
+        return table.raw
+
+    kept = [c for c in table.columns if c in linked or ALWAYS_KEEP.search(c.name)]
+    if len(kept) >= len(table.columns):
+        return table.raw
+
+    kept_names = {c.name.lower() for c in kept}
+    header = [
+        line
+        for line in table.header
+        if not COLUMN_COMMENT_PATTERN.match(line.strip())
+        or COLUMN_COMMENT_PATTERN.match(line.strip()).group(1).lower() in kept_names
+    ]
+    omitted = len(table.columns) - len(kept)
+    header.append("-- %d other columns omitted" % omitted)
+    body = ",\n".join("    %s" % c.line for c in kept)
+    return "%s\nCREATE TABLE %s (\n%s\n%s" % (
+        "\n".join(header).strip("\n"),
+        table.name,
+        body,
+        table.footer,
+    )
+
+
+def _rank(items: List, score) -> List:
+    # Equally scored items keep Chroma's similarity order.
+    order = sorted(range(len(items)), key=lambda i: (-score(items[i]), i))
+    return [items[i] for i in order]
+
+
+class PromptContext(NamedTuple):
+    question_sql_list: List[dict]
+    ddl_list: List[str]
+    doc_list: List[str]
+    tokens_before: int
+    tokens_after: int
+    tables: List[str]
+
+
+def assemble_context(
+    question: str,
+    question_sql_list: List[dict],
+    ddl_list: List[str],
+    doc_list: List[str],
+    budget: int,
+    max_examples: int = 5,
+    min_columns: int = 8,
+) -> PromptContext:
+    """
+    Rank retrieved context, prune DDL to linked columns and fit a token budget.
+
+    Tables are linked to the question through their name, column names and
+    column comments; examples that query linked tables and documentation
+    sharing question terms rank first. Linked DDL is added before examples
+    and documentation, the best table is always kept, and unlinked tables
+    only fill what is left of the budget.
+    """
+    question_terms = terms(question)
+    question_sql_list = [
+        example
+        for example in question_sql_list
+        if example is not None and "question" in example and "sql" in example
+    ]
+
+    tokens_before = (
+        sum(approx_tokens(ddl) for ddl in ddl_list)
+        + sum(approx_tokens(doc) for doc in doc_list)
+        + sum(
+            approx_tokens(e["question"]) + approx_tokens(e["sql"])
+            for e in question_sql_list
+        )
+    )
+
+    tables = []
+    for ddl in ddl_list:
+        parsed = parse_ddl(ddl)
+        if parsed is None:
+            tables.append((ddl, None, len(terms(ddl) & question_terms)))
+            continue
+        name_score = 3 * len(terms(parsed.name) & question_terms)
+        column_score = sum(1 for c in parsed.columns if c.terms & question_terms)
+        tables.append((ddl, parsed, name_score + column_score))
+
+    tables = _rank(tables, lambda t: t[2])
+    linked_tables = {
+        parsed.name.split(".")[-1].lower() for _, parsed, score in tables if parsed and score
+    }
+
+    def example_score(example):
+        used = {
+            name.strip('"').split(".")[-1].lower()
+            for name in SQL_TABLE_PATTERN.findall(example["sql"])
+        }
+        return len(terms(example["question"]) & question_terms) + 2 * len(
+            used & linked_tables
+        )
+
+    examples = _rank(question_sql_list, example_score)[:max_examples]
+    docs = _rank(doc_list, lambda doc: len(terms(doc) & question_terms))
+
+    used = 0
+    kept_ddl, kept_examples, kept_docs, unlinked = [], [], [], []
+    for i, (ddl, parsed, score) in enumerate(tables):
+        text = prune_ddl(parsed, question_terms, min_columns) if parsed else ddl
+        if i > 0 and score == 0:
+            unlinked.append(text)
+            continue
+        cost = approx_tokens(text)
+        if i == 0 or used + cost <= budget:
+            kept_ddl.append(text)
+            used += cost
+
+    for example in examples:
+        cost = approx_tokens(example["question"]) + approx_tokens(example["sql"])
+        if used + cost <= budget:
+            kept_examples.append(example)
+            used += cost
+
+    for doc in docs:
+        cost = approx_tokens(doc)
+        if used + cost <= budget:
+            kept_docs.append(doc)
+            used += cost
+
+    for text in unlinked:
+        cost = approx_tokens(text)
+        if used + cost <= budget:
+            kept_ddl.append(text)
+            used += cost
+
+    return PromptContext(
+        question_sql_list=kept_examples,
+        ddl_list=kept_ddl,
+        doc_list=kept_docs,
+        tokens_before=tokens_before,
+        tokens_after=used,
+        tables=[parsed.name for _, parsed, score in tables if parsed and score],
+    )
@@ -0,0 +1,222 @@
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import sqlparse
+import pandas as pd
+from sqlparse.sql import Identifier, IdentifierList, Parenthesis, TokenList
+from sqlparse.tokens import Keyword
+
+from app.config import settings
+from cache import estimate_size
+
+logger = logging.getLogger(__name__)
+
+def canonicalize_sql(sql: str) -> str:
+    """Normalize SQL text so formatting-only differences share one cache key."""
+    sql = sqlparse.format(sql, strip_comments=True, keyword_case="upper")
+    parts = []
+    for statement in sqlparse.parse(sql):
+        for token in statement.flatten():
+            # Only whitespace between tokens: 'a  b' and 'a b' are different literals.
+            if not token.is_whitespace:
+                parts.append(token.value)
+            elif parts and parts[-1] != " ":
+                parts.append(" ")
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def _is_relation_keyword(token) -> bool:
+    return token.ttype is Keyword and (
+        token.normalized == "FROM" or token.normalized.endswith("JOIN")
+    )
+
+
+def _add_relation(identifier: Identifier, tables: Set[str]):
+    subquery = next((t for t in identifier.tokens if isinstance(t, Parenthesis)), None)
+    if subquery is not None:
+        _collect_tables(subquery, tables)
+    elif identifier.get_real_name():
+        tables.add(identifier.get_real_name().lower())
+
+
+def _collect_tables(token_list: TokenList, tables: Set[str]):
+    after_keyword = False
+    for token in token_list.tokens:
+        if token.is_whitespace:
+            continue
+        if after_keyword:
+            after_keyword = False
+            if isinstance(token, IdentifierList):
+                for identifier in token.get_identifiers():
+                    if isinstance(identifier, Identifier):
+                        _add_relation(identifier, tables)
+                continue
+            if isinstance(token, Identifier):
+                _add_relation(token, tables)
+                continue
+        if _is_relation_keyword(token):
+            after_keyword = True
+        elif token.is_group:
+            _collect_tables(token, tables)
+
+
+def referenced_tables(sql: str) -> Set[str]:
+    """Unqualified, lowercased names of the relations a query reads from."""
+    tables = set()
+    for statement in sqlparse.parse(sql):
+        _collect_tables(statement, tables)
+    return tables
+
+
+class ResultCache:
+    """
+    Result cache keyed by canonical SQL, shared by every cache id.
+
+    Entries expire after ttl seconds and are invalidated by table, either
+    explicitly or when the pg_stat_user_tables modification counters of a
+    referenced table moved since the result was stored.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        max_entries: int = 500,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry["size"]
+
+    @staticmethod
+    def _private(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Shallow copy with its own attrs: callers set attrs, add columns and
+        run chart code on their frame, which must not reach the cached one.
+        """
+        private = df.copy(deep=False)
+        private.attrs = copy.deepcopy(df.attrs)
+        return private
+
+    def _lookup(self, key: str, snapshot: Optional[Dict[str, int]]) -> Optional[pd.DataFrame]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            if time.time() - entry["created_at"] > self.ttl:
+                self._drop(key)
+                return None
+
+            if snapshot is not None and snapshot != entry["snapshot"]:
+                self._drop(key)
+                self.invalidations += 1
+                return None
+
+            self.entries.move_to_end(key)
+            return self._private(entry["df"])
+
+    def _store(self, key: str, df: pd.DataFrame, tables: Set[str], snapshot):
+        size = estimate_size(df)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+
+            self.entries[key] = {
+                "df": self._private(df),
+                "tables": tables,
+                "snapshot": snapshot,
+                "created_at": time.time(),
+                "size": size,
+            }
+            self.total_bytes += size
+
+            while self.entries and (
+                len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes
+            ):
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def get_or_run(
+        self,
+        sql: str,
+        run: Callable[[str], pd.DataFrame],
+        counters: Optional[Callable[[Iterable[str]], Dict[str, int]]] = None,
+    ) -> Tuple[pd.DataFrame, bool]:
+        """Return (df, hit), executing the query only when no valid result is cached."""
+        key = canonicalize_sql(sql)
+        tables = referenced_tables(sql)
+        snapshot = counters(tables) if counters is not None and tables else None
+
+        df = self._lookup(key, snapshot)
+        with self.lock:
+            if df is not None:
+                self.hits += 1
+                return df, True
+            self.misses += 1
+
+        df = run(sql)
+        self._store(key, df, tables, snapshot)
+        return df, False
+
+    def invalidate(self, tables: Optional[Iterable[str]] = None) -> int:
+        """Drop results reading any of the given tables, or everything when tables is None."""
+        with self.lock:
+            if tables is None:
+                keys = list(self.entries)
+            else:
+                wanted = {t.split(".")[-1].strip('"').lower() for t in tables}
+                keys = [k for k, e in self.entries.items() if e["tables"] & wanted]
+
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+
+        logger.info("🧹 Invalidated %d cached SQL results", len(keys))
+        return len(keys)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+result_cache = ResultCache(
+    ttl=settings.result_cache_ttl_seconds,
+    max_entries=settings.result_cache_max_entries,
+    max_bytes=settings.result_cache_max_bytes,
+)
+
+
+def get_result_cache():
+    """Get shared SQL result cache instance."""
+    return result_cache
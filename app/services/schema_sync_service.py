@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from vanna.utils import deterministic_uuid
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Every column of every table/view in the wanted schemas, in one round trip.
+CATALOG_QUERY = """
+SELECT n.nspname,
+       c.relname,
+       obj_description(c.oid, 'pg_class'),
+       a.attname,
+       format_type(a.atttypid, a.atttypmod),
+       col_description(c.oid, a.attnum)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f')
+  AND n.nspname = ANY(%s)
+ORDER BY n.nspname, c.relname, a.attnum
+"""
+
+_lock = threading.Lock()
+
+
+def fingerprints_path() -> str:
+    folder = os.path.join(os.getcwd(), settings.chroma_folder)
+    return os.path.join(folder, "schema_fingerprints.json")
+
+
+def load_fingerprints(path: str) -> Dict[str, Dict[str, str]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_fingerprints(path: str, fingerprints: Dict[str, Dict[str, str]]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(fingerprints, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def build_table_ddl(table_name: str, table_comment, columns) -> str:
+    """DDL + comment block in the format of the training notebook."""
+    ddl = "-- DDL for table `%s`\n" % table_name
+    if table_comment:
+        ddl += "-- Table comment: %s\n" % table_comment
+    for name, _, comment in columns:
+        if comment:
+            ddl += "-- Column `%s`: %s\n" % (name, comment)
+    ddl += "CREATE TABLE %s (\n" % table_name
+    ddl += ",\n".join("    %s %s" % (name, type_) for name, type_, _ in columns)
+    return ddl + "\n);"
+
+
+def fetch_table_ddls(pool, schemas: List[str]) -> Dict[str, str]:
+    """Read the catalog once and build the DDL document of every table."""
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(CATALOG_QUERY, (schemas,))
+            rows = cur.fetchall()
+
+    tables = {}
+    for schema, table, table_comment, column, type_, comment in rows:
+        name = table if schema == "public" else "%s.%s" % (schema, table)
+        entry = tables.setdefault(name, {"comment": table_comment, "columns": []})
+        entry["columns"].append((column, type_, comment))
+
+    return {
+        name: build_table_ddl(name, entry["comment"], entry["columns"])
+        for name, entry in tables.items()
+    }
+
+
+def sync_schema(
+    vanna, schemas: Optional[List[str]] = None, dry_run: bool = False
+) -> Dict[str, object]:
+    """
+    Retrain DDL only for tables whose definition changed since the last sync.
+
+    Changed tables have their old DDL document removed and the new one
+    added; dropped tables are removed. Fingerprints are stored next to the
+    Chroma folder so the next run only compares hashes.
+    """
+    schemas = schemas or [s.strip() for s in settings.schema_sync_schemas.split(",")]
+    started = time.perf_counter()
+
+    with _lock:
+        path = fingerprints_path()
+        previous = load_fingerprints(path)
+        ddls = fetch_table_ddls(vanna.pg_pool, schemas)
+
+        # Entries whose document vanished from Chroma are retrained as well.
+        known_ids = [entry["id"] for entry in previous.values()]
+        present = set()
+        if known_ids:
+            present = set(vanna.ddl_collection.get(ids=known_ids, include=[])["ids"])
+
+        added, updated, removed, unchanged = [], [], [], []
+        stale_ids, new_ddls = [], []
+        current = {}
+        for name, ddl in sorted(ddls.items()):
+            fingerprint = hashlib.sha256(ddl.encode("utf-8")).hexdigest()
+            old = previous.get(name)
+            if (
+                old is not None
+                and old["fingerprint"] == fingerprint
+                and old["id"] in present
+            ):
+                unchanged.append(name)
+                current[name] = old
+                continue
+
+            (updated if old is not None else added).append(name)
+            if old is not None and old["id"] in present:
+                stale_ids.append(old["id"])
+            new_ddls.append(ddl)
+            current[name] = {
+                "fingerprint": fingerprint,
+                "id": deterministic_uuid(ddl) + "-ddl",
+            }
+
+        for name, old in previous.items():
+            if name in ddls:
+                continue
+            if _schema_of(name) not in schemas:
+                # Tables of schemas outside this run are left alone.
+                current[name] = old
+                continue
+            removed.append(name)
+            if old["id"] in present:
+                stale_ids.append(old["id"])
+
+        if not dry_run:
+            if stale_ids:
+                vanna.ddl_collection.delete(ids=stale_ids)
+            if new_ddls:
+                vanna.bulk_add("ddl", new_ddls)
+            save_fingerprints(path, current)
+
+    seconds = time.perf_counter() - started
+    logger.info(
+        "🔄 Schema sync: %d added, %d updated, %d removed, %d unchanged in %.2fs",
+        len(added),
+        len(updated),
+        len(removed),
+        len(unchanged),
+        seconds,
+    )
+    return {
+        "added": added,
+        "updated": updated,
+        "removed": removed,
+        "unchanged": len(unchanged),
+        "dry_run": dry_run,
+        "seconds": seconds,
+    }
+
+
+def _schema_of(name: str) -> str:
+    return name.split(".", 1)[0] if "." in name else "public"
@@ -0,0 +1,176 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from typing import Callable, List, NamedTuple, Optional
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticMatch(NamedTuple):
+    sql: Optional[str]
+    similarity: Optional[float]
+    embedding: Optional[np.ndarray]
+
+
+class SemanticCache:
+    """Persistent question -> SQL cache matched on normalized text or embedding similarity."""
+
+    def __init__(self, path: str, threshold: float = 0.95, max_entries: int = 5000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                normalized TEXT PRIMARY KEY,
+                question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                embedding BLOB,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self._keys: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._data_version = None
+        # Bumped by invalidate(); SQL generated before that is not stored.
+        self.generation = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Lowercase, collapse whitespace and strip trailing punctuation."""
+        question = re.sub(r"\s+", " ", question.strip().lower())
+        return question.rstrip("?!. ")
+
+    def _reload_if_stale(self):
+        # PRAGMA data_version only changes when *another* connection commits,
+        # so writes from other workers are picked up without polling the table.
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._matrix is not None and version == self._data_version:
+            return
+
+        rows = self._conn.execute(
+            "SELECT normalized, embedding FROM semantic_cache WHERE embedding IS NOT NULL"
+        ).fetchall()
+        self._keys = [row[0] for row in rows]
+        if rows:
+            matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrix = matrix / np.where(norms == 0, 1, norms)
+        else:
+            self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._data_version = version
+
+    def lookup(self, question: str, embed: Callable[[str], List[float]]) -> SemanticMatch:
+        """Return cached SQL for an identical or sufficiently similar question."""
+        normalized = self.normalize(question)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sql FROM semantic_cache WHERE normalized = ?", (normalized,)
+            ).fetchone()
+        if row is not None:
+            return SemanticMatch(sql=row[0], similarity=1.0, embedding=None)
+
+        embedding = np.asarray(embed(question), dtype=np.float32).ravel()
+
+        with self._lock:
+            self._reload_if_stale()
+            if not self._keys:
+                return SemanticMatch(sql=None, similarity=None, embedding=embedding)
+
+            norm = np.linalg.norm(embedding)
+            scores = self._matrix @ (embedding / (norm if norm else 1))
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+
+            if similarity < self.threshold:
+                return SemanticMatch(sql=None, similarity=similarity, embedding=embedding)
+
+            row = self._conn.execute(
+                "SELECT sql FROM semantic_cache WHERE normalized = ?",
+                (self._keys[best],),
+            ).fetchone()
+
+        if row is None:
+            return SemanticMatch(sql=None, similarity=similarity, embedding=embedding)
+        return SemanticMatch(sql=row[0], similarity=similarity, embedding=embedding)
+
+    def store(
+        self,
+        question: str,
+        sql: str,
+        embedding: Optional[np.ndarray] = None,
+        generation: Optional[int] = None,
+    ):
+        """
+        Remember the SQL generated for a question. Pass the generation read
+        before generating it: SQL from before an invalidate() is dropped.
+        """
+        blob = None
+        if embedding is not None:
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                logger.info("⏭️ Skipping SQL generated before the cache was invalidated")
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO semantic_cache VALUES (?, ?, ?, ?, ?)",
+                (self.normalize(question), question, sql, blob, time.time()),
+            )
+            self._conn.execute(
+                """
+                DELETE FROM semantic_cache WHERE normalized IN (
+                    SELECT normalized FROM semantic_cache
+                    ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._conn.commit()
+            self._matrix = None
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the training data changed."""
+        with self._lock:
+            self._conn.execute("DELETE FROM semantic_cache")
+            self._conn.commit()
+            self._matrix = None
+            self.generation += 1
+        logger.info("🧹 Semantic SQL cache invalidated")
+
+
+semantic_cache = None
+semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """
+    Get semantic SQL cache instance, building it on first use.
+
+    The database lives in CHROMA_FOLDER under the working directory at that
+    time, so importing this module creates no files.
+    """
+    global semantic_cache
+    if semantic_cache is None:
+        with semantic_cache_lock:
+            if semantic_cache is None:
+                chroma_path = os.path.join(os.getcwd(), settings.chroma_folder)
+                os.makedirs(chroma_path, exist_ok=True)
+                semantic_cache = SemanticCache(
+                    path=os.path.join(chroma_path, "semantic_cache.sqlite"),
+                    threshold=settings.semantic_cache_threshold,
+                    max_entries=settings.semantic_cache_max_entries,
+                )
+    return semantic_cache
@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame, cheap enough to use in a coalescing key."""
+    try:
+        hashed = pd.util.hash_pandas_object(df, index=True).values.tobytes()
+    except TypeError:
+        # Unhashable cells, e.g. lists and dicts from array or json columns.
+        hashed = df.to_json(orient="split", date_format="iso", default_handler=str).encode(
+            "utf-8"
+        )
+    columns = "\0".join(map(str, df.columns)).encode("utf-8")
+    return hashlib.sha256(columns + hashed).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one execution.
+
+    The first caller for a key starts the coroutine as a task; callers
+    arriving while it is in flight await the same task and receive its result
+    or exception. Followers wait on the event loop, so only the leader holds
+    a stage worker. Nothing is cached once the call has finished.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = Counter()
+        self.coalesced = Counter()
+
+    async def do(
+        self, name: str, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs
+    ) -> Any:
+        key = (name, key)
+        self.calls[name] += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced[name] += 1
+            logger.debug("🔗 Coalesced %s call onto in-flight request", name)
+
+        # One caller going away must not cancel the call the others wait on.
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "calls": sum(self.calls.values()),
+            "coalesced": sum(self.coalesced.values()),
+            "by_method": {
+                name: {"calls": self.calls[name], "coalesced": self.coalesced[name]}
+                for name in self.calls
+            },
+        }
+
+
+single_flight = SingleFlight()
+
+
+def get_single_flight():
+    """Get shared single-flight instance for LLM calls."""
+    return single_flight
@@ -0,0 +1,122 @@
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import sqlparse
+from sqlparse import tokens as T
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+FORBIDDEN_KEYWORDS = {
+    "INSERT", "UPDATE", "DELETE", "MERGE", "UPSERT", "CREATE", "DROP", "ALTER",
+    "TRUNCATE", "GRANT", "REVOKE", "COPY", "CALL", "DO", "VACUUM", "INTO",
+}
+
+
+class SQLGuardError(Exception):
+    """Raised when a query is not a single SELECT or its estimate is over the limits."""
+
+    def __init__(self, message: str, estimate: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+def check_select(sql: str) -> str:
+    """Return the single read-only SELECT statement in sql, without trailing ';'."""
+    statements = [
+        s for s in sqlparse.parse(sql) if s.token_first(skip_cm=True, skip_ws=True)
+    ]
+    if len(statements) != 1:
+        raise SQLGuardError("Only a single SQL statement is allowed")
+
+    statement = statements[0]
+    if statement.get_type() != "SELECT":
+        raise SQLGuardError("Only SELECT statements are allowed")
+
+    # Data-modifying CTEs and SELECT ... INTO still parse as SELECT.
+    for token in statement.flatten():
+        if token.ttype in T.Keyword and token.normalized in FORBIDDEN_KEYWORDS:
+            raise SQLGuardError(f"{token.normalized} is not allowed in a query")
+
+    return str(statement).strip().rstrip(";").strip()
+
+
+def explain(conn, sql: str) -> Dict[str, Any]:
+    """Planner estimate of a query from EXPLAIN (FORMAT JSON), without running it."""
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+        plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+    return {
+        "total_cost": root["Total Cost"],
+        "plan_rows": root["Plan Rows"],
+        "node": root["Node Type"],
+    }
+
+
+def guard_sql(
+    conn, sql: str, limit_rows: bool = True, auto_limit: bool = True
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Check a query before it runs and return (sql to run, estimate).
+
+    Queries over SQL_GUARD_MAX_COST are refused. Queries expected to return
+    more than SQL_GUARD_MAX_ROWS get an automatic LIMIT (or are refused when
+    SQL_GUARD_ACTION is "refuse"); limit_rows=False skips the row check for
+    callers that cap the rows they fetch themselves, and auto_limit=False
+    refuses instead of limiting, for exports that must be complete.
+    """
+    sql = check_select(sql)
+    if not settings.sql_guard_enabled:
+        return sql, {}
+
+    estimate = explain(conn, sql)
+    estimate["limited"] = False
+
+    too_many_rows = limit_rows and estimate["plan_rows"] > settings.sql_guard_max_rows
+    too_costly = estimate["total_cost"] > settings.sql_guard_max_cost
+
+    if (
+        (too_many_rows or too_costly)
+        and auto_limit
+        and settings.sql_guard_action == "limit"
+    ):
+        # A LIMIT often lets the planner stop early, so re-check the cost.
+        limited_sql = "SELECT * FROM (%s) AS guarded LIMIT %d" % (
+            sql,
+            settings.sql_guard_auto_limit,
+        )
+        limited = explain(conn, limited_sql)
+        if limited["total_cost"] <= settings.sql_guard_max_cost:
+            logger.warning(
+                "⚠️ Query limited to %d rows (estimated %d rows, cost %.0f)",
+                settings.sql_guard_auto_limit,
+                estimate["plan_rows"],
+                estimate["total_cost"],
+            )
+            limited.update(
+                limited=True,
+                limit=settings.sql_guard_auto_limit,
+                original_cost=estimate["total_cost"],
+                original_rows=estimate["plan_rows"],
+            )
+            return limited_sql, limited
+        too_costly = True
+
+    if too_costly:
+        raise SQLGuardError(
+            "Query refused: estimated cost %.0f exceeds %.0f"
+            % (estimate["total_cost"], settings.sql_guard_max_cost),
+            estimate,
+        )
+    if too_many_rows:
+        raise SQLGuardError(
+            "Query refused: estimated %d rows exceeds %d"
+            % (estimate["plan_rows"], settings.sql_guard_max_rows),
+            estimate,
+        )
+    return sql, estimate
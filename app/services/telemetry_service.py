@@ -0,0 +1,239 @@
+import os
+import math
+import time
+import bisect
+import logging
+import threading
+import contextlib
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from opentelemetry import context, metrics, trace
+from opentelemetry.trace import Status, StatusCode
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("vanna")
+meter = metrics.get_meter("vanna")
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+)
+SIZE_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [
+        '%s="%s"'
+        % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    ]
+    if extra:
+        parts.append(extra)
+    return "{%s}" % ",".join(parts) if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram kept in process for /metrics.
+
+    Every observation is also recorded on an OpenTelemetry histogram of the
+    same name, which is exported over OTLP when an endpoint is configured.
+    """
+
+    def __init__(self, name: str, description: str, unit: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self.series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+        self._otel = meter.create_histogram(name, unit=unit, description=description)
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+        self._otel.record(value, attributes=labels)
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP %s %s" % (self.name, self.description),
+            "# TYPE %s histogram" % self.name,
+        ]
+        with self._lock:
+            series = {key: list(values) for key, values in self.series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), values[:-1]):
+                cumulative += count
+                lines.append(
+                    "%s_bucket%s %d"
+                    % (self.name, _format_labels(key, 'le="%s"' % _format_value(bound)), cumulative)
+                )
+            lines.append("%s_sum%s %s" % (self.name, _format_labels(key), repr(values[-1])))
+            lines.append("%s_count%s %d" % (self.name, _format_labels(key), cumulative))
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Histograms and scrape-time gauges rendered in the Prometheus text format.
+
+    Values are per process: with WORKERS > 1 each /metrics scrape is answered
+    by whichever worker accepts it, so multi-worker deployments should set
+    OTEL_EXPORTER_OTLP_ENDPOINT, which every worker exports to on its own.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, Tuple[str, str, Callable]] = {}
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        unit: str = "s",
+        buckets: Tuple[float, ...] = DURATION_BUCKETS,
+    ) -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, description, unit, buckets)
+        return self.histograms[name]
+
+    def gauge(self, name: str, description: str, collect: Callable, type: str = "gauge"):
+        """Register collect() -> value or {labels dict as tuple: value}, read on scrape."""
+        self.gauges[name] = (description, type, collect)
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self.histograms.values():
+            lines.extend(histogram.render())
+        for name, (description, type, collect) in self.gauges.items():
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning("⚠️ Metric %s failed: %s", name, e)
+                continue
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, type))
+            if not isinstance(values, dict):
+                values = {(): values}
+            for key, value in values.items():
+                lines.append("%s%s %s" % (name, _format_labels(key), _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "vanna_stage_duration_seconds",
+    "Duration of request stages (embedding, retrieval, llm, sql, serialize, chart)",
+)
+LLM_FIRST_TOKEN_SECONDS = registry.histogram(
+    "vanna_llm_time_to_first_token_seconds", "Time until the LLM streamed its first token"
+)
+PROMPT_TOKENS = registry.histogram(
+    "vanna_prompt_tokens", "Approximate tokens sent to the LLM", "{token}", SIZE_BUCKETS
+)
+SQL_ROWS = registry.histogram(
+    "vanna_sql_rows", "Rows returned by SQL queries", "{row}", SIZE_BUCKETS
+)
+EMBEDDING_TEXTS = registry.histogram(
+    "vanna_embedding_texts", "Texts per embedding call", "{text}", SIZE_BUCKETS
+)
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+registry.gauge("process_resident_memory_bytes", "Resident memory size in bytes", _rss_bytes)
+registry.gauge(
+    "process_cpu_seconds_total", "User and system CPU time in seconds", time.process_time,
+    type="counter",
+)
+
+
+@contextlib.contextmanager
+def stage_span(stage: str, attach: bool = True, **attributes) -> Iterator[trace.Span]:
+    """
+    Span plus vanna_stage_duration_seconds observation for one stage.
+
+    Use attach=False inside generators: they may be resumed on other worker
+    threads, where the span cannot be made (and later unmade) current.
+    """
+    span = tracer.start_span(stage, attributes=attributes)
+    token = context.attach(trace.set_span_in_context(span)) if attach else None
+    status = "ok"
+    started = time.perf_counter()
+    try:
+        yield span
+    except Exception as e:
+        status = "error"
+        span.record_exception(e)
+        span.set_status(Status(StatusCode.ERROR, str(e)))
+        raise
+    except BaseException:
+        # Cancelled, or a generator closed before it was exhausted.
+        status = "cancelled"
+        raise
+    finally:
+        if token is not None:
+            context.detach(token)
+        span.end()
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, status=status)
+
+
+def setup_telemetry(app):
+    """Instrument FastAPI and, when OTEL_EXPORTER_OTLP_ENDPOINT is set, export over OTLP."""
+    if settings.otel_exporter_otlp_endpoint:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+
+        resource = Resource.create(
+            {"service.name": settings.otel_service_name, "service.version": settings.app_version}
+        )
+        tracer_provider = TracerProvider(resource=resource)
+        tracer_provider.add_span_processor(
+            BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.otel_exporter_otlp_endpoint))
+        )
+        trace.set_tracer_provider(tracer_provider)
+        metrics.set_meter_provider(
+            MeterProvider(
+                resource=resource,
+                metric_readers=[
+                    PeriodicExportingMetricReader(
+                        OTLPMetricExporter(endpoint=settings.otel_exporter_otlp_endpoint)
+                    )
+                ],
+            )
+        )
+        logger.info("📡 Exporting traces and metrics to %s", settings.otel_exporter_otlp_endpoint)
+
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="health,metrics")
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Get metrics registry instance."""
+    return registry
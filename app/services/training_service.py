@@ -0,0 +1,226 @@
+import io
+import json
+import time
+import base64
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRAINING_FORMATS = ("csv", "jsonl", "json")
+
+FORMAT_MEDIA_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+    "application/json": "json",
+}
+
+# Rows exported by get_training_data use training_data_type/content columns.
+EXPORTED_TYPES = {"sql": "sql", "ddl": "ddl", "documentation": "documentation"}
+
+# Order in which collections are paged through when no type is given.
+TRAINING_TYPES = ("sql", "ddl", "documentation")
+
+TRAINING_COLUMNS = ["id", "question", "content", "training_data_type"]
+
+
+def detect_format(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    """Pick csv/jsonl/json from a Content-Type header or file extension."""
+    if filename:
+        extension = filename.rsplit(".", 1)[-1].lower()
+        if extension in ("ndjson", "jsonl"):
+            return "jsonl"
+        if extension in TRAINING_FORMATS:
+            return extension
+    if content_type:
+        media_type = content_type.split(";")[0].strip().lower()
+        if media_type in FORMAT_MEDIA_TYPES:
+            return FORMAT_MEDIA_TYPES[media_type]
+    raise ValueError("Cannot detect training data format, use csv, jsonl or json")
+
+
+def parse_training_records(
+    data: Union[bytes, str], fmt: str
+) -> List[Dict[str, Any]]:
+    """Parse a CSV, JSON Lines or JSON array body into record dicts."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+
+    if fmt == "csv":
+        df = pd.read_csv(io.StringIO(data), dtype=str, keep_default_na=False)
+        return df.to_dict(orient="records")
+    if fmt == "jsonl":
+        return [json.loads(line) for line in data.splitlines() if line.strip()]
+    if fmt == "json":
+        records = json.loads(data)
+        return records if isinstance(records, list) else [records]
+    raise ValueError(f"Unsupported training data format {fmt}")
+
+
+def split_training_records(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Group records into Chroma documents per training data kind.
+
+    A record may carry a question/sql pair, ddl and documentation at once.
+    SQL without a question is skipped: Vanna would need an LLM call per row
+    to invent one, which is exactly what bulk loading avoids.
+    """
+    documents = {"sql": [], "ddl": [], "documentation": []}
+    skipped = 0
+
+    for record in records:
+        record = {k: (v.strip() if isinstance(v, str) else v) for k, v in record.items()}
+
+        kind = EXPORTED_TYPES.get(record.get("training_data_type") or "")
+        if kind is not None and record.get("content"):
+            record.setdefault(kind, record["content"])
+
+        found = False
+        question, sql = record.get("question"), record.get("sql")
+        if sql and question:
+            documents["sql"].append(
+                json.dumps({"question": question, "sql": sql}, ensure_ascii=False)
+            )
+            found = True
+        for kind in ("ddl", "documentation"):
+            if record.get(kind):
+                documents[kind].append(record[kind])
+                found = True
+
+        if not found:
+            skipped += 1
+
+    documents["skipped"] = skipped
+    return documents
+
+
+def bulk_train(
+    vanna, records: List[Dict[str, Any]], batch_size: Optional[int] = None, progress=None
+) -> Dict[str, Any]:
+    """Load many training records with batched embeddings; returns a load report."""
+    batch_size = batch_size or settings.train_batch_size
+    started = time.perf_counter()
+    documents = split_training_records(records)
+
+    added = {}
+    duplicates = 0
+    for kind in ("ddl", "documentation", "sql"):
+        if not documents[kind]:
+            added[kind] = 0
+            continue
+
+        def report(done, total, kind=kind):
+            logger.info("📚 Bulk training %s: %d/%d", kind, done, total)
+            if progress is not None:
+                progress(kind, done, total)
+
+        added[kind], dupes = vanna.bulk_add(
+            kind, documents[kind], batch_size=batch_size, progress=report
+        )
+        duplicates += dupes
+
+    seconds = time.perf_counter() - started
+    total = sum(len(documents[kind]) for kind in added)
+    logger.info(
+        "✅ Bulk training done: %s added, %d duplicates, %d skipped in %.2fs",
+        added,
+        duplicates,
+        documents["skipped"],
+        seconds,
+    )
+    return {
+        "received": len(records),
+        "added": added,
+        "duplicates": duplicates,
+        "skipped": documents["skipped"],
+        "seconds": seconds,
+        "items_per_second": total / seconds if seconds else 0.0,
+    }
+
+
+def encode_cursor(kind: str, offset: int) -> str:
+    raw = json.dumps({"type": kind, "offset": offset}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        kind, offset = data["type"], int(data["offset"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if kind not in TRAINING_TYPES or offset < 0:
+        raise ValueError("Invalid cursor")
+    return kind, offset
+
+
+def _training_rows(kind: str, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rows = []
+    for id, document in zip(result["ids"], result["documents"]):
+        question, content = None, document
+        if kind == "sql":
+            pair = json.loads(document)
+            question, content = pair["question"], pair["sql"]
+        rows.append(
+            {
+                "id": id,
+                "question": question,
+                "content": content,
+                "training_data_type": kind,
+            }
+        )
+    return rows
+
+
+def page_training_data(
+    vanna,
+    kind: Optional[str] = None,
+    search: Optional[str] = None,
+    limit: int = 25,
+    cursor: Optional[str] = None,
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    One page of training data read straight from Chroma with limit/offset.
+
+    Without a type the sql, ddl and documentation collections are paged
+    through in that order. The returned cursor points at the next page and
+    is None once everything was read.
+    """
+    kinds = [kind] if kind else list(TRAINING_TYPES)
+    if cursor:
+        cursor_kind, offset = decode_cursor(cursor)
+        if cursor_kind not in kinds:
+            raise ValueError("Cursor does not match the requested type")
+        kinds = kinds[kinds.index(cursor_kind) :]
+    else:
+        offset = 0
+
+    where_document = {"$contains": search} if search else None
+    rows = []
+    next_cursor = None
+    for i, current in enumerate(kinds):
+        collection = getattr(vanna, "%s_collection" % current)
+        wanted = limit - len(rows)
+        # One extra row tells whether this collection has more after the page.
+        result = collection.get(
+            limit=wanted + 1,
+            offset=offset,
+            where_document=where_document,
+            include=["documents"],
+        )
+        rows.extend(_training_rows(current, result)[:wanted])
+
+        if len(result["ids"]) > wanted:
+            next_cursor = encode_cursor(current, offset + wanted)
+            break
+        if len(rows) >= limit and i + 1 < len(kinds):
+            next_cursor = encode_cursor(kinds[i + 1], 0)
+            break
+        offset = 0
+
+    return pd.DataFrame(rows, columns=TRAINING_COLUMNS), next_cursor
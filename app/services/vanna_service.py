@@ -1,12 +1,31 @@
 
 
 import os
+import time
+import uuid
 import logging
+import threading
 import psycopg2
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from pandas import read_sql
+from cache import compact_frame
 from app.config import settings
 from vanna.ollama import Ollama
 from vanna.chromadb import ChromaDB_VectorStore
+from vanna.utils import deterministic_uuid
+from app.services.pg_pool import PgPool
+from app.services.embedding_cache_service import (
+    TracedEmbeddingFunction,
+    get_embedding_cache,
+)
+from app.services.prompt_service import approx_tokens, assemble_context
+from app.services.sql_guard_service import guard_sql
+from app.services.telemetry_service import (
+    LLM_FIRST_TOKEN_SECONDS,
+    PROMPT_TOKENS,
+    SQL_ROWS,
+    stage_span,
+)
 
 # ✅ Setup Logging
 logging.basicConfig(
@@ -15,24 +34,312 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Prefix of the documentation item VannaBase.generate_sql adds for intermediate SQL.
+INTERMEDIATE_SQL_DOC = (
+    "The following is a pandas DataFrame with the results of the intermediate SQL query"
+)
+
+# Training data kind -> (collection attribute, id suffix), as used by Vanna.
+TRAINING_COLLECTIONS = {
+    "sql": ("sql_collection", "-sql"),
+    "ddl": ("ddl_collection", "-ddl"),
+    "documentation": ("documentation_collection", "-doc"),
+}
+
 
 class VannaService(ChromaDB_VectorStore, Ollama):
     def __init__(self, config=None) -> None:
         logger.debug("📦 Inisialisasi VannaService...")
         ChromaDB_VectorStore.__init__(self, config=config)
         Ollama.__init__(self, config=config)
-        self.pg_conn = None
+        self.pg_pool = None
         logger.debug("✅ VannaService initialized with config: %s", config)
 
+    def log(self, message: str, title: str = "Info"):
+        # Vanna prints whole prompts, responses and SQL; only with LOG_PAYLOADS.
+        if settings.log_payloads:
+            logger.debug("%s: %s", title, message)
+
+    def get_similar_question_sql(self, question: str, **kwargs) -> list:
+        with stage_span("retrieval", collection="sql"):
+            return super().get_similar_question_sql(question, **kwargs)
+
+    def get_related_ddl(self, question: str, **kwargs) -> list:
+        with stage_span("retrieval", collection="ddl"):
+            return super().get_related_ddl(question, **kwargs)
+
+    def get_related_documentation(self, question: str, **kwargs) -> list:
+        with stage_span("retrieval", collection="documentation"):
+            return super().get_related_documentation(question, **kwargs)
+
+    def get_sql_prompt(
+        self,
+        initial_prompt: str,
+        question: str,
+        question_sql_list: list,
+        ddl_list: list,
+        doc_list: list,
+        **kwargs,
+    ):
+        """Ringkas konteks (ranking, DDL pruning, token budget) sebelum prompt dibuat."""
+        if settings.prompt_budget_enabled:
+            # Results of an intermediate SQL query must always reach the LLM.
+            pinned = [d for d in doc_list if d.startswith(INTERMEDIATE_SQL_DOC)]
+            context = assemble_context(
+                question,
+                question_sql_list,
+                ddl_list,
+                [d for d in doc_list if d not in pinned],
+                budget=settings.prompt_token_budget,
+                max_examples=settings.prompt_max_examples,
+                min_columns=settings.prompt_min_columns,
+            )
+            logger.info(
+                "✂️ Prompt context %d -> %d tokens (saved %d), tables: %s",
+                context.tokens_before,
+                context.tokens_after,
+                context.tokens_before - context.tokens_after,
+                context.tables,
+            )
+            question_sql_list = context.question_sql_list
+            ddl_list = context.ddl_list
+            doc_list = context.doc_list + pinned
+
+        return super().get_sql_prompt(
+            initial_prompt=initial_prompt,
+            question=question,
+            question_sql_list=question_sql_list,
+            ddl_list=ddl_list,
+            doc_list=doc_list,
+            **kwargs,
+        )
+
+    def preload_model(self):
+        """Load the Ollama model into memory so the first question does not wait for it."""
+        self.ollama_client.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+
     def connect_to_pg(self, conn_str: str):
-        """Koneksi ke PostgreSQL via psycopg2."""
+        """Buat connection pool PostgreSQL via psycopg2."""
         try:
-            self.pg_conn = psycopg2.connect(conn_str)
-            logger.info("✅ PostgreSQL connected!")
+            self.pg_pool = PgPool(
+                conn_str,
+                min_size=settings.pg_pool_min_size,
+                max_size=settings.pg_pool_max_size,
+                timeout=settings.pg_pool_timeout,
+                statement_timeout_ms=settings.pg_statement_timeout_ms,
+                health_check_after=settings.pg_health_check_after,
+            )
+            logger.info("✅ PostgreSQL pool connected!")
         except Exception as e:
             logger.error("❌ PostgreSQL connection failed: %s", e)
             raise
 
+    def bulk_add(
+        self,
+        kind: str,
+        documents: List[str],
+        batch_size: int = 256,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Tuple[int, int]:
+        """
+        Tambah banyak training data sekaligus ke satu collection.
+
+        Ids are the same content hashes Vanna's add_* methods use, so items
+        already in the collection (or repeated in the input) are skipped.
+        Each batch is embedded with one embedding_function call and written
+        with one collection.add. Returns (added, duplicates).
+        """
+        attr, suffix = TRAINING_COLLECTIONS[kind]
+        collection = getattr(self, attr)
+
+        unique = {}
+        for document in documents:
+            unique.setdefault(deterministic_uuid(document) + suffix, document)
+        duplicates = len(documents) - len(unique)
+
+        added = 0
+        items = list(unique.items())
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            existing = set(
+                collection.get(ids=[id for id, _ in batch], include=[])["ids"]
+            )
+            batch = [(id, doc) for id, doc in batch if id not in existing]
+            duplicates += len(existing)
+
+            if batch:
+                docs = [doc for _, doc in batch]
+                collection.add(
+                    ids=[id for id, _ in batch],
+                    documents=docs,
+                    embeddings=self.embedding_function(docs),
+                )
+                added += len(batch)
+
+            if progress is not None:
+                progress(min(start + batch_size, len(items)), len(items))
+
+        return added, duplicates
+
+    def table_change_counters(self, tables: Iterable[str]) -> Dict[str, int]:
+        """Modification counters per table from pg_stat_user_tables."""
+        with self.pg_pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT relname, SUM(n_tup_ins + n_tup_upd + n_tup_del)
+                    FROM pg_stat_user_tables
+                    WHERE relname = ANY(%s)
+                    GROUP BY relname
+                    """,
+                    (list(tables),),
+                )
+                return {relname: int(count) for relname, count in cur.fetchall()}
+
+    def stream_sql(
+        self,
+        sql: str,
+        fetch_size: int,
+        max_rows: Optional[int] = None,
+        auto_limit: bool = True,
+    ) -> Iterator:
+        """
+        Jalankan SQL lewat named server-side cursor.
+
+        Yields (column names, guard estimate) first, then batches of row
+        tuples; estimate["limited"] is set when the guard added a LIMIT, which
+        auto_limit=False refuses instead. With max_rows set, at most
+        max_rows + 1 rows are fetched so callers can detect truncation without
+        PostgreSQL ever shipping the full result.
+        """
+        with self.pg_pool.connection() as conn, stage_span(
+            "sql", attach=False, streamed=True
+        ) as span:
+            # Rows are capped by max_rows here, so only the cost is checked.
+            sql, estimate = guard_sql(
+                conn, sql, limit_rows=False, auto_limit=auto_limit
+            )
+            with conn.cursor(name="stream_%s" % uuid.uuid4().hex) as cur:
+                cur.itersize = fetch_size
+                cur.execute(sql)
+
+                # A named cursor only gets a description after the first fetch.
+                remaining = max_rows + 1 if max_rows is not None else None
+                rows = cur.fetchmany(min(fetch_size, remaining or fetch_size))
+                yield [col.name for col in cur.description], estimate
+
+                fetched = 0
+                try:
+                    while rows:
+                        fetched += len(rows)
+                        yield rows
+                        if remaining is not None:
+                            remaining -= len(rows)
+                            if remaining <= 0:
+                                break
+                        rows = cur.fetchmany(min(fetch_size, remaining or fetch_size))
+                finally:
+                    SQL_ROWS.observe(fetched)
+                    span.set_attribute("rows", fetched)
+
+    def submit_prompt(self, prompt, **kwargs) -> str:
+        """Chat completion as one string; streamed so time to first token is measured."""
+        stream = self._stream_prompt(prompt)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as done:
+                return done.value
+
+    def _stream_prompt(self, prompt) -> Iterator[Tuple[str, str]]:
+        """Stream a chat completion, yielding tokens and returning the full text."""
+        prompt_tokens = sum(approx_tokens(str(m.get("content", ""))) for m in prompt)
+        PROMPT_TOKENS.observe(prompt_tokens)
+        self.log(title="Prompt", message=prompt)
+
+        response = []
+        # May be resumed on different worker threads, so the span is not attached.
+        with stage_span(
+            "llm", attach=False, model=self.model, prompt_tokens=prompt_tokens
+        ) as span:
+            started = time.perf_counter()
+            for chunk in self.ollama_client.chat(
+                model=self.model,
+                messages=prompt,
+                stream=True,
+                options=self.ollama_options,
+                keep_alive=self.keep_alive,
+            ):
+                token = chunk["message"]["content"]
+                if token:
+                    if not response:
+                        first_token = time.perf_counter() - started
+                        LLM_FIRST_TOKEN_SECONDS.observe(first_token)
+                        span.set_attribute("time_to_first_token", first_token)
+                    response.append(token)
+                    yield "token", token
+            span.set_attribute("completion_chunks", len(response))
+
+        text = "".join(response)
+        self.log(title="LLM Response", message=text)
+        return text
+
+    def generate_sql_stream(
+        self, question: str, allow_llm_to_see_data=False, **kwargs
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Versi streaming dari generate_sql.
+
+        Yields ("token", text) for every chunk the LLM produces and finally
+        ("sql", sql) with the extracted query, following the same prompt and
+        intermediate-SQL flow as VannaBase.generate_sql.
+        """
+        initial_prompt = self.config.get("initial_prompt") if self.config else None
+        question_sql_list = self.get_similar_question_sql(question, **kwargs)
+        ddl_list = self.get_related_ddl(question, **kwargs)
+        doc_list = self.get_related_documentation(question, **kwargs)
+        prompt = self.get_sql_prompt(
+            initial_prompt=initial_prompt,
+            question=question,
+            question_sql_list=question_sql_list,
+            ddl_list=ddl_list,
+            doc_list=doc_list,
+            **kwargs,
+        )
+        llm_response = yield from self._stream_prompt(prompt)
+
+        if "intermediate_sql" in llm_response:
+            if not allow_llm_to_see_data:
+                yield "sql", (
+                    "The LLM is not allowed to see the data in your database. "
+                    "Your question requires database introspection to generate "
+                    "the necessary SQL. Please set allow_llm_to_see_data=True to "
+                    "enable this."
+                )
+                return
+
+            intermediate_sql = self.extract_sql(llm_response)
+            try:
+                df = self.run_sql(intermediate_sql)
+                prompt = self.get_sql_prompt(
+                    initial_prompt=initial_prompt,
+                    question=question,
+                    question_sql_list=question_sql_list,
+                    ddl_list=ddl_list,
+                    doc_list=doc_list
+                    + [
+                        "%s %s: \n%s"
+                        % (INTERMEDIATE_SQL_DOC, intermediate_sql, df.to_markdown())
+                    ],
+                    **kwargs,
+                )
+                llm_response = yield from self._stream_prompt(prompt)
+            except Exception as e:
+                yield "sql", "Error running intermediate SQL: %s" % e
+                return
+
+        yield "sql", self.extract_sql(llm_response)
+
 
 def get_vanna_instance() -> VannaService:
     """Get configured Vanna instance."""
@@ -47,12 +354,18 @@ def get_vanna_instance() -> VannaService:
     if not settings.postgres_conn:
         raise Exception("❌ POSTGRES_CONN tidak ditemukan di settings (.env)!")
 
-    vn = VannaService(
-        config={
-            "model": settings.model_name,
-            "path": chroma_path,
-        }
-    )
+    config = {
+        "model": settings.model_name,
+        "path": chroma_path,
+    }
+    if settings.embedding_cache_enabled:
+        config["embedding_function"] = TracedEmbeddingFunction(get_embedding_cache())
+    else:
+        from vanna.chromadb.chromadb_vector import default_ef
+
+        config["embedding_function"] = TracedEmbeddingFunction(default_ef)
+
+    vn = VannaService(config=config)
 
     # 🔌 Hubungkan ke PostgreSQL
     vn.connect_to_pg(settings.postgres_conn)
@@ -61,8 +374,18 @@ def get_vanna_instance() -> VannaService:
     def run_sql(sql: str):
         logger.info("📥 SQL received: %s", sql)
         try:
-            df = read_sql(sql, con=vn.pg_conn)
-            logger.debug("📊 SQL result: %s", df.head())
+            with stage_span("sql") as span, vn.pg_pool.connection() as conn:
+                # 🛡️ Tolak / batasi query yang terlalu berat sebelum dijalankan
+                sql, estimate = guard_sql(conn, sql)
+                df = read_sql(sql, con=conn)
+                SQL_ROWS.observe(len(df))
+                span.set_attribute("rows", len(df))
+            if settings.frame_compact_enabled:
+                # 🗜️ Kolom teks/tanggal ke Arrow agar cache lebih hemat memori
+                df = compact_frame(df)
+            df.attrs["estimate"] = estimate
+            if settings.log_payloads:
+                logger.debug("📊 SQL result: %s", df.head())
             return df
         except Exception as e:
             logger.error("❌ Error saat menjalankan SQL: %s", e)
@@ -81,6 +404,22 @@ def get_pg_conn():
     return psycopg2.connect(settings.postgres_conn)
 
 
-# ✅ Inisialisasi Vanna
-logger.info("🚀 Inisialisasi global Vanna...")
-vanna = get_vanna_instance()
+vanna = None
+vanna_lock = threading.Lock()
+
+
+def get_vanna() -> VannaService:
+    """
+    Get Vanna instance, building it on first use.
+
+    Construction opens Chroma, checks the Ollama model and connects to
+    PostgreSQL, so importing this module stays cheap; the API builds it in
+    the lifespan warm-up. A failed build is retried on the next call.
+    """
+    global vanna
+    if vanna is None:
+        with vanna_lock:
+            if vanna is None:
+                logger.info("🚀 Inisialisasi global Vanna...")
+                vanna = get_vanna_instance()
+    return vanna
@@ -0,0 +1,165 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+from app.config import settings
+from app.services import chart_worker
+from app.services import vanna_service
+from app.services.vanna_service import VannaService, get_vanna
+from app.services.ask_service import refresh_sample_questions
+from app.services.executor_service import run_in_stage
+
+logger = logging.getLogger(__name__)
+
+
+def ping_postgres(vanna: VannaService):
+    with vanna.pg_pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+
+
+class WarmUp:
+    """
+    Lifespan warm-up of the Vanna instance and the models behind it.
+
+    The server accepts requests right away: start() builds Vanna in the
+    background (retrying every WARMUP_RETRY_SECONDS while PostgreSQL or
+    Chroma are unavailable), then loads the embedding model, preloads the
+    Ollama model and starts the chart workers. Each step's status and
+    duration is reported by the readiness probe next to live checks of
+    PostgreSQL, Chroma and Ollama.
+    """
+
+    def __init__(self):
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.task: Optional[asyncio.Task] = None
+        self._vanna_task: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+
+    async def _step(self, name: str, work: Awaitable) -> Any:
+        self.steps[name] = {"status": "running"}
+        started = time.perf_counter()
+        try:
+            result = await work
+        except Exception as e:
+            seconds = time.perf_counter() - started
+            self.steps[name] = {"status": "failed", "seconds": seconds, "error": str(e)}
+            logger.error("❌ Warm-up %s failed after %.2fs: %s", name, seconds, e)
+            raise
+        seconds = time.perf_counter() - started
+        self.steps[name] = {"status": "ready", "seconds": seconds}
+        logger.info("🔥 Warm-up %s done in %.2fs", name, seconds)
+        return result
+
+    async def _optional_step(self, name: str, work: Awaitable):
+        # Failures are reported by the readiness probe, not raised.
+        try:
+            await self._step(name, work)
+        except Exception:
+            pass
+
+    async def ensure_vanna(self) -> VannaService:
+        """The Vanna instance, waiting for (or starting) its construction."""
+        if vanna_service.vanna is not None:
+            self.steps.setdefault("vanna", {"status": "ready", "seconds": 0.0})
+            return vanna_service.vanna
+        if self._vanna_task is None or self._vanna_task.done():
+            self._vanna_task = asyncio.ensure_future(
+                self._step("vanna", run_in_stage("train", get_vanna))
+            )
+        return await asyncio.shield(self._vanna_task)
+
+    async def run(self):
+        while True:
+            try:
+                vanna = await self.ensure_vanna()
+                break
+            except Exception:
+                await asyncio.sleep(settings.warmup_retry_seconds)
+
+        steps = [
+            self._optional_step(
+                "embedding", run_in_stage("llm", vanna.generate_embedding, "warm up")
+            ),
+            self._optional_step("chart", self._warm_up_charts()),
+        ]
+        if settings.ollama_preload:
+            steps.append(
+                self._optional_step(
+                    "ollama_preload", run_in_stage("llm", vanna.preload_model)
+                )
+            )
+        else:
+            self.steps["ollama_preload"] = {"status": "skipped"}
+        await asyncio.gather(*steps)
+
+        refresh_sample_questions()
+
+    async def _warm_up_charts(self):
+        # Spawn the chart workers (and their browsers) before the first chart.
+        # Submitted together: one at a time, the pool would keep reusing its
+        # single idle process instead of starting the others.
+        await asyncio.gather(
+            *(run_in_stage("chart", chart_worker.warm_up) for _ in range(settings.chart_workers))
+        )
+
+    def start(self):
+        self.started_at = time.time()
+        self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def readiness(self) -> Dict[str, Any]:
+        """Status of every dependency; ready only when all required ones are."""
+        checks = {
+            name: dict(self.steps.get(name, {"status": "pending"}))
+            for name in ("vanna", "embedding", "ollama_preload", "chart")
+        }
+
+        loop = asyncio.get_running_loop()
+        vanna = vanna_service.vanna
+        for name, check in (
+            ("postgres", lambda: ping_postgres(vanna)),
+            ("chroma", lambda: vanna.chroma_client.heartbeat()),
+            ("ollama", lambda: vanna.ollama_client.ps()),
+        ):
+            if vanna is None:
+                checks[name] = {"status": "pending"}
+                continue
+            started = time.perf_counter()
+            try:
+                # Not on a stage: a busy stage must not fail the probe.
+                await asyncio.wait_for(loop.run_in_executor(None, check), timeout=5)
+                checks[name] = {"status": "ready"}
+            except Exception as e:
+                checks[name] = {"status": "failed", "error": str(e) or type(e).__name__}
+            checks[name]["seconds"] = time.perf_counter() - started
+
+        # A failed preload or chart warm-up only makes the first use slower.
+        ready = all(
+            check["status"] == "ready"
+            for name, check in checks.items()
+            if name not in ("ollama_preload", "chart")
+        )
+        return {
+            "status": "ready" if ready else "not_ready",
+            "version": settings.app_version,
+            "uptime_seconds": time.time() - self.started_at,
+            "checks": checks,
+        }
+
+
+warm_up = WarmUp()
+
+
+def get_warm_up():
+    """Get warm-up instance."""
+    return warm_up
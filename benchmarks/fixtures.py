@@ -0,0 +1,120 @@
+"""
+Benchmark workload: a seeded sales table and the questions asked about it.
+
+Every question has a fixed SQL answer so the stub LLM is deterministic and
+the SQL stage does the same work on every run.
+"""
+
+import logging
+from typing import Dict, List
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+TABLE = "bench_sales"
+
+DDL = f"""CREATE TABLE {TABLE} (
+    trx_date DATE NOT NULL,
+    region TEXT NOT NULL,
+    area TEXT NOT NULL,
+    channel_name TEXT NOT NULL,
+    product_commercial_name TEXT NOT NULL,
+    trx INTEGER NOT NULL,
+    revenue NUMERIC(14, 2) NOT NULL
+)"""
+
+DOCUMENTATION = [
+    f"{TABLE} has one row per day, region, area, channel and product.",
+    "trx is the number of transactions and revenue is in rupiah.",
+    "Regions are REGION-01 to REGION-10, each with areas AREA-01 to AREA-05.",
+]
+
+# (question, sql) pairs; together they cover small aggregates, wide
+# group-bys and a 1000-row preview so every response size is exercised.
+WORKLOAD = [
+    (
+        "What is the total revenue per region?",
+        f"SELECT region, SUM(revenue) AS revenue FROM {TABLE} GROUP BY region ORDER BY region",
+    ),
+    (
+        "How many transactions per channel?",
+        f"SELECT channel_name, SUM(trx) AS trx FROM {TABLE} GROUP BY channel_name ORDER BY trx DESC",
+    ),
+    (
+        "What is the monthly revenue trend?",
+        f"SELECT date_trunc('month', trx_date)::date AS month, SUM(revenue) AS revenue "
+        f"FROM {TABLE} GROUP BY 1 ORDER BY 1",
+    ),
+    (
+        "Which are the top 10 products by revenue?",
+        f"SELECT product_commercial_name, SUM(revenue) AS revenue FROM {TABLE} "
+        f"GROUP BY product_commercial_name ORDER BY revenue DESC LIMIT 10",
+    ),
+    (
+        "What is the revenue per area and channel?",
+        f"SELECT region, area, channel_name, SUM(revenue) AS revenue FROM {TABLE} "
+        f"GROUP BY region, area, channel_name ORDER BY region, area, channel_name",
+    ),
+    (
+        "What is the average revenue per transaction per product?",
+        f"SELECT product_commercial_name, ROUND(SUM(revenue) / NULLIF(SUM(trx), 0), 2) "
+        f"AS revenue_per_trx FROM {TABLE} GROUP BY product_commercial_name ORDER BY 2 DESC",
+    ),
+    (
+        "Show the latest 1000 transactions",
+        f"SELECT trx_date, region, area, channel_name, product_commercial_name, trx, revenue "
+        f"FROM {TABLE} ORDER BY trx_date DESC, region, area LIMIT 1000",
+    ),
+    (
+        "What is the daily revenue in REGION-01?",
+        f"SELECT trx_date, SUM(revenue) AS revenue FROM {TABLE} "
+        f"WHERE region = 'REGION-01' GROUP BY trx_date ORDER BY trx_date",
+    ),
+]
+
+FOLLOWUP_QUESTIONS = [question for question, _ in WORKLOAD[:5]]
+
+
+def training_records() -> List[Dict[str, str]]:
+    """Training data loaded into the stub vector store."""
+    records = [{"question": question, "sql": sql} for question, sql in WORKLOAD]
+    records.append({"ddl": DDL})
+    records.extend({"documentation": doc} for doc in DOCUMENTATION)
+    return records
+
+
+def seed_postgres(conn_str: str, rows: int = 200_000) -> int:
+    """(Re)create the benchmark table with `rows` deterministic rows; returns the count."""
+    conn = psycopg2.connect(conn_str)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s)", (TABLE,))
+            if cur.fetchone()[0] is not None:
+                cur.execute(f"SELECT COUNT(*) FROM {TABLE}")
+                if cur.fetchone()[0] == rows:
+                    logger.info("🌱 %s already has %d rows", TABLE, rows)
+                    return rows
+                cur.execute(f"DROP TABLE {TABLE}")
+
+            cur.execute(DDL)
+            # Derived from the row number only, so every seed is identical.
+            cur.execute(
+                f"""
+                INSERT INTO {TABLE}
+                SELECT
+                    DATE '2024-01-01' + (i % 365),
+                    'REGION-' || lpad((1 + i % 10)::text, 2, '0'),
+                    'AREA-' || lpad((1 + (i / 10) % 5)::text, 2, '0'),
+                    (ARRAY['Retail', 'Online', 'Partner', 'Direct'])[1 + (i / 50) % 4],
+                    'PRODUCT-' || lpad((1 + (i * 7) % 40)::text, 3, '0'),
+                    1 + (i * 13) % 20,
+                    ((i * 7919) % 1000000) / 100.0
+                FROM generate_series(0, {int(rows) - 1}) AS i
+                """
+            )
+            cur.execute(f"ANALYZE {TABLE}")
+        logger.info("🌱 Seeded %s with %d rows", TABLE, rows)
+        return rows
+    finally:
+        conn.close()
@@ -0,0 +1,493 @@
+"""
+Offline benchmark of the API and the Open WebUI pipeline.
+
+Usage:
+    python -m benchmarks.run --requests 200 --concurrency 16
+    python -m benchmarks.run --output benchmarks/results/after.json \\
+        --baseline benchmarks/results/before.json --fail-on-regression
+
+The API runs in a subprocess (benchmarks/server.py) with a stub LLM and an
+in-memory stub vector store, both with configurable latency, against a
+seeded table in a local PostgreSQL (BENCH_POSTGRES_CONN or POSTGRES_CONN).
+Each phase sends --requests requests to one endpoint, --concurrency at a
+time, and reports p50/p95/p99 latency, throughput and the peak RSS of the
+server process tree. Results are saved as JSON; with --baseline, p95 and
+throughput changes beyond --threshold are reported as regressions.
+
+Routes that change the database schema or drop shared state
+(sync_schema, remove_training_data, invalidate_results) are not driven.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.fixtures import WORKLOAD, seed_postgres
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FOLDER = os.path.join(ROOT, "benchmarks", "results")
+
+SUMMARY = "Revenue is highest in REGION-01 and grows every month. " * 4
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class RSSSampler(threading.Thread):
+    """Samples the RSS of a process and its children from /proc."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.phase_peak = 0
+        self._stop_event = threading.Event()
+
+    def _tree(self, pid: int) -> List[int]:
+        pids = [pid]
+        try:
+            for task in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{task}/children") as f:
+                    for child in f.read().split():
+                        pids.extend(self._tree(int(child)))
+        except OSError:
+            pass
+        return pids
+
+    def rss(self) -> int:
+        total = 0
+        for pid in self._tree(self.pid):
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1]) * 1024
+                            break
+            except OSError:
+                pass
+        return total
+
+    def reset_phase(self):
+        self.phase_peak = self.rss()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            rss = self.rss()
+            self.peak = max(self.peak, rss)
+            self.phase_peak = max(self.phase_peak, rss)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_stub_ollama(latency: float, token_latency: float) -> ThreadingHTTPServer:
+    """OpenAI-compatible streaming endpoint used by the pipeline for its summary."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for word in SUMMARY.split(" "):
+                if token_latency:
+                    time.sleep(token_latency)
+                chunk = {"choices": [{"delta": {"content": word + " "}}]}
+                self.wfile.write(("data: %s\n\n" % json.dumps(chunk)).encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def summarize(latencies: List[float], errors: int, seconds: float, peak_rss: int) -> dict:
+    ms = np.asarray(latencies) * 1000
+    ok = len(latencies)
+    return {
+        "requests": ok + errors,
+        "errors": errors,
+        "p50_ms": float(np.percentile(ms, 50)) if ok else None,
+        "p95_ms": float(np.percentile(ms, 95)) if ok else None,
+        "p99_ms": float(np.percentile(ms, 99)) if ok else None,
+        "mean_ms": float(ms.mean()) if ok else None,
+        "max_ms": float(ms.max()) if ok else None,
+        "throughput_rps": ok / seconds if seconds else None,
+        "peak_rss_mb": peak_rss / 2**20,
+    }
+
+
+class Benchmark:
+    def __init__(self, args, base_url: str, sampler: RSSSampler):
+        self.args = args
+        self.base_url = base_url
+        self.sampler = sampler
+        self.results: Dict[str, dict] = {}
+        self.ids: List[str] = []
+        self.client: Optional[httpx.AsyncClient] = None
+
+    def question(self, i: int) -> str:
+        return WORKLOAD[i % len(WORKLOAD)][0]
+
+    def id(self, i: int) -> str:
+        return self.ids[i % len(self.ids)]
+
+    async def get(self, path: str, **params) -> httpx.Response:
+        response = await self.client.get(path, params=params)
+        response.raise_for_status()
+        return response
+
+    async def phase(self, name: str, request: Callable[[int], Awaitable], ttfb: bool = False):
+        """Run --requests calls of request(i), --concurrency at a time."""
+        if name in self.args.skip:
+            return
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        latencies, first_bytes, errors = [], [], []
+
+        async def one(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    first = await request(i)
+                except Exception as e:
+                    errors.append(str(e) or type(e).__name__)
+                    return
+                latencies.append(time.perf_counter() - started)
+                if ttfb and first is not None:
+                    first_bytes.append(first - started)
+
+        self.sampler.reset_phase()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(self.args.requests)))
+        seconds = time.perf_counter() - started
+
+        peak = self.sampler.phase_peak
+        self.results[name] = summarize(latencies, len(errors), seconds, peak)
+        if ttfb:
+            self.results[name + ".ttfb"] = summarize(first_bytes, len(errors), seconds, peak)
+        if errors:
+            self.results[name]["first_error"] = errors[0]
+        print_row(name, self.results[name])
+        if ttfb:
+            print_row(name + ".ttfb", self.results[name + ".ttfb"])
+
+    async def stream(self, path: str, **params) -> float:
+        """Read a streamed response to the end; returns the time of the first chunk."""
+        first = None
+        async with self.client.stream("GET", path, params=params) as response:
+            response.raise_for_status()
+            async for _ in response.aiter_bytes():
+                if first is None:
+                    first = time.perf_counter()
+        return first
+
+    async def ask(self, i: int) -> float:
+        first = None
+        chart = "chart" not in self.args.skip
+        params = {"question": self.question(i), "chart": chart}
+        async with self.client.stream("GET", "/api/ask", params=params) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if first is None and line.startswith("event: "):
+                    first = time.perf_counter()
+                if line == "event: error":
+                    raise RuntimeError("error event")
+        return first
+
+    def pipe(self, pipeline, i: int) -> float:
+        first = None
+        for chunk in pipeline.pipe(self.question(i), "vanna", [], {}):
+            if first is None and isinstance(chunk, str):
+                first = time.perf_counter()
+            if isinstance(chunk, dict) and "Error" in chunk["event"]["data"]["description"]:
+                raise RuntimeError(chunk["event"]["data"]["description"])
+        return first
+
+    async def run_pipeline(self, ollama_url: str):
+        if "pipeline" in self.args.skip:
+            return
+        os.environ.update(
+            API_URL=self.base_url,
+            OLLAMA_BASE_URL=ollama_url,
+            POOL_SIZE=str(self.args.concurrency),
+            MAX_RETRIES="0",
+        )
+        sys.path.insert(0, os.path.join(ROOT, "pipelines"))
+        from vanna_fastapi_pipeline import Pipeline
+
+        pipeline = Pipeline()
+        loop = asyncio.get_running_loop()
+        try:
+            await self.phase(
+                "pipeline",
+                lambda i: loop.run_in_executor(None, self.pipe, pipeline, i),
+                ttfb=True,
+            )
+        finally:
+            await pipeline.on_shutdown()
+
+    async def run(self, ollama_url: str):
+        limits = httpx.Limits(max_connections=self.args.concurrency * 2)
+        timeout = httpx.Timeout(self.args.timeout)
+        async with httpx.AsyncClient(
+            base_url=self.base_url, limits=limits, timeout=timeout
+        ) as self.client:
+            await self.phase(
+                "generate_sql",
+                lambda i: self.get("/api/generate_sql", question=self.question(i), use_cache=False),
+            )
+            await self.phase(
+                "generate_sql.cached",
+                lambda i: self.get("/api/generate_sql", question=self.question(i)),
+            )
+
+            # One cache id per workload question for the id-based routes.
+            for question, _ in WORKLOAD:
+                response = await self.get("/api/generate_sql", question=question)
+                id = response.json()["id"]
+                await self.get("/api/run_sql", id=id)
+                self.ids.append(id)
+
+            await self.phase("run_sql", lambda i: self.get("/api/run_sql", id=self.id(i)))
+            await self.phase(
+                "run_sql.stream",
+                lambda i: self.stream("/api/run_sql", id=self.id(i), stream=True),
+                ttfb=True,
+            )
+            await self.phase(
+                "generate_followup_questions",
+                lambda i: self.get("/api/generate_followup_questions", id=self.id(i)),
+            )
+            if "chart" not in self.args.skip:
+                await self.phase(
+                    "generate_plotly_figure",
+                    lambda i: self.get("/api/generate_plotly_figure", id=self.id(i)),
+                )
+                await self.phase(
+                    "load_question", lambda i: self.get("/api/load_question", id=self.id(i))
+                )
+            await self.phase(
+                "download_csv",
+                lambda i: self.stream("/api/download_csv", id=self.id(i)),
+                ttfb=True,
+            )
+            await self.phase("generate_questions", lambda i: self.get("/api/generate_questions"))
+            await self.phase("get_training_data", lambda i: self.get("/api/get_training_data"))
+            await self.phase(
+                "get_question_history", lambda i: self.get("/api/get_question_history")
+            )
+            await self.phase(
+                "get_question_history.search",
+                lambda i: self.get("/api/get_question_history", search="revenue", limit=10),
+            )
+            await self.phase("stage_stats", lambda i: self.get("/api/stats/stage"))
+            await self.phase("ask", self.ask, ttfb=True)
+            await self.run_pipeline(ollama_url)
+
+            # Training last: it grows the store the other phases search.
+            await self.phase("train", self.train)
+            await self.phase("train_bulk", self.train_bulk)
+
+    async def train(self, i: int):
+        question, sql = WORKLOAD[i % len(WORKLOAD)]
+        body = {"question": "%s (%d)" % (question, i), "sql": sql}
+        response = await self.client.post("/api/train", json=body)
+        response.raise_for_status()
+
+    async def train_bulk(self, i: int):
+        lines = [
+            json.dumps({"question": "%s [%d.%d]" % (q, i, n), "sql": sql})
+            for n, (q, sql) in enumerate(WORKLOAD * 4)
+        ]
+        response = await self.client.post(
+            "/api/train_bulk", params={"format": "jsonl"}, content="\n".join(lines)
+        )
+        response.raise_for_status()
+
+
+def print_row(name: str, result: dict):
+    def fmt(value, pattern="%8.1f"):
+        return pattern % value if value is not None else "%8s" % "-"
+
+    print(
+        "%-30s %6d %5d %s %s %s %s %s"
+        % (
+            name,
+            result["requests"],
+            result["errors"],
+            fmt(result["p50_ms"]),
+            fmt(result["p95_ms"]),
+            fmt(result["p99_ms"]),
+            fmt(result["throughput_rps"]),
+            fmt(result["peak_rss_mb"]),
+        )
+    )
+
+
+def print_header():
+    print(
+        "%-30s %6s %5s %8s %8s %8s %8s %8s"
+        % ("endpoint", "reqs", "errs", "p50 ms", "p95 ms", "p99 ms", "req/s", "rss MB")
+    )
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Print the change against a baseline run; returns the regressed endpoints."""
+    regressions = []
+    print("\n%-30s %10s %10s %10s" % ("endpoint", "p95", "req/s", "rss"))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or result["p95_ms"] is None or not base.get("p95_ms"):
+            continue
+        p95 = result["p95_ms"] / base["p95_ms"] - 1
+        rps = result["throughput_rps"] / base["throughput_rps"] - 1
+        rss = result["peak_rss_mb"] / base["peak_rss_mb"] - 1 if base["peak_rss_mb"] else 0
+        regressed = p95 > threshold or rps < -threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            "%-30s %+9.1f%% %+9.1f%% %+9.1f%%%s"
+            % (name, p95 * 100, rps * 100, rss * 100, "  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def wait_ready(server: subprocess.Popen, base_url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("Benchmark server exited with code %d" % server.returncode)
+        try:
+            if httpx.get(base_url + "/health/ready", timeout=5).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit("Benchmark server not ready after %.0fs" % timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline API benchmark with stub LLM")
+    parser.add_argument(
+        "--postgres",
+        default=os.environ.get("BENCH_POSTGRES_CONN") or os.environ.get("POSTGRES_CONN"),
+        help="PostgreSQL the benchmark table is seeded in",
+    )
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows in bench_sales")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds per request")
+    parser.add_argument(
+        "--skip", nargs="*", default=[], help="Phases to skip, e.g. chart pipeline train"
+    )
+    parser.add_argument("--output", default=os.path.join(RESULTS_FOLDER, "latest.json"))
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative change")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--server-log", help="File for the server output")
+    args = parser.parse_args()
+
+    if not args.postgres:
+        raise SystemExit("Set BENCH_POSTGRES_CONN, POSTGRES_CONN or --postgres")
+    seed_postgres(args.postgres, args.rows)
+
+    ollama = start_stub_ollama(args.llm_latency, args.token_latency)
+    ollama_url = "http://127.0.0.1:%d" % ollama.server_address[1]
+
+    port = free_port()
+    base_url = "http://127.0.0.1:%d" % port
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.server",
+            "--port", str(port),
+            "--llm-latency", str(args.llm_latency),
+            "--token-latency", str(args.token_latency),
+            "--embed-latency", str(args.embed_latency),
+        ],
+        cwd=ROOT,
+        env=dict(os.environ, BENCH_POSTGRES_CONN=args.postgres),
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    sampler = RSSSampler(server.pid)
+    try:
+        wait_ready(server, base_url, timeout=180)
+        sampler.start()
+        print("Server ready, RSS %.1f MB\n" % (sampler.rss() / 2**20))
+
+        print_header()
+        benchmark = Benchmark(args, base_url, sampler)
+        started = time.perf_counter()
+        asyncio.run(benchmark.run(ollama_url))
+        seconds = time.perf_counter() - started
+    finally:
+        sampler.stop()
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        ollama.shutdown()
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "seconds": seconds,
+            "peak_rss_mb": sampler.peak / 2**20,
+            "args": {k: v for k, v in vars(args).items() if k != "postgres"},
+        },
+        "results": benchmark.results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("\nSaved %s (%.1fs, peak RSS %.1f MB)" % (args.output, seconds, sampler.peak / 2**20))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(benchmark.results, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            raise SystemExit("Regressions: %s" % ", ".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
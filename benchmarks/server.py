@@ -0,0 +1,60 @@
+"""
+Run the API with BenchVannaService instead of the Chroma/Ollama backed one.
+
+Started by benchmarks/run.py in its own process so its RSS can be sampled;
+it can also be run by hand to profile the app against the stubs:
+
+    python -m benchmarks.server --port 4399 --llm-latency 0.2
+"""
+
+import os
+import argparse
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vanna API with stub LLM and vector store")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4399)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per LLM call")
+    parser.add_argument(
+        "--token-latency", type=float, default=0.0, help="Extra seconds per generated token"
+    )
+    parser.add_argument(
+        "--embed-latency", type=float, default=0.0, help="Seconds per embedding call"
+    )
+    args = parser.parse_args()
+
+    # Settings are read on import, so the environment must be ready first.
+    workdir = tempfile.mkdtemp(prefix="vanna-bench-")
+    os.environ.setdefault("MODEL_NAME", "stub")
+    os.environ.setdefault("STATIC_FOLDER", os.path.join(workdir, "static"))
+    os.environ.setdefault("SQLITE_PATH", os.path.join(workdir, "semantic.sqlite"))
+    os.environ.setdefault("CHROMA_FOLDER", os.path.join(workdir, "chroma"))
+    os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "False")
+    os.environ.setdefault("OLLAMA_PRELOAD", "False")
+    os.environ.setdefault("DEBUG", "False")
+    os.makedirs(os.environ["STATIC_FOLDER"], exist_ok=True)
+    if os.environ.get("BENCH_POSTGRES_CONN"):
+        os.environ["POSTGRES_CONN"] = os.environ["BENCH_POSTGRES_CONN"]
+
+    import uvicorn
+
+    from app.services import vanna_service
+    from benchmarks import stubs
+
+    stubs.BENCH_CONFIG.update(
+        llm_latency=args.llm_latency,
+        token_latency=args.token_latency,
+        embed_latency=args.embed_latency,
+    )
+    # get_vanna_instance() still connects the real PostgreSQL pool and run_sql.
+    vanna_service.VannaService = stubs.BenchVannaService
+
+    from app.main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Deterministic stand-ins for the Ollama and ChromaDB_VectorStore mixins.
+
+BenchVannaService keeps every VannaService override (single-flight,
+prompt budget, streaming, bulk_add, PostgreSQL pool) but answers prompts
+from the benchmark workload after a configurable delay and keeps training
+data in in-memory collections with hashed bag-of-words embeddings.
+"""
+
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from vanna.base import VannaBase
+
+from app.services.vanna_service import VannaService
+from benchmarks.fixtures import FOLLOWUP_QUESTIONS, WORKLOAD, training_records
+
+logger = logging.getLogger(__name__)
+
+PLOTLY_CODE = "fig = px.bar(df, x=df.columns[0], y=df.columns[-1])"
+
+
+class StubEmbeddingFunction:
+    """Hashed bag-of-words vectors, `latency` seconds per call."""
+
+    def __init__(self, latency: float = 0.0, dim: int = 128):
+        self.latency = latency
+        self.dim = dim
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        if self.latency:
+            time.sleep(self.latency)
+        vectors = []
+        for text in input:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for word in text.lower().replace("?", " ").split():
+                digest = hashlib.md5(word.encode("utf-8")).digest()
+                vector[int.from_bytes(digest[:4], "little") % self.dim] += 1
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+class StubCollection:
+    """The part of the Chroma collection API that Vanna and this service use."""
+
+    def __init__(self, name: str, embedding_function: Callable):
+        self.name = name
+        self.embedding_function = embedding_function
+        self.documents: Dict[str, str] = {}
+        self.embeddings: Dict[str, np.ndarray] = {}
+
+    def count(self) -> int:
+        return len(self.documents)
+
+    def add(self, ids, documents=None, embeddings=None, metadatas=None):
+        ids, documents = _as_list(ids), _as_list(documents)
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        elif len(ids) == 1 and np.ndim(embeddings) == 1:
+            embeddings = [embeddings]
+        for id, document, embedding in zip(ids, documents, embeddings):
+            # Like Chroma, adding an existing id is a no-op.
+            if id not in self.documents:
+                self.documents[id] = document
+                self.embeddings[id] = np.asarray(embedding, dtype=np.float32)
+
+    def upsert(self, ids, documents=None, embeddings=None, metadatas=None):
+        self.delete(ids=ids)
+        self.add(ids, documents, embeddings, metadatas)
+
+    def delete(self, ids=None, where=None):
+        for id in _as_list(ids):
+            self.documents.pop(id, None)
+            self.embeddings.pop(id, None)
+
+    def get(self, ids=None, limit=None, offset=None, where_document=None, include=None):
+        if ids is not None:
+            selected = [id for id in _as_list(ids) if id in self.documents]
+        else:
+            selected = list(self.documents)
+        if where_document and "$contains" in where_document:
+            needle = where_document["$contains"]
+            selected = [id for id in selected if needle in self.documents[id]]
+        selected = selected[offset or 0 :]
+        if limit is not None:
+            selected = selected[:limit]
+        return {"ids": selected, "documents": [self.documents[id] for id in selected]}
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, **kwargs):
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(_as_list(query_texts))
+        ids = list(self.documents)
+        result = {"ids": [], "documents": [], "distances": []}
+        matrix = np.stack([self.embeddings[id] for id in ids]) if ids else None
+        for query in query_embeddings:
+            if matrix is None:
+                order, distances = [], np.zeros(0)
+            else:
+                distances = 1 - matrix @ np.asarray(query, dtype=np.float32)
+                order = np.argsort(distances, kind="stable")[:n_results]
+            result["ids"].append([ids[i] for i in order])
+            result["documents"].append([self.documents[ids[i]] for i in order])
+            result["distances"].append([float(distances[i]) for i in order])
+        return result
+
+
+class StubChromaClient:
+    def heartbeat(self) -> int:
+        return time.time_ns()
+
+
+class StubOllamaClient:
+    """Answers chat calls from the workload after `latency` (+ per-token) seconds."""
+
+    def __init__(self, answer: Callable[[list], str], latency: float, token_latency: float):
+        self.answer = answer
+        self.latency = latency
+        self.token_latency = token_latency
+
+    def _stream(self, tokens: List[str]) -> Iterator[Dict[str, Any]]:
+        time.sleep(self.latency)
+        for token in tokens:
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield {"message": {"content": token}}
+
+    def chat(self, model=None, messages=None, stream=False, **kwargs):
+        text = self.answer(messages)
+        tokens = [word + " " for word in text.split(" ")]
+        tokens[-1] = tokens[-1][:-1]
+        if stream:
+            return self._stream(tokens)
+        time.sleep(self.latency + self.token_latency * len(tokens))
+        return {"message": {"content": text}}
+
+    def generate(self, model=None, prompt=None, **kwargs):
+        return {"response": ""}
+
+    def list(self):
+        return {"models": []}
+
+    def ps(self):
+        return {"models": []}
+
+    def pull(self, model):
+        pass
+
+
+class StubVectorStore:
+    """Stand-in for the ChromaDB_VectorStore mixin, whose methods run on StubCollections."""
+
+    def __init__(self, config: Optional[dict] = None):
+        config = config or {}
+        self.embedding_function = StubEmbeddingFunction(
+            latency=config.get("embed_latency", 0.0)
+        )
+        self.n_results_sql = config.get("n_results_sql", config.get("n_results", 10))
+        self.n_results_documentation = config.get(
+            "n_results_documentation", config.get("n_results", 10)
+        )
+        self.n_results_ddl = config.get("n_results_ddl", config.get("n_results", 10))
+        self.chroma_client = StubChromaClient()
+        self.sql_collection = StubCollection("sql", self.embedding_function)
+        self.ddl_collection = StubCollection("ddl", self.embedding_function)
+        self.documentation_collection = StubCollection(
+            "documentation", self.embedding_function
+        )
+
+
+class StubLLM:
+    """Stand-in for the Ollama mixin: a StubOllamaClient answering from WORKLOAD."""
+
+    def __init__(self, config: Optional[dict] = None):
+        config = config or {}
+        self.host = "stub"
+        self.model = config.get("model", "stub:latest")
+        self.keep_alive = None
+        self.ollama_options = {}
+        self.num_ctx = 2048
+        self.ollama_timeout = 240.0
+        self.ollama_client = StubOllamaClient(
+            self.stub_answer,
+            latency=config.get("llm_latency", 0.0),
+            token_latency=config.get("token_latency", 0.0),
+        )
+
+    @staticmethod
+    def stub_answer(messages: list) -> str:
+        text = json.dumps(messages).lower()
+        if "followup questions" in text:
+            return "\n".join(FOLLOWUP_QUESTIONS)
+        if "plotly" in text:
+            return "```python\n%s\n```" % PLOTLY_CODE
+
+        question = messages[-1]["content"].strip().lower()
+        for known, sql in WORKLOAD:
+            if known.lower() == question:
+                return "```sql\n%s\n```" % sql
+        # Unknown questions get the query sharing the most words.
+        words = set(question.split())
+        _, sql = max(WORKLOAD, key=lambda pair: len(words & set(pair[0].lower().split())))
+        return "```sql\n%s\n```" % sql
+
+
+class BenchVannaService(VannaService, StubVectorStore, StubLLM):
+    """VannaService with the Chroma and Ollama mixins replaced by stubs."""
+
+    def __init__(self, config=None) -> None:
+        config = dict(config or {})
+        config.update(BENCH_CONFIG)
+        VannaBase.__init__(self, config=config)
+        StubVectorStore.__init__(self, config)
+        StubLLM.__init__(self, config)
+        self.pg_pool = None
+
+        documents = {"sql": [], "ddl": [], "documentation": []}
+        for record in training_records():
+            if "question" in record:
+                documents["sql"].append(json.dumps(record, ensure_ascii=False))
+            for kind in ("ddl", "documentation"):
+                if kind in record:
+                    documents[kind].append(record[kind])
+        for kind, items in documents.items():
+            self.bulk_add(kind, items)
+
+
+# Latencies are set by benchmarks.server from its command line.
+BENCH_CONFIG: Dict[str, Any] = {}
@@ -1,6 +1,30 @@
 
 from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+import atexit
+import base64
+import bisect
+import datetime
+import decimal
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 import uuid
+import weakref
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
 
 
 class Cache(ABC):
@@ -24,6 +48,52 @@ class Cache(ABC):
     def delete(self, id):
         pass
 
+    def expired(self, id, field) -> bool:
+        """Whether the field was dropped by eviction or TTL rather than never set."""
+        return False
+
+    def add_eviction_listener(self, listener):
+        """Call listener(id, field) when cached data is dropped; field is None for a whole entry."""
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+    def add_question(self, id, question, user_id=None, session_id=None):
+        """Set the question field and add it to the history asked by user/session."""
+        self.set(id, "question", question)
+        self.set(id, "asker", {"user_id": user_id, "session_id": session_id, "asked_at": time.time()})
+
+    def question_history(
+        self, limit=50, cursor=None, user_id=None, session_id=None, search=None
+    ):
+        """
+        Newest-first page of asked questions, optionally filtered by user,
+        session and words of the question.
+
+        Returns (items, next_cursor); pass next_cursor back as `cursor` for
+        the next page, it is None on the last one. This fallback walks get_all().
+        """
+        items = []
+        for entry in reversed(self.get_all(field_list=["question", "asker"])):
+            asker = entry.pop("asker") or {}
+            if entry["question"] is None:
+                continue
+            entry.update(
+                user_id=asker.get("user_id"),
+                session_id=asker.get("session_id"),
+                asked_at=asker.get("asked_at"),
+            )
+            if question_matches(entry, user_id, session_id, search):
+                items.append(entry)
+        start = cursor or 0
+        page = items[start : start + limit]
+        return page, start + limit if start + limit < len(items) else None
+
+    def close(self):
+        """Release what the cache keeps outside the process (files, connections)."""
+        pass
+
 
 class MemoryCache(Cache):
     def __init__(self):
@@ -56,3 +126,1190 @@ class MemoryCache(Cache):
     def delete(self, id):
         if id in self.cache:
             del self.cache[id]
+
+
+def estimate_size(value) -> int:
+    """Rough in-memory size of a cached value in bytes."""
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(index=True, deep=True).sum())
+
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items()
+        )
+
+    return sys.getsizeof(value)
+
+
+_WORD = re.compile(r"\w+")
+
+
+def search_terms(text: str) -> set:
+    """Lowercased words of a question, as matched by question_history(search=...)."""
+    return set(_WORD.findall(text.lower())) if text else set()
+
+
+def question_matches(item: dict, user_id=None, session_id=None, search=None) -> bool:
+    return (
+        (user_id is None or item["user_id"] == user_id)
+        and (session_id is None or item["session_id"] == session_id)
+        and search_terms(search) <= search_terms(item["question"])
+    )
+
+
+def _contains(seqs: list, seq: int) -> bool:
+    i = bisect.bisect_left(seqs, seq)
+    return i < len(seqs) and seqs[i] == seq
+
+
+class QuestionIndex:
+    """
+    Time-ordered index of asked questions for paginated history.
+
+    Every question gets an increasing sequence number, which is also the
+    page cursor. All questions, each user, each session and each search term
+    have an ascending list of those numbers, so a page is one bisect and a
+    walk backwards over the shortest matching list. Removed questions are
+    skipped and purged once they outnumber the live ones.
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.seqs = {}
+        self.scopes = defaultdict(list)
+        self.next_seq = 1
+        self.removed = 0
+
+    @staticmethod
+    def _scopes(record):
+        scopes = [("all",)]
+        if record["user_id"] is not None:
+            scopes.append(("user", record["user_id"]))
+        if record["session_id"] is not None:
+            scopes.append(("session", record["session_id"]))
+        scopes.extend(("term", term) for term in search_terms(record["question"]))
+        return scopes
+
+    def add(self, id, question, user_id=None, session_id=None):
+        self.remove(id)
+        seq = self.next_seq
+        self.next_seq += 1
+        record = {
+            "id": id,
+            "question": question,
+            "user_id": user_id,
+            "session_id": session_id,
+            "asked_at": time.time(),
+        }
+        self.records[seq] = record
+        self.seqs[id] = seq
+        for scope in self._scopes(record):
+            self.scopes[scope].append(seq)
+
+    def remove(self, id):
+        seq = self.seqs.pop(id, None)
+        if seq is None:
+            return
+        del self.records[seq]
+        self.removed += 1
+        if self.removed > max(1024, len(self.records)):
+            # records is in insertion (= sequence) order, so the lists stay sorted.
+            self.scopes = defaultdict(list)
+            for seq, record in self.records.items():
+                for scope in self._scopes(record):
+                    self.scopes[scope].append(seq)
+            self.removed = 0
+
+    def page(self, limit, cursor=None, user_id=None, session_id=None, search=None, skip=None):
+        """Like Cache.question_history; skip(id) hides entries without removing them."""
+        scopes = []
+        if user_id is not None:
+            scopes.append(("user", user_id))
+        if session_id is not None:
+            scopes.append(("session", session_id))
+        scopes.extend(("term", term) for term in search_terms(search))
+        lists = [self.scopes.get(scope, []) for scope in scopes or [("all",)]]
+        lists.sort(key=len)
+        driver, others = lists[0], lists[1:]
+
+        end = len(driver) if cursor is None else bisect.bisect_left(driver, cursor)
+        items, last_seq = [], None
+        for i in range(end - 1, -1, -1):
+            seq = driver[i]
+            record = self.records.get(seq)
+            if record is None or (skip is not None and skip(record["id"])):
+                continue
+            if all(_contains(seqs, seq) for seqs in others):
+                if len(items) == limit:
+                    return items, last_seq
+                items.append(dict(record))
+                last_seq = seq
+        return items, None
+
+
+def _compact_column(column: pd.Series) -> pd.Series:
+    # Numeric columns keep their dtype: chart and follow-up code does
+    # arithmetic on them, which overflows or wraps in narrower integers.
+    # Columns with NULLs stay as they are: NA in an Arrow column renders
+    # differently in to_markdown.
+    if column.dtype != object or column.empty or column.isna().any():
+        return column
+
+    try:
+        arrow_type = pa.array(column, from_pandas=True).type
+    except (pa.ArrowException, TypeError, ValueError):
+        return column
+
+    # No categoricals either: groupby on them yields every category, even
+    # ones filtered out, which shows up as empty bars in charts.
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return column.astype("string[pyarrow]")
+    if pa.types.is_date(arrow_type) or pa.types.is_time(arrow_type):
+        return column.astype(pd.ArrowDtype(arrow_type))
+    return column
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shrink a query result for caching without changing how it serializes.
+
+    Object columns without NULLs become Arrow-backed strings, dates and
+    times; numeric and Decimal columns are left alone.
+    """
+    compact = None
+    for i in range(df.shape[1]):
+        column = df.iloc[:, i]
+        converted = _compact_column(column)
+        if converted is not column:
+            if compact is None:
+                compact = df.copy(deep=False)
+            compact.isetitem(i, converted)
+    return df if compact is None else compact
+
+
+_JSON_TAGS = {
+    "$decimal": decimal.Decimal,
+    "$datetime": datetime.datetime.fromisoformat,
+    "$date": datetime.date.fromisoformat,
+    "$time": datetime.time.fromisoformat,
+    "$timedelta": lambda parts: datetime.timedelta(*parts),
+    "$uuid": uuid.UUID,
+    "$bytes": base64.b64decode,
+}
+
+
+def _json_default(value):
+    """Tag the non-JSON values psycopg2 returns so _json_object_hook can restore them."""
+    if isinstance(value, decimal.Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"$time": value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {"$timedelta": [value.days, value.seconds, value.microseconds]}
+    if isinstance(value, uuid.UUID):
+        return {"$uuid": str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$bytes": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("%s values cannot be cached" % type(value).__name__)
+
+
+def _json_object_hook(obj: dict):
+    if len(obj) == 1:
+        ((tag, value),) = obj.items()
+        if tag in _JSON_TAGS:
+            return _JSON_TAGS[tag](value)
+    return obj
+
+
+def dump_json(value) -> str:
+    return json.dumps(value, default=_json_default)
+
+
+def load_json(data):
+    return json.loads(data, object_hook=_json_object_hook)
+
+
+def _arrow_round_trips(column: pd.Series) -> bool:
+    """Whether an object column comes back from Arrow with the same values and dtype."""
+    try:
+        # from_pandas=False: NaN among strings would come back as None.
+        arrow_type = pa.array(column, from_pandas=False).type
+    except (pa.ArrowException, TypeError, ValueError):
+        # Mixed types, e.g. numbers and strings in one column.
+        return False
+    # Structs come back with every key of every row and ints as floats,
+    # lists as numpy arrays and null-free booleans as a bool column.
+    return (
+        pa.types.is_string(arrow_type)
+        or pa.types.is_large_string(arrow_type)
+        or pa.types.is_binary(arrow_type)
+        or pa.types.is_large_binary(arrow_type)
+        or pa.types.is_date(arrow_type)
+        or pa.types.is_time(arrow_type)
+        or pa.types.is_null(arrow_type)
+    )
+
+
+def frame_to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Convert df to an Arrow table that frame_from_arrow() turns back into df.
+
+    Columns are stored by position, so duplicate names (SELECT a.id, b.id)
+    are fine; names and attrs travel in the schema metadata. Object columns
+    Arrow cannot hold as they are (json, arrays, mixed types) are stored as
+    JSON text per cell. Raises TypeError for cells that are not even JSON.
+    """
+    stored = df.copy(deep=False)
+    stored.columns = [str(i) for i in range(df.shape[1])]
+    json_columns = []
+    for i in range(df.shape[1]):
+        column = df.iloc[:, i]
+        if column.dtype == object and not _arrow_round_trips(column):
+            stored.isetitem(i, pd.Series([dump_json(v) for v in column], index=df.index))
+            json_columns.append(i)
+
+    table = pa.Table.from_pandas(stored, preserve_index=True)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"vanna"] = dump_json(
+        {"columns": list(df.columns), "json_columns": json_columns, "attrs": df.attrs}
+    )
+    return table.replace_schema_metadata(metadata)
+
+
+_ARROW_DTYPES = {pa.large_string(): pd.StringDtype("pyarrow")}
+
+
+def frame_from_arrow(table: pa.Table) -> pd.DataFrame:
+    # string[pyarrow] columns are stored as large_string (object strings as
+    # string); mapping them back wraps the Arrow buffers instead of copying.
+    df = table.to_pandas(split_blocks=True, types_mapper=_ARROW_DTYPES.get)
+    metadata = (table.schema.metadata or {}).get(b"vanna")
+    if metadata is None:
+        return df
+
+    metadata = load_json(metadata)
+    for i in metadata["json_columns"]:
+        df.isetitem(
+            i, pd.Series([load_json(v) for v in df.iloc[:, i]], index=df.index, dtype=object)
+        )
+    df.columns = metadata["columns"]
+    df.attrs.update(metadata["attrs"])
+    return df
+
+
+SPILL_PREFIX = "vanna-frames-"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove_stale_spill_folders(folder: str):
+    """Remove spill folders left behind by processes that no longer run."""
+    for name in os.listdir(folder):
+        parts = name.split("-")
+        if name.startswith(SPILL_PREFIX) and parts[2].isdigit() and not _pid_alive(int(parts[2])):
+            shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+
+
+class SpilledFrame:
+    """
+    A cached DataFrame kept in an uncompressed Arrow IPC file.
+
+    load() memory-maps the file, so columns without NULLs come back without
+    copying (as read-only arrays); the loaded frame is shared by callers as
+    long as any of them still holds it.
+    """
+
+    def __init__(self, df: pd.DataFrame, folder: str):
+        self.path = os.path.join(folder, "%s.arrow" % uuid.uuid4().hex)
+        self.rows = len(df)
+        table = frame_to_arrow(df)
+        try:
+            with pa.OSFile(self.path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        except BaseException:
+            self.remove()
+            raise
+        self.nbytes = os.path.getsize(self.path)
+        self._loaded = None
+
+    def load(self) -> pd.DataFrame:
+        df = self._loaded() if self._loaded is not None else None
+        if df is None:
+            table = pa.ipc.open_file(pa.memory_map(self.path, "r")).read_all()
+            df = frame_from_arrow(table)
+            self._loaded = weakref.ref(df)
+        return df
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class BoundedMemoryCache(Cache):
+    """
+    LRU/TTL in-memory cache with entry-count and byte-size limits.
+
+    When the byte budget is exceeded the largest result frames are dropped
+    first; when the entry budget is exceeded the least recently used entries
+    go. Dropped ids are remembered for a while so callers can tell "expired"
+    apart from "never set".
+
+    With a spill_folder, frames of at least spill_min_bytes are written to
+    memory-mapped Arrow files instead of being kept on the heap; those count
+    against max_spill_bytes rather than max_bytes.
+
+    Questions stored with add_question() are also kept in a QuestionIndex,
+    so history pages do not walk the whole cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 3600,
+        max_tombstones: int = 10000,
+        spill_folder: str = None,
+        spill_min_bytes: int = 8 * 1024 * 1024,
+        max_spill_bytes: int = 4 * 1024 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_tombstones = max_tombstones
+        self.spill_min_bytes = spill_min_bytes
+        self.max_spill_bytes = max_spill_bytes
+
+        self.spill_folder = None
+        if spill_folder is not None:
+            # One folder per process: spilled frames are private to this cache.
+            os.makedirs(spill_folder, exist_ok=True)
+            remove_stale_spill_folders(spill_folder)
+            self.spill_folder = tempfile.mkdtemp(
+                prefix="%s%d-" % (SPILL_PREFIX, os.getpid()), dir=spill_folder
+            )
+            atexit.register(self.close)
+        self.spilled_bytes = 0
+        self.spills = 0
+
+        self.cache = OrderedDict()
+        self.sizes = {}
+        self.last_used = {}
+        self.total_bytes = 0
+        self.tombstones = OrderedDict()
+        self.questions = QuestionIndex()
+        self.listeners = []
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.frame_evictions = 0
+        self.expirations = 0
+
+        self.lock = threading.RLock()
+
+    def generate_id(self, *args, **kwargs):
+        return str(uuid.uuid4())
+
+    def _tombstone(self, key):
+        self.tombstones[key] = time.time()
+        self.tombstones.move_to_end(key)
+        while len(self.tombstones) > self.max_tombstones:
+            self.tombstones.popitem(last=False)
+
+    def _notify(self, id, field=None):
+        for listener in self.listeners:
+            listener(id, field)
+
+    def _release(self, value):
+        if isinstance(value, SpilledFrame):
+            value.remove()
+            self.spilled_bytes -= value.nbytes
+
+    def _drop_entry(self, id):
+        for value in self.cache.pop(id, {}).values():
+            self._release(value)
+        self.last_used.pop(id, None)
+        self.total_bytes -= sum(self.sizes.pop(id, {}).values())
+        self.questions.remove(id)
+        self._tombstone(id)
+        self._notify(id)
+
+    def _drop_field(self, id, field):
+        self._release(self.cache[id].pop(field))
+        self.total_bytes -= self.sizes[id].pop(field)
+        if field == "question":
+            self.questions.remove(id)
+        self._tombstone((id, field))
+        self._notify(id, field)
+
+    def _is_stale(self, id) -> bool:
+        return self.ttl is not None and time.time() - self.last_used[id] > self.ttl
+
+    def _largest_frame(self, spilled=False):
+        largest, largest_size = None, 0
+        for id, fields in self.cache.items():
+            for field, value in fields.items():
+                if spilled:
+                    if isinstance(value, SpilledFrame) and value.nbytes > largest_size:
+                        largest, largest_size = (id, field), value.nbytes
+                    continue
+                size = self.sizes[id][field]
+                if hasattr(value, "memory_usage") and size > largest_size:
+                    largest, largest_size = (id, field), size
+        return largest
+
+    def _enforce_limits(self):
+        while len(self.cache) > self.max_entries:
+            id = next(iter(self.cache))
+            self._drop_entry(id)
+            self.evictions += 1
+
+        while self.total_bytes > self.max_bytes and self.cache:
+            frame = self._largest_frame()
+            if frame is not None:
+                self._drop_field(*frame)
+                self.frame_evictions += 1
+            else:
+                self._drop_entry(next(iter(self.cache)))
+                self.evictions += 1
+
+        while self.spilled_bytes > self.max_spill_bytes:
+            self._drop_field(*self._largest_frame(spilled=True))
+            self.frame_evictions += 1
+
+    def set(self, id, field, value):
+        size = estimate_size(value)
+        if (
+            self.spill_folder is not None
+            and isinstance(value, pd.DataFrame)
+            and size >= self.spill_min_bytes
+        ):
+            # Written outside the lock; only the handle is cached.
+            try:
+                value = SpilledFrame(value, self.spill_folder)
+                size = estimate_size(value)
+            except (TypeError, ValueError, pa.ArrowException, OSError) as e:
+                # Cells Arrow and JSON cannot hold, or a full disk: stay on the heap.
+                logger.warning("⚠️ Keeping frame of %s/%s in memory: %s", id, field, e)
+
+        with self.lock:
+            if id not in self.cache:
+                self.cache[id] = {}
+                self.sizes[id] = {}
+
+            self.tombstones.pop(id, None)
+            self.tombstones.pop((id, field), None)
+
+            self._release(self.cache[id].get(field))
+            if isinstance(value, SpilledFrame):
+                self.spilled_bytes += value.nbytes
+                self.spills += 1
+            self.total_bytes += size - self.sizes[id].get(field, 0)
+            self.cache[id][field] = value
+            self.sizes[id][field] = size
+            self.last_used[id] = time.time()
+            self.cache.move_to_end(id)
+
+            self._enforce_limits()
+
+    def get(self, id, field):
+        with self.lock:
+            if id not in self.cache:
+                self.misses += 1
+                return None
+
+            if self._is_stale(id):
+                self._drop_entry(id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.last_used[id] = time.time()
+            self.cache.move_to_end(id)
+
+            if field not in self.cache[id]:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            value = self.cache[id][field]
+
+        return self._load(value)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, SpilledFrame):
+            try:
+                return value.load()
+            except FileNotFoundError:
+                # Evicted by another thread after get() released the lock.
+                return None
+        return value
+
+    def get_all(self, field_list) -> list:
+        with self.lock:
+            ids = [id for id in self.cache if not self._is_stale(id)]
+            entries = [
+                {
+                    "id": id,
+                    **{field: self.cache[id].get(field) for field in field_list},
+                }
+                for id in ids
+            ]
+        for entry in entries:
+            for field in field_list:
+                entry[field] = self._load(entry[field])
+        return entries
+
+    def delete(self, id):
+        with self.lock:
+            if id in self.cache:
+                for value in self.cache.pop(id).values():
+                    self._release(value)
+                self.last_used.pop(id, None)
+                self.total_bytes -= sum(self.sizes.pop(id, {}).values())
+                self.questions.remove(id)
+                self._notify(id)
+
+    def add_question(self, id, question, user_id=None, session_id=None):
+        self.set(id, "question", question)
+        with self.lock:
+            # set() may already have evicted it again under a tiny max_entries.
+            if "question" in self.cache.get(id, {}):
+                self.questions.add(id, question, user_id, session_id)
+
+    def question_history(
+        self, limit=50, cursor=None, user_id=None, session_id=None, search=None
+    ):
+        with self.lock:
+            return self.questions.page(
+                limit, cursor, user_id, session_id, search, skip=self._is_stale
+            )
+
+    def add_eviction_listener(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def expired(self, id, field) -> bool:
+        with self.lock:
+            return id in self.tombstones or (id, field) in self.tombstones
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.cache),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "frame_evictions": self.frame_evictions,
+                "expirations": self.expirations,
+                "spill_folder": self.spill_folder,
+                "spilled_bytes": self.spilled_bytes,
+                "max_spill_bytes": self.max_spill_bytes,
+                "spills": self.spills,
+            }
+
+    def close(self):
+        if self.spill_folder is not None:
+            shutil.rmtree(self.spill_folder, ignore_errors=True)
+
+
+def dump_value(value):
+    """
+    Serialize a cached value to (kind, bytes): DataFrames as Arrow IPC, the rest as JSON.
+
+    Never pickle: anyone who can write to a shared Redis or SQLite file could
+    otherwise run code in every worker. Raises TypeError for other values.
+    """
+    if isinstance(value, pd.DataFrame):
+        table = frame_to_arrow(value)
+        sink = io.BytesIO()
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return "arrow", sink.getvalue()
+    return "json", dump_json(value).encode("utf-8")
+
+
+def load_value(kind, data):
+    if kind == "arrow":
+        return frame_from_arrow(pa.ipc.open_stream(data).read_all())
+    if kind == "json":
+        return load_json(data)
+    # e.g. "pickle" rows written by older versions: treated as a miss.
+    return None
+
+
+class SQLiteCache(Cache):
+    """
+    Cache shared by every worker process through one SQLite file in WAL mode.
+
+    Same LRU/TTL, entry-count and byte-size limits as BoundedMemoryCache
+    (largest frames are dropped first), with DataFrames stored as
+    zstd-compressed Arrow IPC. Tombstones live in the file too, so any
+    worker can tell "expired" apart from "never set". Question history is a
+    table keyed by an autoincrement cursor, with an FTS5 index for search.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 1000,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 3600,
+        max_tombstones: int = 10000,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_tombstones = max_tombstones
+        self.listeners = []
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.frame_evictions = 0
+        self.expirations = 0
+        self.writes = 0
+
+        self.lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cache_fields (
+                id TEXT NOT NULL,
+                field TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (id, field)
+            );
+            CREATE TABLE IF NOT EXISTS cache_tombstones (
+                key TEXT PRIMARY KEY,
+                dropped_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cache_entries_last_used
+                ON cache_entries (last_used);
+            CREATE INDEX IF NOT EXISTS cache_fields_size ON cache_fields (kind, size);
+            CREATE INDEX IF NOT EXISTS cache_tombstones_dropped_at
+                ON cache_tombstones (dropped_at);
+            CREATE TABLE IF NOT EXISTS cache_questions (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                question TEXT NOT NULL,
+                user_id TEXT,
+                session_id TEXT,
+                asked_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cache_questions_user
+                ON cache_questions (user_id, seq);
+            CREATE INDEX IF NOT EXISTS cache_questions_session
+                ON cache_questions (session_id, seq);
+            CREATE VIRTUAL TABLE IF NOT EXISTS cache_questions_fts USING fts5 (
+                question, content = 'cache_questions', content_rowid = 'seq'
+            );
+            CREATE TRIGGER IF NOT EXISTS cache_questions_insert
+            AFTER INSERT ON cache_questions BEGIN
+                INSERT INTO cache_questions_fts (rowid, question)
+                VALUES (new.seq, new.question);
+            END;
+            CREATE TRIGGER IF NOT EXISTS cache_questions_delete
+            AFTER DELETE ON cache_questions BEGIN
+                INSERT INTO cache_questions_fts (cache_questions_fts, rowid, question)
+                VALUES ('delete', old.seq, old.question);
+            END;
+            """
+        )
+        self._conn.commit()
+
+    def generate_id(self, *args, **kwargs):
+        return str(uuid.uuid4())
+
+    @staticmethod
+    def _tombstone_key(id, field=None):
+        return id if field is None else "%s\0%s" % (id, field)
+
+    def _tombstone(self, key):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache_tombstones VALUES (?, ?)", (key, time.time())
+        )
+
+    def _notify(self, id, field=None):
+        for listener in self.listeners:
+            listener(id, field)
+
+    def _drop_entry(self, id):
+        self._conn.execute("DELETE FROM cache_entries WHERE id = ?", (id,))
+        self._conn.execute("DELETE FROM cache_fields WHERE id = ?", (id,))
+        self._conn.execute("DELETE FROM cache_questions WHERE id = ?", (id,))
+        self._tombstone(self._tombstone_key(id))
+        self._notify(id)
+
+    def _drop_field(self, id, field):
+        self._conn.execute(
+            "DELETE FROM cache_fields WHERE id = ? AND field = ?", (id, field)
+        )
+        self._tombstone(self._tombstone_key(id, field))
+        self._notify(id, field)
+
+    def _is_stale(self, last_used) -> bool:
+        return self.ttl is not None and time.time() - last_used > self.ttl
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache_fields"
+        ).fetchone()[0]
+
+    def _enforce_limits(self):
+        (entries,) = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
+        if entries > self.max_entries:
+            for (id,) in self._conn.execute(
+                "SELECT id FROM cache_entries ORDER BY last_used LIMIT ?",
+                (entries - self.max_entries,),
+            ).fetchall():
+                self._drop_entry(id)
+                self.evictions += 1
+
+        total_bytes = self._total_bytes()
+        while total_bytes > self.max_bytes:
+            frame = self._conn.execute(
+                """
+                SELECT id, field, size FROM cache_fields
+                WHERE kind = 'arrow' ORDER BY size DESC LIMIT 1
+                """
+            ).fetchone()
+            if frame is not None:
+                self._drop_field(frame[0], frame[1])
+                self.frame_evictions += 1
+                total_bytes -= frame[2]
+                continue
+
+            oldest = self._conn.execute(
+                "SELECT id FROM cache_entries ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            if oldest is None:
+                break
+            self._drop_entry(oldest[0])
+            self.evictions += 1
+            total_bytes = self._total_bytes()
+
+        self.writes += 1
+        if self.writes % 100 == 0:
+            self._conn.execute(
+                """
+                DELETE FROM cache_tombstones WHERE key IN (
+                    SELECT key FROM cache_tombstones
+                    ORDER BY dropped_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_tombstones,),
+            )
+
+    def set(self, id, field, value):
+        kind, data = dump_value(value)
+        now = time.time()
+        with self.lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO cache_entries VALUES (?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET last_used = excluded.last_used
+                """,
+                (id, now, now),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_fields VALUES (?, ?, ?, ?, ?)",
+                (id, field, kind, data, len(data)),
+            )
+            self._conn.execute(
+                "DELETE FROM cache_tombstones WHERE key IN (?, ?)",
+                (self._tombstone_key(id), self._tombstone_key(id, field)),
+            )
+            self._enforce_limits()
+
+    def get(self, id, field):
+        with self.lock, self._conn:
+            entry = self._conn.execute(
+                "SELECT last_used FROM cache_entries WHERE id = ?", (id,)
+            ).fetchone()
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if self._is_stale(entry[0]):
+                self._drop_entry(id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            now = time.time()
+            # Skip the write when the entry was touched a moment ago.
+            if now - entry[0] > 1:
+                self._conn.execute(
+                    "UPDATE cache_entries SET last_used = ? WHERE id = ?", (now, id)
+                )
+
+            row = self._conn.execute(
+                "SELECT kind, value FROM cache_fields WHERE id = ? AND field = ?",
+                (id, field),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return load_value(*row)
+
+    def get_all(self, field_list) -> list:
+        with self.lock:
+            entries = self._conn.execute(
+                "SELECT id, last_used FROM cache_entries ORDER BY created_at"
+            ).fetchall()
+            ids = [id for id, last_used in entries if not self._is_stale(last_used)]
+            rows = self._conn.execute(
+                "SELECT id, field, kind, value FROM cache_fields WHERE field IN (%s)"
+                % ",".join("?" * len(field_list)),
+                list(field_list),
+            ).fetchall()
+
+        values = {(id, field): (kind, data) for id, field, kind, data in rows}
+        return [
+            {
+                "id": id,
+                **{
+                    field: load_value(*values[(id, field)])
+                    if (id, field) in values
+                    else None
+                    for field in field_list
+                },
+            }
+            for id in ids
+        ]
+
+    def delete(self, id):
+        with self.lock, self._conn:
+            self._conn.execute("DELETE FROM cache_entries WHERE id = ?", (id,))
+            self._conn.execute("DELETE FROM cache_fields WHERE id = ?", (id,))
+            self._conn.execute("DELETE FROM cache_questions WHERE id = ?", (id,))
+            self._notify(id)
+
+    def add_question(self, id, question, user_id=None, session_id=None):
+        self.set(id, "question", question)
+        with self.lock, self._conn:
+            self._conn.execute("DELETE FROM cache_questions WHERE id = ?", (id,))
+            self._conn.execute(
+                """
+                INSERT INTO cache_questions (id, question, user_id, session_id, asked_at)
+                SELECT id, ?, ?, ?, ? FROM cache_entries WHERE id = ?
+                """,
+                (question, user_id, session_id, time.time(), id),
+            )
+
+    def question_history(
+        self, limit=50, cursor=None, user_id=None, session_id=None, search=None
+    ):
+        clauses, params = [], []
+        if self.ttl is not None:
+            clauses.append("e.last_used > ?")
+            params.append(time.time() - self.ttl)
+        if cursor is not None:
+            clauses.append("q.seq < ?")
+            params.append(cursor)
+        if user_id is not None:
+            clauses.append("q.user_id = ?")
+            params.append(user_id)
+        if session_id is not None:
+            clauses.append("q.session_id = ?")
+            params.append(session_id)
+        terms = search_terms(search)
+        if terms:
+            clauses.append(
+                "q.seq IN (SELECT rowid FROM cache_questions_fts "
+                "WHERE cache_questions_fts MATCH ?)"
+            )
+            params.append(" ".join('"%s"' % term for term in sorted(terms)))
+
+        with self.lock:
+            rows = self._conn.execute(
+                """
+                SELECT q.seq, q.id, q.question, q.user_id, q.session_id, q.asked_at
+                FROM cache_questions q JOIN cache_entries e ON e.id = q.id
+                %s ORDER BY q.seq DESC LIMIT ?
+                """
+                % ("WHERE " + " AND ".join(clauses) if clauses else ""),
+                params + [limit + 1],
+            ).fetchall()
+
+        items = [
+            {
+                "id": id,
+                "question": question,
+                "user_id": user,
+                "session_id": session,
+                "asked_at": asked_at,
+            }
+            for _, id, question, user, session, asked_at in rows[:limit]
+        ]
+        return items, rows[limit - 1][0] if len(rows) > limit else None
+
+    def expired(self, id, field) -> bool:
+        with self.lock:
+            return (
+                self._conn.execute(
+                    "SELECT 1 FROM cache_tombstones WHERE key IN (?, ?)",
+                    (self._tombstone_key(id), self._tombstone_key(id, field)),
+                ).fetchone()
+                is not None
+            )
+
+    def add_eviction_listener(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def stats(self) -> dict:
+        with self.lock:
+            (entries,) = self._conn.execute(
+                "SELECT COUNT(*) FROM cache_entries"
+            ).fetchone()
+            return {
+                "backend": "sqlite",
+                "entries": entries,
+                "bytes": self._total_bytes(),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "frame_evictions": self.frame_evictions,
+                "expirations": self.expirations,
+            }
+
+
+class RedisCache(Cache):
+    """
+    Cache on a Redis-protocol server (Redis, Valkey, KeyDB, ...) shared across hosts.
+
+    Every id is a hash of serialized fields that expires after `ttl` seconds
+    without use; entry and memory limits are left to the server's
+    maxmemory policy. A marker key outlives each hash so expired ids can
+    still be told apart from unknown ones. Question history is a sorted set
+    per user, per session and overall, scored by an increasing sequence
+    number; search filters those pages on this side.
+    """
+
+    def __init__(self, url: str, ttl: float = 3600, prefix: str = "vanna:cache"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError(
+                "CACHE_BACKEND=redis needs the redis package, run: pip install redis"
+            )
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.listeners = []
+        self.hits = 0
+        self.misses = 0
+
+    def generate_id(self, *args, **kwargs):
+        return str(uuid.uuid4())
+
+    def _key(self, id):
+        return "%s:%s" % (self.prefix, id)
+
+    def _seen_key(self, id):
+        return "%s:seen:%s" % (self.prefix, id)
+
+    @property
+    def _ids_key(self):
+        return "%s:ids" % self.prefix
+
+    @staticmethod
+    def _decode(value):
+        kind, data = value.split(b":", 1)
+        return load_value(kind.decode("ascii"), data)
+
+    def _history_key(self, scope=None, value=None):
+        if scope is None:
+            return "%s:history" % self.prefix
+        return "%s:history:%s:%s" % (self.prefix, scope, value)
+
+    def set(self, id, field, value):
+        kind, data = dump_value(value)
+        key = self._key(id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, field, kind.encode("ascii") + b":" + data)
+        pipe.expire(key, self.ttl)
+        now = time.time()
+        pipe.zadd(self._ids_key, {id: now}, nx=True)
+        pipe.zremrangebyscore(self._ids_key, "-inf", now - self.ttl * 24)
+        pipe.set(self._seen_key(id), 1, ex=self.ttl * 24)
+        pipe.execute()
+
+    def get(self, id, field):
+        key = self._key(id)
+        pipe = self.client.pipeline()
+        pipe.hget(key, field)
+        pipe.expire(key, self.ttl)
+        value, _ = pipe.execute()
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        kind, data = value.split(b":", 1)
+        return load_value(kind.decode("ascii"), data)
+
+    def get_all(self, field_list) -> list:
+        ids = [id.decode("utf-8") for id in self.client.zrange(self._ids_key, 0, -1)]
+        pipe = self.client.pipeline()
+        for id in ids:
+            pipe.exists(self._key(id))
+            pipe.hmget(self._key(id), field_list)
+        replies = pipe.execute()
+
+        items, gone = [], []
+        for i, id in enumerate(ids):
+            exists, values = replies[2 * i], replies[2 * i + 1]
+            if not exists:
+                gone.append(id)
+                continue
+            item = {"id": id}
+            for field, value in zip(field_list, values):
+                if value is None:
+                    item[field] = None
+                else:
+                    kind, data = value.split(b":", 1)
+                    item[field] = load_value(kind.decode("ascii"), data)
+            items.append(item)
+
+        if gone:
+            self.client.zrem(self._ids_key, *gone)
+        return items
+
+    def delete(self, id):
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(id), self._seen_key(id))
+        pipe.zrem(self._ids_key, id)
+        pipe.zrem(self._history_key(), id)
+        pipe.execute()
+        for listener in self.listeners:
+            listener(id, None)
+
+    def add_question(self, id, question, user_id=None, session_id=None):
+        asker = {"user_id": user_id, "session_id": session_id, "asked_at": time.time()}
+        self.set(id, "question", question)
+        self.set(id, "asker", asker)
+        seq = self.client.incr("%s:history_seq" % self.prefix)
+        pipe = self.client.pipeline()
+        for key in (
+            self._history_key(),
+            user_id is not None and self._history_key("user", user_id),
+            session_id is not None and self._history_key("session", session_id),
+        ):
+            if key:
+                pipe.zadd(key, {id: seq})
+                pipe.expire(key, self.ttl * 24)
+        pipe.execute()
+
+    def question_history(
+        self, limit=50, cursor=None, user_id=None, session_id=None, search=None
+    ):
+        if session_id is not None:
+            key = self._history_key("session", session_id)
+        elif user_id is not None:
+            key = self._history_key("user", user_id)
+        else:
+            key = self._history_key()
+        max_score = "+inf" if cursor is None else "(%d" % cursor
+        batch = limit + 1 if not search else max(4 * limit, 100)
+
+        items, last_seq = [], None
+        while True:
+            members = self.client.zrevrangebyscore(
+                key, max_score, "-inf", start=0, num=batch, withscores=True
+            )
+            if not members:
+                return items, None
+            pipe = self.client.pipeline()
+            for id, _ in members:
+                pipe.hmget(self._key(id.decode("utf-8")), ["question", "asker"])
+            gone = []
+            for (id, seq), (question, asker) in zip(members, pipe.execute()):
+                id = id.decode("utf-8")
+                if question is None:
+                    # The entry expired; its history member is removed lazily.
+                    gone.append(id)
+                    continue
+                item = {
+                    "id": id,
+                    "question": self._decode(question),
+                    "user_id": None,
+                    "session_id": None,
+                    "asked_at": None,
+                }
+                if asker is not None:
+                    item.update(self._decode(asker))
+                if not question_matches(item, user_id, session_id, search):
+                    continue
+                if len(items) == limit:
+                    if gone:
+                        self.client.zrem(key, *gone)
+                    return items, last_seq
+                items.append(item)
+                last_seq = int(seq)
+            if gone:
+                self.client.zrem(key, *gone)
+            if len(members) < batch:
+                return items, None
+            max_score = "(%d" % int(members[-1][1])
+
+    def expired(self, id, field) -> bool:
+        pipe = self.client.pipeline()
+        pipe.exists(self._seen_key(id))
+        pipe.hexists(self._key(id), field)
+        seen, present = pipe.execute()
+        return bool(seen) and not present
+
+    def add_eviction_listener(self, listener):
+        # Expiry happens on the server; only explicit deletes are reported.
+        self.listeners.append(listener)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "entries": self.client.zcard(self._ids_key),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
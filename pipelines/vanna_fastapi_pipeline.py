@@ -12,9 +12,12 @@ import os
 import requests
 import logging
 import json
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pydantic import BaseModel, Field
-from typing import List, Union, Generator, Iterator, Optional, Dict, Any
+from typing import List, Union, Generator, Iterator, Optional, Dict, Any, Tuple
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -26,63 +29,114 @@ class APIError(Exception):
     pass
 
 
-def _make_request(
-    url: str,
-    params: Dict[str, Any],
+def _build_session(retries: int, backoff: float, pool_size: int) -> requests.Session:
+    """
+    Builds a keep-alive session shared by all pipeline requests.
+
+    Connection errors and 502/503/504 responses are retried with exponential
+    backoff before any response body is read, so a streamed answer is never
+    requested twice once it has started.
+    """
+    retry = Retry(
+        total=retries,
+        read=0,
+        backoff_factor=backoff,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "POST"}),
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _ask_vanna(
+    session: requests.Session,
+    api_url: str,
+    question: str,
     verify_ssl: bool,
-    required_fields: List[str],
-) -> Dict[str, Any]:
+    timeout: Tuple[float, float],
+) -> requests.Response:
     """
-    Makes HTTP request and validates response.
+    Opens the combined question -> SQL -> data -> chart event stream.
 
     Args:
-        url: Request URL
-        params: Request parameters
+        session: Pooled HTTP session
+        api_url: Base URL of the Vanna backend
+        question: Natural language question
         verify_ssl: Whether to verify SSL certificates
-        required_fields: Required fields in response
+        timeout: (connect, read) timeout in seconds
 
     Returns:
-        Validated JSON response
+        The streaming /api/ask response; release it with _close_response
 
     Raises:
-        APIError: For any request or validation errors
+        APIError: For any request errors
     """
+    url = urljoin(api_url, "/api/ask")
+    try:
+        resp = session.get(
+            url,
+            params={"question": question},
+            headers={"Accept": "text/event-stream"},
+            verify=verify_ssl,
+            stream=True,
+            timeout=timeout,
+        )
+    except requests.exceptions.RequestException as e:
+        raise APIError(f"Request failed: {e}")
     try:
-        resp = requests.get(url, params=params, verify=verify_ssl, timeout=600)
         resp.raise_for_status()
-        data = resp.json()
-
-        missing = [f for f in required_fields if f not in data]
-        if missing:
-            raise APIError(f"Missing fields in response: {missing}")
-
-        return data
     except requests.exceptions.RequestException as e:
+        resp.close()
         raise APIError(f"Request failed: {e}")
-    except json.JSONDecodeError as e:
-        raise APIError(f"Invalid JSON response: {e}")
+    return resp
 
 
-def _generate_sql_from_vanna(
-    api_url: str, question: str, verify_ssl: bool
-) -> Dict[str, Any]:
-    """Generates SQL query from natural language question."""
-    url = urljoin(api_url, "/api/generate_sql")
-    return _make_request(url, {"question": question}, verify_ssl, ["text", "id"])
+def _iter_events(resp: requests.Response) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Parses the server-sent events of an /api/ask response.
 
+    Yields:
+        (event, data) pairs
 
-def _run_sql_query(api_url: str, cache_id: str, verify_ssl: bool) -> Dict[str, Any]:
-    """Executes SQL query using cache ID."""
-    url = urljoin(api_url, "/api/run_sql")
-    return _make_request(url, {"id": cache_id}, verify_ssl, ["df_markdown"])
+    Raises:
+        APIError: For any request or decoding errors
+    """
+    try:
+        event, data = "message", []
+        for line in resp.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data.append(line[6:])
+            elif not line and data:
+                yield event, json.loads("\n".join(data))
+                event, data = "message", []
+    except requests.exceptions.RequestException as e:
+        raise APIError(f"Request failed: {e}")
+    except json.JSONDecodeError as e:
+        raise APIError(f"Invalid event data: {e}")
 
 
-def _generate_plotly_figure(
-    api_url: str, cache_id: str, verify_ssl: bool
-) -> Dict[str, Any]:
-    """Generates Plotly figure from query results."""
-    url = urljoin(api_url, "/api/generate_plotly_figure")
-    return _make_request(url, {"id": cache_id}, verify_ssl, ["chart_url"])
+def _close_response(resp: requests.Response):
+    """
+    Closes a streamed response, also while another thread is reading it.
+
+    Shutting the socket down first wakes that thread (urllib3 >= 2.3), so
+    the backend sees the client leave and the connection is freed at once.
+    """
+    shutdown = getattr(resp.raw, "shutdown", None)
+    if shutdown is not None:
+        try:
+            shutdown()
+        except (ValueError, RuntimeError, OSError):
+            # Already released or never connected; close() is enough.
+            pass
+    resp.close()
 
 
 class Pipeline:
@@ -105,18 +159,53 @@ class Pipeline:
             default="llama3",
             description="The name of the Ollama model to use for formatting",
         )
+        CONNECT_TIMEOUT: float = Field(
+            default=5, description="Seconds to wait for a connection"
+        )
+        SQL_TIMEOUT: float = Field(
+            default=300,
+            description="Seconds to wait for the next SQL/data event from Vanna",
+        )
+        SUMMARY_TIMEOUT: float = Field(
+            default=300, description="Seconds to wait for the next Ollama chunk"
+        )
+        CHART_TIMEOUT: float = Field(
+            default=300,
+            description="Seconds to wait for the chart after the summary finished",
+        )
+        MAX_RETRIES: int = Field(
+            default=3, description="Retries for connection errors and 502/503/504"
+        )
+        RETRY_BACKOFF: float = Field(
+            default=0.5, description="Exponential backoff factor between retries"
+        )
+        POOL_SIZE: int = Field(
+            default=10, description="Keep-alive connections kept per host"
+        )
 
     def __init__(self):
         self.name = "Vanna Pipeline"
         fields = self.Valves.model_fields.items()
         self.valves = self.Valves(**{k: os.getenv(k, v.default) for k, v in fields})
         logger.setLevel(logging.DEBUG if self.valves.DEBUG else logging.INFO)
+        self.session = _build_session(
+            self.valves.MAX_RETRIES, self.valves.RETRY_BACKOFF, self.valves.POOL_SIZE
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.valves.POOL_SIZE, thread_name_prefix="vanna-pipeline"
+        )
 
     async def on_startup(self):
         logger.info(f"on_startup: {self.name}")
 
     async def on_shutdown(self):
         logger.info(f"on_shutdown: {self.name}")
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def timeout(self, read: float) -> Tuple[float, float]:
+        """(connect, read) timeout for one stage."""
+        return (self.valves.CONNECT_TIMEOUT, read)
 
     async def inlet(
         self, body: Dict[str, Any], user: Optional[Dict[str, Any]] = None
@@ -161,7 +250,12 @@ class Pipeline:
         url = urljoin(self.valves.OLLAMA_BASE_URL, "/v1/chat/completions")
 
         try:
-            with requests.post(url, json=payload, stream=True, timeout=600) as resp:
+            with self.session.post(
+                url,
+                json=payload,
+                stream=True,
+                timeout=self.timeout(self.valves.SUMMARY_TIMEOUT),
+            ) as resp:
                 resp.raise_for_status()
 
                 for chunk in resp.iter_lines(decode_unicode=True):
@@ -208,31 +302,63 @@ class Pipeline:
                 yield f"Error processing task: {e}"
             return
 
-        cache_id = None
+        yield self.status("Generating SQL...", False)
+        try:
+            response = _ask_vanna(
+                self.session,
+                self.valves.API_URL,
+                user_message,
+                self.valves.VERIFY_SSL,
+                self.timeout(self.valves.SQL_TIMEOUT),
+            )
+        except APIError as e:
+            logger.exception(f"SQL generation error: {e}")
+            yield self.status("Error during SQL generation", True)
+            return
 
         try:
-            yield self.status("Generating SQL...", False)
+            yield from self.answer(response)
+        finally:
+            # Also runs when the chart times out, a stage fails or the client
+            # goes away, so the backend stops and the pooled connection is freed.
+            _close_response(response)
 
-            resp = _generate_sql_from_vanna(
-                self.valves.API_URL, user_message, self.valves.VERIFY_SSL
-            )
-            sql_text = resp["text"]
-            cache_id = resp["id"]
+    def answer(self, response: requests.Response) -> Generator:
+        """Formats the events of an open /api/ask stream."""
+        events = _iter_events(response)
+        sql_text = ""
 
-            yield f"```sql\n{sql_text}\n```"
+        try:
+            for event, data in events:
+                if event == "token":
+                    sql_text += data
+                    yield self.status(f"Generating SQL... {sql_text[-80:]}", False)
+                elif event == "sql":
+                    yield f"```sql\n{data['text']}\n```"
+                    yield self.status("Running SQL query and rendering results...", False)
+                elif event == "data":
+                    break
+                elif event == "error":
+                    raise APIError(data.get("detail"))
+                elif event == "done":
+                    yield self.status("No data returned for this question", True)
+                    return
+            else:
+                raise APIError("Stream ended before the query returned data")
+
+            df_json = data.get("df", {})
+            df_md = data["df_markdown"]
 
         except APIError as e:
             logger.exception(f"SQL generation error: {e}")
             yield self.status("Error during SQL generation", True)
             return
 
-        try:
-            yield self.status("Running SQL query and rendering results...", False)
-
-            resp = _run_sql_query(self.valves.API_URL, cache_id, self.valves.VERIFY_SSL)
-            df_json = resp.get("df", {})
-            df_md = resp["df_markdown"]
+        # Chart and follow-ups keep arriving from the backend while the summary
+        # streams from Ollama; they are collected here and shown afterwards.
+        remaining = self.executor.submit(list, events)
 
+        try:
             yield "\n### Data result\n\n"
 
             prompt_msgs = [
@@ -267,20 +393,37 @@ class Pipeline:
 
         except APIError as e:
             logger.exception(f"Summary generation error: {e}")
+            logger.warning("Dropping the chart and follow-up questions of this answer")
             yield self.status("Error during summary generation", True)
             return
 
         try:
             yield self.status("Generating Plotly chart...", False)
 
-            resp = _generate_plotly_figure(
-                self.valves.API_URL, cache_id, self.valves.VERIFY_SSL
-            )
-            chart_url = resp["chart_url"]
+            results = dict(remaining.result(timeout=self.valves.CHART_TIMEOUT))
+
+            # Fixed output order, whichever stage finished first on the backend.
+            if "chart" in results:
+                chart_url = results["chart"]["chart_url"]
+                yield "\n### Visualization\n\n"
+                yield f"\n![{chart_url}]({chart_url})\n\n"
+            else:
+                yield self.status("Plotly chart generation skipped", False)
 
-            yield "\n### Visualization\n\n"
-            yield f"\n![{chart_url}]({chart_url})\n\n"
+            questions = results.get("followups", {}).get("questions")
+            if questions:
+                yield "\n### Follow-up questions\n\n"
+                yield "".join(f"- {q}\n" for q in questions)
 
+            if "error" in results:
+                logger.warning(f"Vanna stage failed: {results['error']}")
+
+        except TimeoutError:
+            logger.warning(
+                "Timed out after %ss waiting for the chart and follow-up questions",
+                self.valves.CHART_TIMEOUT,
+            )
+            yield self.status("Chart and follow-up questions timed out", True)
         except APIError as e:
             logger.warning(f"Could not generate Plotly chart: {e}")
             yield self.status("Plotly chart generation skipped", True)
@@ -1,14 +1,29 @@
-
 import os
 import uvicorn
+from app.config import settings
 
 DEBUG = os.environ.get("DEBUG", False)
 PORT = int(os.environ.get("PORT", 4321))
+WORKERS = int(os.environ.get("WORKERS", settings.workers))
 
 if __name__ == "__main__":
+    if WORKERS > 1 and settings.cache_backend == "memory":
+        # Each worker would only see the cache ids it created itself.
+        raise SystemExit(
+            "WORKERS > 1 needs a shared cache, set CACHE_BACKEND=sqlite or redis"
+        )
+    if WORKERS > 1 and not settings.otel_exporter_otlp_endpoint:
+        # /metrics is per process, so a scrape only sees one random worker.
+        print(
+            "⚠️ WORKERS > 1 without OTEL_EXPORTER_OTLP_ENDPOINT: "
+            "/metrics only reports the worker answering each scrape"
+        )
+
     uvicorn.run(
         "app.main:app",
         host="localhost",
-        reload=DEBUG,
+        # Reload runs a single process, so it only applies to one worker.
+        reload=DEBUG and WORKERS == 1,
         port=PORT,
-    )
\ No newline at end of file
+        workers=WORKERS,
+    )
@@ -0,0 +1,42 @@
+"""
+Retrain DDL for the PostgreSQL tables whose definition changed.
+
+Usage:
+    python schema_sync.py                  # schemas from SCHEMA_SYNC_SCHEMAS
+    python schema_sync.py public,sales --dry-run
+"""
+
+import argparse
+
+from app.services.schema_sync_service import sync_schema
+from app.services.semantic_cache_service import get_semantic_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental DDL retraining")
+    parser.add_argument("schemas", nargs="?", help="Comma separated schemas")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report what would change"
+    )
+    args = parser.parse_args()
+
+    from app.services.vanna_service import get_vanna
+
+    vanna = get_vanna()
+
+    schemas = [s.strip() for s in args.schemas.split(",")] if args.schemas else None
+    report = sync_schema(vanna, schemas, dry_run=args.dry_run)
+    changed = report["added"] or report["updated"] or report["removed"]
+    if changed and not args.dry_run:
+        get_semantic_cache().invalidate()
+
+    for key in ("added", "updated", "removed"):
+        for name in report[key]:
+            print("%-8s %s" % (key, name))
+    print(
+        "unchanged=%(unchanged)d dry_run=%(dry_run)s seconds=%(seconds).2f" % report
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# cache.py and app/ live at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read on import; the unit tests never reach Ollama.
+os.environ.setdefault("MODEL_NAME", "test")
@@ -0,0 +1,221 @@
+import datetime
+import decimal
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cache import (
+    BoundedMemoryCache,
+    SQLiteCache,
+    SpilledFrame,
+    compact_frame,
+    dump_value,
+    frame_from_arrow,
+    frame_to_arrow,
+    load_value,
+)
+
+
+def sales_frame(rows=1000):
+    return pd.DataFrame(
+        {
+            "region": ["a", "b"] * (rows // 2),
+            "product": ["p%d" % i for i in range(rows)],
+            "trx_date": [datetime.date(2024, 1, 1 + i % 28) for i in range(rows)],
+            "revenue": np.linspace(0, 100, rows),
+            "trx": np.arange(rows, dtype="int64") % 20,
+        }
+    )
+
+
+def test_compact_frame_keeps_numeric_dtypes():
+    df = compact_frame(sales_frame())
+    assert df["trx"].dtype == np.int64
+    assert (df["trx"] * 1000).max() == 19000
+
+
+def test_compact_frame_groupby_has_no_phantom_groups():
+    df = compact_frame(pd.DataFrame({"region": ["a", "a", "b"], "v": [1, 2, 3]}))
+    grouped = df[df.region == "a"].groupby("region").v.sum()
+    assert grouped.to_dict() == {"a": 3}
+
+
+def test_compact_frame_serializes_the_same():
+    original = sales_frame()
+    compact = compact_frame(original)
+    assert compact["product"].dtype == "string[pyarrow]"
+    assert compact.memory_usage(deep=True).sum() < original.memory_usage(deep=True).sum()
+    assert compact.to_json(orient="records") == original.to_json(orient="records")
+    assert compact.to_csv(index=False) == original.to_csv(index=False)
+    assert compact.head(20).to_markdown() == original.head(20).to_markdown()
+
+
+def test_compact_frame_leaves_columns_with_nulls_and_decimals():
+    df = pd.DataFrame({"name": ["a", None], "amount": [decimal.Decimal("1.50")] * 2})
+    assert compact_frame(df) is df
+
+
+@pytest.mark.parametrize(
+    "df",
+    [
+        pd.DataFrame([[1, 2], [3, 4]], columns=["count", "count"]),
+        pd.DataFrame({"doc": [{"a": 1}, {"b": "x"}, None]}),
+        pd.DataFrame({"tags": [[1, 2], [], None]}),
+        pd.DataFrame({"mixed": [1, "a", 2.5, None]}),
+        pd.DataFrame({"flag": [True, False]}, dtype=object),
+        pd.DataFrame({"ids": [1, None]}, dtype=object),
+        pd.DataFrame({"name": ["a", np.nan, None]}),
+        pd.DataFrame(
+            {
+                "amount": [decimal.Decimal("1.5"), decimal.Decimal("2.25")],
+                "at": [datetime.datetime(2024, 1, 1, 8, 30), datetime.datetime(2024, 1, 2)],
+                "span": [datetime.timedelta(days=1, seconds=5), datetime.timedelta(0)],
+                "blob": [b"\x00\x01", b""],
+            },
+            dtype=object,
+        ),
+        compact_frame(sales_frame(10)),
+    ],
+)
+def test_frame_arrow_round_trip(df):
+    df.attrs["estimate"] = {"rows": 10}
+    restored = frame_from_arrow(frame_to_arrow(df))
+    pd.testing.assert_frame_equal(restored, df)
+    assert [type(v) for v in restored.iloc[:, 0]] == [type(v) for v in df.iloc[:, 0]]
+    assert restored.attrs == df.attrs
+
+
+def test_frame_to_arrow_rejects_unknown_objects():
+    with pytest.raises(TypeError):
+        frame_to_arrow(pd.DataFrame({"x": [object()]}))
+
+
+def test_spilled_frame_is_memory_mapped(tmp_path):
+    df = compact_frame(sales_frame())
+    df.attrs["estimate"] = {"rows": 1000}
+    spilled = SpilledFrame(df, str(tmp_path))
+    loaded = spilled.load()
+    pd.testing.assert_frame_equal(loaded, df)
+    assert loaded.attrs == df.attrs
+    assert not loaded["trx"].to_numpy().flags.writeable
+    assert loaded["product"].dtype == "string[pyarrow]"
+    assert spilled.load() is loaded
+
+    spilled.remove()
+    assert not os.path.exists(spilled.path)
+
+
+def test_cache_entry_limit_is_lru():
+    cache = BoundedMemoryCache(max_entries=2)
+    cache.set("a", "sql", "1")
+    cache.set("b", "sql", "2")
+    cache.get("a", "sql")
+    cache.set("c", "sql", "3")
+    assert cache.get("b", "sql") is None
+    assert cache.expired("b", "sql")
+    assert cache.get("a", "sql") == "1"
+    assert not cache.expired("never", "sql")
+
+
+def test_cache_byte_limit_drops_largest_frame_first():
+    small, large = sales_frame(10), sales_frame(5000)
+    cache = BoundedMemoryCache(max_bytes=large.memory_usage(deep=True).sum())
+    cache.set("a", "df", small)
+    cache.set("a", "sql", "SELECT 1")
+    cache.set("b", "df", large)
+    assert cache.get("b", "df") is None
+    assert cache.expired("b", "df")
+    assert cache.get("a", "df") is small
+    assert cache.get("a", "sql") == "SELECT 1"
+
+
+def test_cache_ttl():
+    cache = BoundedMemoryCache(ttl=0)
+    cache.set("a", "sql", "1")
+    assert cache.get("a", "sql") is None
+    assert cache.expired("a", "sql")
+
+
+def test_cache_spills_large_frames(tmp_path):
+    cache = BoundedMemoryCache(spill_folder=str(tmp_path), spill_min_bytes=1)
+    df = pd.DataFrame([[1, 2]] * 100, columns=["id", "id"])
+    cache.set("a", "df", df)
+    stats = cache.stats()
+    assert stats["spills"] == 1 and stats["spilled_bytes"] > 0
+    assert stats["bytes"] < df.memory_usage(deep=True).sum()
+    pd.testing.assert_frame_equal(cache.get("a", "df"), df)
+
+    cache.delete("a")
+    assert cache.stats()["spilled_bytes"] == 0
+    assert os.listdir(cache.spill_folder) == []
+    cache.close()
+    assert not os.path.exists(cache.spill_folder)
+
+
+def test_cache_keeps_unspillable_frames_in_memory(tmp_path):
+    cache = BoundedMemoryCache(spill_folder=str(tmp_path), spill_min_bytes=1)
+    df = pd.DataFrame({"x": [object()]})
+    cache.set("a", "df", df)
+    assert cache.get("a", "df") is df
+    assert cache.stats()["spills"] == 0
+    assert os.listdir(cache.spill_folder) == []
+
+
+def test_cache_spill_budget_evicts_largest_spilled_frame(tmp_path):
+    small, large = sales_frame(100), sales_frame(5000)
+    probe = SpilledFrame(large, str(tmp_path))
+    cache = BoundedMemoryCache(
+        spill_folder=str(tmp_path), spill_min_bytes=1, max_spill_bytes=probe.nbytes
+    )
+    probe.remove()
+    cache.set("a", "df", small)
+    cache.set("b", "df", large)
+    assert cache.get("b", "df") is None
+    assert cache.expired("b", "df")
+    pd.testing.assert_frame_equal(cache.get("a", "df"), small)
+    assert cache.stats()["spilled_bytes"] <= probe.nbytes
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["SELECT 1", ["a", "b"], {"user_id": None, "asked_at": 1.5}, True, None, 3],
+)
+def test_dump_value_json(value):
+    kind, data = dump_value(value)
+    assert kind == "json"
+    assert load_value(kind, data) == value
+
+
+def test_dump_value_frames():
+    df = pd.DataFrame(
+        [[1, 1, {"a": 1}], [2, 2, {"b": None}]], columns=["count", "count", "doc"]
+    )
+    df.attrs["estimate"] = {"rows": 2}
+    kind, data = dump_value(df)
+    assert kind == "arrow"
+    restored = load_value(kind, data)
+    pd.testing.assert_frame_equal(restored, df)
+    assert restored["doc"].tolist() == [{"a": 1}, {"b": None}]
+    assert restored.attrs == df.attrs
+
+
+def test_dump_value_rejects_what_json_cannot_hold():
+    with pytest.raises(TypeError):
+        dump_value(object())
+    assert load_value("pickle", b"cos\nsystem\n(S'true'\ntR.") is None
+
+
+def test_sqlite_cache_round_trip(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    df = pd.DataFrame([[1, "a"]], columns=["id", "id"])
+    cache.set("a", "df", df)
+    cache.set("a", "followup_questions", ["q1", "q2"])
+    pd.testing.assert_frame_equal(cache.get("a", "df"), df)
+    assert cache.get("a", "followup_questions") == ["q1", "q2"]
+
+    cache.set("b", "sql", "1")
+    cache.set("c", "sql", "2")
+    assert cache.get("a", "df") is None
+    assert cache.expired("a", "df")
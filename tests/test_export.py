@@ -0,0 +1,91 @@
+import asyncio
+import gzip
+import io
+import queue
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.services.export_service import (
+    SCHEMA_PROBE_CHUNKS,
+    _next_chunk,
+    _QueueWriter,
+    iter_arrow,
+    iter_query_export,
+)
+
+
+def read_table(data, fmt):
+    if fmt == "parquet":
+        return pq.read_table(io.BytesIO(data))
+    return pa.ipc.open_stream(data).read_all()
+
+
+def test_queue_writer_compresses_on_the_producer():
+    chunks = queue.Queue()
+    writer = _QueueWriter(chunks, threading.Event(), chunk_bytes=4, compress=True)
+    writer.write("a,b\n")
+    writer.write(b"1,2\n")
+    writer.close()
+    data = b"".join(chunks.get_nowait() for _ in range(chunks.qsize()))
+    assert gzip.decompress(data) == b"a,b\n1,2\n"
+
+
+def test_next_chunk_times_out():
+    item = _next_chunk(queue.Queue(), threading.Event(), timeout=0.05)
+    assert isinstance(item, TimeoutError)
+
+
+def test_next_chunk_stops_when_cancelled():
+    cancelled = threading.Event()
+    cancelled.set()
+    assert not isinstance(_next_chunk(queue.Queue(), cancelled, timeout=5), TimeoutError)
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_iter_arrow_types_leading_null_column_from_later_chunks(fmt):
+    frames = [
+        pd.DataFrame({"id": [1, 2], "discount": [None, None]}),
+        pd.DataFrame({"id": [3, 4], "discount": [5, None]}),
+        pd.DataFrame({"id": [5, 6], "discount": [1.5, 2.0]}),
+    ]
+    data = b"".join(iter_arrow(frames, fmt, metadata={"id": "x"}))
+    table = read_table(data, fmt)
+    assert table.schema.field("discount").type == pa.float64()
+    assert table.column("id").to_pylist() == [1, 2, 3, 4, 5, 6]
+    assert table.column("discount").to_pylist() == [None, None, 5, None, 1.5, 2.0]
+    assert table.schema.metadata[b"id"] == b"x"
+
+
+def test_iter_arrow_falls_back_to_strings_for_long_null_runs():
+    frames = [pd.DataFrame({"note": [None]}) for _ in range(SCHEMA_PROBE_CHUNKS)]
+    frames.append(pd.DataFrame({"note": [7]}))
+    table = read_table(b"".join(iter_arrow(frames, "arrow")), "arrow")
+    assert table.schema.field("note").type == pa.string()
+    assert table.column("note").to_pylist()[-1] == "7"
+
+
+def test_iter_arrow_without_frames_is_empty():
+    assert b"".join(iter_arrow([], "arrow")) == b""
+
+
+def test_query_export_runs_on_the_sql_stage():
+    threads = []
+
+    class FakeVanna:
+        def stream_sql(self, sql, fetch_size, auto_limit=True):
+            assert not auto_limit
+            threads.append(threading.current_thread().name)
+            yield ["id", "name"], {}
+            for start in (1, 3):
+                threads.append(threading.current_thread().name)
+                yield [(start, "a"), (start + 1, "b")]
+
+    async def export():
+        return b"".join([chunk async for chunk in iter_query_export(FakeVanna(), "SELECT 1", "csv")])
+
+    assert asyncio.run(export()) == b"id,name\n1,a\n2,b\n3,a\n4,b\n"
+    assert threads and all(name.startswith("sql") for name in threads)
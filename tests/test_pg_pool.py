@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+from psycopg2 import extensions
+
+from app.services import pg_pool
+from app.services.pg_pool import PgPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def test_close_also_closes_connections_returned_later(monkeypatch):
+    monkeypatch.setattr(pg_pool.psycopg2, "connect", lambda dsn: FakeConnection())
+    pool = PgPool("dsn", min_size=2, max_size=2)
+
+    with pool.connection() as busy:
+        pool.close()
+        assert pool.stats()["idle"] == 0
+        assert not busy.closed
+
+    assert busy.closed
+    assert pool.stats()["size"] == 0
+    assert pool.stats()["in_use"] == 0
@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "pipelines"))
+
+from vanna_fastapi_pipeline import Pipeline  # noqa: E402
+
+
+class Backend(BaseHTTPRequestHandler):
+    """/api/ask that sends the data and then never the chart; a stub Ollama."""
+
+    disconnected = threading.Event()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        events = [
+            ("sql", {"text": "SELECT 1"}),
+            ("data", {"df": "[]", "df_markdown": "| a |"}),
+        ]
+        for event, data in events:
+            self.wfile.write(("event: %s\ndata: %s\n\n" % (event, json.dumps(data))).encode())
+        try:
+            for _ in range(200):
+                self.wfile.write(b": still rendering\n\n")
+                self.wfile.flush()
+                time.sleep(0.05)
+        except OSError:
+            Backend.disconnected.set()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunk = {"choices": [{"delta": {"content": "Summary"}}]}
+        self.wfile.write(("data: %s\n\ndata: [DONE]\n\n" % json.dumps(chunk)).encode())
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Backend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%d" % server.server_address[1]
+    monkeypatch.setenv("API_URL", url)
+    monkeypatch.setenv("OLLAMA_BASE_URL", url)
+    monkeypatch.setenv("CHART_TIMEOUT", "0.2")
+    Backend.disconnected.clear()
+    yield
+    server.shutdown()
+
+
+def test_chart_timeout_closes_the_ask_stream(backend):
+    pipeline = Pipeline()
+    output = list(pipeline.pipe("How many?", "vanna", [], {}))
+
+    statuses = [o["event"]["data"]["description"] for o in output if isinstance(o, dict)]
+    assert "Summary" in output
+    assert "Chart and follow-up questions timed out" in statuses
+    # The backend sees the client leave long before its stream would end.
+    assert Backend.disconnected.wait(3)
+    pipeline.executor.shutdown(wait=True)
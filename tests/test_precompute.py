@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app.services.precompute_service import PrecomputeCancelled, PrecomputeScheduler
+
+
+def test_finished_tasks_are_dropped_unless_kept():
+    async def scenario():
+        scheduler = PrecomputeScheduler(concurrency=1, max_tasks=4)
+        calls = []
+
+        async def work(value):
+            calls.append(value)
+            return value
+
+        assert scheduler.schedule("a", "chart", work, 1)
+        await asyncio.sleep(0)
+        assert await scheduler.attach("a", "chart", work, 2) == 1
+        await asyncio.sleep(0)
+        assert scheduler.tasks == {}
+
+        assert await scheduler.attach("", "samples", work, 3, keep=True) == 3
+        assert await scheduler.attach("", "samples", work, 4, keep=True) == 3
+        assert list(scheduler.tasks) == [("", "samples")]
+        assert calls == [1, 3]
+
+    asyncio.run(scenario())
+
+
+def test_failed_tasks_are_retried():
+    async def scenario():
+        scheduler = PrecomputeScheduler()
+
+        async def fail():
+            raise ValueError("boom")
+
+        async def work():
+            return "ok"
+
+        scheduler.schedule("a", "chart", fail)
+        await asyncio.sleep(0.01)
+        assert scheduler.tasks == {}
+        assert await scheduler.attach("a", "chart", work) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_forgotten_task_is_not_relaunched_with_stale_args():
+    async def scenario():
+        scheduler = PrecomputeScheduler()
+        calls = []
+        release = asyncio.Event()
+
+        async def work(df):
+            calls.append(df)
+            await release.wait()
+            return df
+
+        waiter = asyncio.ensure_future(scheduler.attach("a", "chart", work, "old df"))
+        await asyncio.sleep(0.01)
+        scheduler.forget("a")
+        with pytest.raises(PrecomputeCancelled):
+            await waiter
+        assert calls == ["old df"]
+        assert scheduler.tasks == {}
+
+    asyncio.run(scenario())
+
+
+def test_attach_follows_a_replaced_task():
+    async def scenario():
+        scheduler = PrecomputeScheduler()
+        release = asyncio.Event()
+
+        async def work(value):
+            await release.wait()
+            return value
+
+        waiter = asyncio.ensure_future(scheduler.attach("", "samples", work, 1, keep=True))
+        await asyncio.sleep(0)
+        scheduler.replace("", "samples", work, 2, keep=True)
+        release.set()
+        assert await waiter == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,130 @@
+import pytest
+
+from cache import BoundedMemoryCache, QuestionIndex, SQLiteCache
+
+
+def filled_index():
+    index = QuestionIndex()
+    index.add("q1", "Total revenue per region", user_id="ana", session_id="s1")
+    index.add("q2", "Top products by revenue", user_id="budi", session_id="s2")
+    index.add("q3", "Revenue per month", user_id="ana", session_id="s1")
+    index.add("q4", "Number of customers", user_id="ana", session_id="s3")
+    index.add("q5", "Customers per region", user_id="budi", session_id="s2")
+    return index
+
+
+def ids(items):
+    return [item["id"] for item in items]
+
+
+def all_pages(page, limit):
+    pages, cursor = [], None
+    while True:
+        items, cursor = page(limit, cursor)
+        pages.append(ids(items))
+        if cursor is None:
+            return pages
+
+
+def test_page_is_newest_first():
+    items, cursor = filled_index().page(10)
+    assert ids(items) == ["q5", "q4", "q3", "q2", "q1"]
+    assert cursor is None
+    assert items[0]["question"] == "Customers per region"
+    assert items[0]["user_id"] == "budi"
+
+
+def test_page_cursor_walks_every_question_once():
+    index = filled_index()
+    assert all_pages(index.page, 2) == [["q5", "q4"], ["q3", "q2"], ["q1"]]
+
+
+def test_page_cursor_is_none_when_last_page_is_full():
+    items, cursor = filled_index().page(5)
+    assert len(items) == 5
+    assert cursor is None
+
+
+def test_page_cursor_survives_new_questions():
+    index = filled_index()
+    _, cursor = index.page(2)
+    index.add("q6", "Revenue per year")
+    items, _ = index.page(2, cursor)
+    assert ids(items) == ["q3", "q2"]
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({"user_id": "ana"}, ["q4", "q3", "q1"]),
+        ({"session_id": "s2"}, ["q5", "q2"]),
+        ({"search": "revenue"}, ["q3", "q2", "q1"]),
+        ({"search": "REGION revenue"}, ["q1"]),
+        ({"user_id": "ana", "search": "revenue"}, ["q3", "q1"]),
+        ({"user_id": "budi", "session_id": "s1"}, []),
+        ({"search": "unknown"}, []),
+    ],
+)
+def test_page_filters(filters, expected):
+    index = filled_index()
+    assert ids(index.page(10, **filters)[0]) == expected
+    assert sum(all_pages(lambda limit, cursor: index.page(limit, cursor, **filters), 1), []) == expected
+
+
+def test_page_skips_removed_and_hidden_questions():
+    index = filled_index()
+    index.remove("q4")
+    items, _ = index.page(10, skip=lambda id: id == "q2")
+    assert ids(items) == ["q5", "q3", "q1"]
+
+
+def test_readding_question_moves_it_to_the_front():
+    index = filled_index()
+    index.add("q1", "Total revenue per region", user_id="ana", session_id="s1")
+    assert ids(index.page(10)[0]) == ["q1", "q5", "q4", "q3", "q2"]
+
+
+def test_purge_keeps_pages_intact():
+    index = QuestionIndex()
+    for i in range(3000):
+        index.add("q%d" % i, "question %d" % (i % 2), user_id="u%d" % (i % 3))
+    for i in range(2500):
+        index.remove("q%d" % i)
+    assert index.removed < 2500
+    assert len(index.scopes[("all",)]) < 3000
+
+    items, cursor = index.page(3, user_id="u0", search="question 0")
+    assert ids(items) == ["q2994", "q2988", "q2982"]
+    assert ids(index.page(3, cursor, user_id="u0", search="question 0")[0]) == [
+        "q2976",
+        "q2970",
+        "q2964",
+    ]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return BoundedMemoryCache()
+    return SQLiteCache(str(tmp_path / "cache.sqlite"))
+
+
+def test_cache_question_history(cache):
+    cache.add_question("q1", "Revenue per region", user_id="ana", session_id="s1")
+    cache.add_question("q2", "Customers per region", user_id="budi", session_id="s2")
+    cache.add_question("q3", "Revenue per month", user_id="ana", session_id="s1")
+
+    items, cursor = cache.question_history(limit=2)
+    assert ids(items) == ["q3", "q2"]
+    assert ids(cache.question_history(limit=2, cursor=cursor)[0]) == ["q1"]
+    assert ids(cache.question_history(user_id="ana", search="revenue")[0]) == ["q3", "q1"]
+
+    cache.delete("q3")
+    assert ids(cache.question_history()[0]) == ["q2", "q1"]
+
+
+def test_memory_cache_history_follows_eviction():
+    cache = BoundedMemoryCache(max_entries=2)
+    for i in range(3):
+        cache.add_question("q%d" % i, "question %d" % i)
+    assert ids(cache.question_history()[0]) == ["q2", "q1"]
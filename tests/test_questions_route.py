@@ -0,0 +1,30 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import dependencies
+from app.api.routes import questions
+from app.services.cache_service import get_cache
+
+
+class ColdWarmUp:
+    async def ensure_vanna(self):
+        raise RuntimeError("model still loading")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(dependencies, "get_warm_up", lambda: ColdWarmUp())
+    app = FastAPI()
+    app.include_router(questions.router)
+    return TestClient(app)
+
+
+def test_history_is_served_while_vanna_warms_up(client):
+    get_cache().add_question("history-route", "Revenue per warm-up region", user_id="ana")
+
+    response = client.get("/api/get_question_history", params={"search": "warm-up"})
+    assert response.status_code == 200
+    assert [q["id"] for q in response.json()["questions"]] == ["history-route"]
+
+    assert client.get("/api/generate_questions").status_code == 503
@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from app.services.result_cache_service import ResultCache, canonicalize_sql, referenced_tables
+
+
+def test_canonicalize_sql_ignores_formatting():
+    assert canonicalize_sql("select  a\n  from t -- note\n;") == canonicalize_sql(
+        "SELECT a FROM t"
+    )
+
+
+def test_canonicalize_sql_keeps_string_literals():
+    assert canonicalize_sql("SELECT * FROM t WHERE x = 'a  b'") != canonicalize_sql(
+        "SELECT * FROM t WHERE x = 'a b'"
+    )
+    assert "'a\n b'" in canonicalize_sql("SELECT 'a\n b'")
+
+
+@pytest.mark.parametrize(
+    "sql, tables",
+    [
+        ("SELECT * FROM a", {"a"}),
+        ("SELECT * FROM a, b", {"a", "b"}),
+        ("SELECT * FROM a x, public.b AS y WHERE x.id = y.id", {"a", "b"}),
+        ("SELECT * FROM a JOIN b ON a.id = b.id LEFT JOIN c USING (id)", {"a", "b", "c"}),
+        ('SELECT * FROM "Sales"."Orders" o', {"orders"}),
+        ("SELECT * FROM (SELECT * FROM a, b) s JOIN c ON true", {"a", "b", "c"}),
+        ("SELECT * FROM a WHERE id IN (SELECT id FROM b)", {"a", "b"}),
+        ("SELECT 'from x' AS note", set()),
+    ],
+)
+def test_referenced_tables(sql, tables):
+    assert referenced_tables(sql) == tables
+
+
+def test_result_cache_invalidates_every_listed_table():
+    cache = ResultCache()
+    calls = []
+
+    def run(sql):
+        calls.append(sql)
+        return pd.DataFrame({"x": [len(calls)]})
+
+    sql = "SELECT * FROM a, b"
+    cache.get_or_run(sql, run)
+    cache.get_or_run(sql, run)
+    assert len(calls) == 1
+    assert cache.invalidate(["b"]) == 1
+    cache.get_or_run(sql, run)
+    assert len(calls) == 2
+
+
+def test_result_cache_hits_do_not_share_frames():
+    cache = ResultCache()
+
+    def run(sql):
+        df = pd.DataFrame({"x": [1, 2]})
+        df.attrs["estimate"] = {"limited": False}
+        return df
+
+    first, hit = cache.get_or_run("SELECT x FROM a", run)
+    assert not hit
+    first["y"] = 0
+    first.attrs["estimate"]["limited"] = True
+
+    second, hit = cache.get_or_run("SELECT x FROM a", run)
+    assert hit
+    second["z"] = 0
+    second.attrs["chart"] = "bar"
+
+    third, hit = cache.get_or_run("SELECT x FROM a", run)
+    assert hit
+    assert list(third.columns) == ["x"]
+    assert third.attrs == {"estimate": {"limited": False}}
+    assert third is not second
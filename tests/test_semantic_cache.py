@@ -0,0 +1,40 @@
+import numpy as np
+
+from app.config import settings
+from app.services import semantic_cache_service
+from app.services.semantic_cache_service import SemanticCache
+
+
+def embed(question):
+    return [1.0, 0.0] if "revenue" in question else [0.0, 1.0]
+
+
+def test_lookup_matches_normalized_and_similar_questions(tmp_path):
+    cache = SemanticCache(str(tmp_path / "semantic.sqlite"), threshold=0.9)
+    cache.store("Total revenue?", "SELECT 1", np.array([1.0, 0.0]))
+
+    assert cache.lookup("  total REVENUE ", embed).similarity == 1.0
+    match = cache.lookup("revenue per region", embed)
+    assert match.sql == "SELECT 1"
+    assert cache.lookup("customers", embed).sql is None
+
+
+def test_store_drops_sql_generated_before_invalidate(tmp_path):
+    cache = SemanticCache(str(tmp_path / "semantic.sqlite"))
+    generation = cache.generation
+    cache.invalidate()
+    cache.store("Total revenue", "SELECT 1", generation=generation)
+    assert cache.lookup("Total revenue", embed).sql is None
+
+    cache.store("Total revenue", "SELECT 2", generation=cache.generation)
+    assert cache.lookup("Total revenue", embed).sql == "SELECT 2"
+
+
+def test_cache_is_built_on_first_use(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(semantic_cache_service, "semantic_cache", None)
+    assert not (tmp_path / settings.chroma_folder).exists()
+
+    cache = semantic_cache_service.get_semantic_cache()
+    assert semantic_cache_service.get_semantic_cache() is cache
+    assert (tmp_path / settings.chroma_folder / "semantic_cache.sqlite").exists()
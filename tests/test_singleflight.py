@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import pandas as pd
+
+from app.services.executor_service import StageExecutor
+from app.services.singleflight_service import SingleFlight, frame_digest
+
+
+def test_frame_digest_changes_with_content():
+    df = pd.DataFrame({"a": [1, 2]})
+    assert frame_digest(df) == frame_digest(df.copy())
+    assert frame_digest(df) != frame_digest(pd.DataFrame({"a": [1, 3]}))
+    assert frame_digest(df) != frame_digest(pd.DataFrame({"b": [1, 2]}))
+
+
+def test_frame_digest_of_unhashable_cells():
+    df = pd.DataFrame({"tags": [[1, 2], None], "doc": [{"a": 1}, {"b": [2]}]})
+    assert frame_digest(df) == frame_digest(df.copy())
+    other = pd.DataFrame({"tags": [[1, 3], None], "doc": [{"a": 1}, {"b": [2]}]})
+    assert frame_digest(df) != frame_digest(other)
+
+
+def test_identical_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def work(value):
+            calls.append(value)
+            await release.wait()
+            return value * 2
+
+        waiters = [asyncio.ensure_future(flight.do("m", "k", work, 1)) for _ in range(5)]
+        other = asyncio.ensure_future(flight.do("m", "other", work, 2))
+        await asyncio.sleep(0)
+        assert flight.stats()["in_flight"] == 2
+        release.set()
+        assert await asyncio.gather(*waiters) == [2] * 5
+        assert await other == 4
+        assert calls == [1, 2]
+        assert flight.stats()["coalesced"] == 4
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_followers_do_not_hold_stage_workers():
+    async def scenario():
+        flight = SingleFlight()
+        stage = StageExecutor("test", workers=2, queue_size=100)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return "slow"
+
+        burst = [
+            asyncio.ensure_future(flight.do("m", "same", stage.run, slow)) for _ in range(10)
+        ]
+        await asyncio.to_thread(started.wait, 5)
+        # Only the leader holds a worker, so an unrelated call still runs.
+        assert await asyncio.wait_for(stage.run(lambda: "other"), 5) == "other"
+        release.set()
+        assert await asyncio.gather(*burst) == ["slow"] * 10
+        stage.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("m", "k", work))
+        second = asyncio.ensure_future(flight.do("m", "k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await second == "done"
+
+    asyncio.run(scenario())
+
+
+def test_failures_reach_every_caller():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            flight.do("m", "k", fail), flight.do("m", "k", fail), return_exceptions=True
+        )
+        assert [type(r) for r in results] == [ValueError, ValueError]
+
+    asyncio.run(scenario())
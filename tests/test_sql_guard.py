@@ -0,0 +1,103 @@
+import asyncio
+import contextlib
+import json
+
+import pytest
+
+from app.api.routes.sql import _stream_ndjson
+from app.config import settings
+from app.services.cache_service import get_cache
+from app.services.export_service import guard_export, iter_copy_csv
+from app.services.sql_guard_service import SQLGuardError, guard_sql
+
+SQL = "SELECT * FROM sales"
+
+
+class FakeCursor:
+    """Answers EXPLAIN with an over-cost plan, unless the query has a LIMIT."""
+
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        self.log.append(sql)
+        self.limited = "LIMIT" in sql
+
+    def fetchone(self):
+        cost = 10.0 if self.limited else settings.sql_guard_max_cost * 10
+        plan = {"Total Cost": cost, "Plan Rows": 1_000_000, "Node Type": "Seq Scan"}
+        return [json.dumps([{"Plan": plan}])]
+
+    def copy_expert(self, sql, out):
+        self.log.append(sql)
+        out.write("id\n1\n")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self.log)
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConnection()
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self.conn
+
+
+def test_guard_limits_costly_query_by_default():
+    sql, estimate = guard_sql(FakeConnection(), SQL, limit_rows=False)
+    assert sql.endswith("LIMIT %d" % settings.sql_guard_auto_limit)
+    assert estimate["limited"]
+    assert estimate["original_cost"] == settings.sql_guard_max_cost * 10
+
+
+def test_guard_refuses_costly_query_without_auto_limit():
+    with pytest.raises(SQLGuardError) as e:
+        guard_sql(FakeConnection(), SQL, limit_rows=False, auto_limit=False)
+    assert e.value.estimate["total_cost"] == settings.sql_guard_max_cost * 10
+
+
+def test_export_refuses_costly_query():
+    pool = FakePool()
+    with pytest.raises(SQLGuardError):
+        guard_export(pool, SQL)
+
+    async def export():
+        return [chunk async for chunk in iter_copy_csv(pool, SQL)]
+
+    with pytest.raises(SQLGuardError):
+        asyncio.run(export())
+    assert not any(sql.startswith("COPY") for sql in pool.conn.log)
+
+
+def test_ndjson_trailer_reports_guard_limit():
+    def batches():
+        yield [(1,), (2,)]
+
+    estimate = {"limited": True, "limit": settings.sql_guard_auto_limit}
+
+    async def stream():
+        return [
+            json.loads(line)
+            async for chunk in _stream_ndjson("guarded", ["id"], estimate, batches())
+            for line in chunk.splitlines()
+        ]
+
+    lines = asyncio.run(stream())
+    assert lines[-1]["type"] == "end"
+    assert lines[-1]["row_count"] == 2
+    assert lines[-1]["truncated"] is True
+    assert lines[-1]["estimate"] == estimate
+    assert get_cache().get(id="guarded", field="truncated") is True
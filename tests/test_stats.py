@@ -0,0 +1,24 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import stats
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(stats.router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("component", sorted(set(stats.STATS) - stats.NEEDS_VANNA))
+def test_component_stats(client, component):
+    response = client.get("/api/stats/%s" % component)
+    assert response.status_code == 200
+    assert response.json()["type"] == "stats"
+    assert isinstance(response.json()["stats"], dict)
+
+
+def test_unknown_component(client):
+    assert client.get("/api/stats/nope").status_code == 404
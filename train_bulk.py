@@ -0,0 +1,60 @@
+"""
+Bulk-load Vanna training data from CSV / JSON Lines / JSON files.
+
+Usage:
+    python train_bulk.py examples.csv ddl.jsonl --batch-size 512
+
+CSV columns (or JSON keys) are question, sql, ddl and documentation; the
+training_data_type/content layout of /api/get_training_data works as well.
+"""
+
+import sys
+import argparse
+
+from app.config import settings
+from app.services.training_service import (
+    bulk_train,
+    detect_format,
+    parse_training_records,
+)
+from app.services.semantic_cache_service import get_semantic_cache
+
+
+def print_progress(kind: str, done: int, total: int):
+    sys.stdout.write("\r%-13s %6d/%d" % (kind, done, total))
+    if done == total:
+        sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load Vanna training data")
+    parser.add_argument("files", nargs="+", help="CSV, JSONL or JSON files")
+    parser.add_argument("--format", choices=["csv", "jsonl", "json"])
+    parser.add_argument("--batch-size", type=int, default=settings.train_batch_size)
+    args = parser.parse_args()
+
+    from app.services.vanna_service import get_vanna
+
+    vanna = get_vanna()
+
+    records = []
+    for path in args.files:
+        with open(path, "rb") as f:
+            records.extend(
+                parse_training_records(f.read(), args.format or detect_format(None, path))
+            )
+
+    report = bulk_train(vanna, records, args.batch_size, progress=print_progress)
+    if sum(report["added"].values()):
+        get_semantic_cache().invalidate()
+
+    print(
+        "received=%(received)d added=%(added)s duplicates=%(duplicates)d "
+        "skipped=%(skipped)d seconds=%(seconds).2f items/s=%(items_per_second).1f"
+        % report
+    )
+
+
+if __name__ == "__main__":
+    main()